@@ -0,0 +1,299 @@
+import io
+import math
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+SAMPLE_RATE = 22050
+
+# Cue name -> (frequency in Hz, duration in milliseconds)
+CUE_TONES: Dict[str, Tuple[int, int]] = {
+    'countdown': (1000, 100),
+    'countdown_low': (300, 100),
+}
+
+
+def log_failure(message: str, *args) -> None:
+    """
+    Logs the exception being handled as a warning.
+    """
+    # logging is slow to import and only needed once a cue has failed
+    import logging
+    logging.getLogger(__name__).warning(message, *args, exc_info=True)
+
+
+def render_tone(frequency: int, duration_ms: int, volume: float = 0.5,
+                sample_rate: int = SAMPLE_RATE) -> bytes:
+    """
+    Renders a sine tone into 16-bit mono PCM.
+
+    A short linear fade at both ends keeps the tone from clicking.
+
+    Parameters
+    ----------
+    frequency : int
+        Frequency of the tone in Hz.
+    duration_ms : int
+        Duration of the tone in milliseconds.
+    volume : float, optional
+        Amplitude between 0 and 1 (default is 0.5).
+    sample_rate : int, optional
+        Samples per second (default is SAMPLE_RATE).
+
+    Returns
+    -------
+    bytes
+        The rendered PCM samples.
+    """
+    count = sample_rate * duration_ms // 1000
+    fade = min(count // 2, sample_rate // 200)
+    amplitude = 32767 * volume
+    step = 2 * math.pi * frequency / sample_rate
+    samples = array('h', bytes(2 * count))
+    for i in range(count):
+        envelope = min(1.0, i / fade, (count - 1 - i) / fade) if fade else 1.0
+        samples[i] = int(amplitude * envelope * math.sin(step * i))
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    return samples.tobytes()
+
+
+def to_wav(pcm: bytes, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """
+    Wraps 16-bit mono PCM into an in-memory WAV file.
+    """
+    import wave
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+class NullBackend:
+    """
+    An audio backend that discards every cue.
+    """
+
+    def play(self, name: str, wav: bytes) -> None:
+        pass
+
+
+class RecordingBackend:
+    """
+    An audio backend that records the cues it is asked to play.
+
+    Attributes
+    ----------
+    played : List[Tuple[str, float]]
+        The cue names in playback order with the monotonic time they started.
+    delay : float
+        Seconds to block for each cue, to emulate a real device.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.played: List[Tuple[str, float]] = []
+        self.delay = delay
+
+    def play(self, name: str, wav: bytes) -> None:
+        self.played.append((name, time.monotonic()))
+        if self.delay:
+            time.sleep(self.delay)
+
+
+class WinsoundBackend:
+    """
+    An audio backend that plays cues through the Windows `winsound` module.
+    """
+
+    def __init__(self):
+        import winsound
+        self._winsound = winsound
+
+    def play(self, name: str, wav: bytes) -> None:
+        self._winsound.PlaySound(wav, self._winsound.SND_MEMORY)
+
+
+class WavFileBackend:
+    """
+    An audio backend that writes each cue once to a WAV file and plays it
+    with the ALSA `aplay` utility.
+
+    Attributes
+    ----------
+    directory : str
+        Directory holding the rendered WAV files.
+    player : Optional[str]
+        Path of the `aplay` executable, or None to only write the files.
+    """
+
+    def __init__(self, directory: Optional[str] = None, player: Optional[str] = None):
+        import shutil
+        import tempfile
+        self.directory = directory or tempfile.mkdtemp(prefix='workout_cues_')
+        self.player = player or shutil.which('aplay')
+        self._paths: Dict[str, str] = {}
+
+    def path(self, name: str, wav: bytes) -> str:
+        """
+        Returns the file holding the given cue, writing it on first use.
+        """
+        path = self._paths.get(name)
+        if path is None:
+            path = os.path.join(self.directory, f'{name}.wav')
+            with open(path, 'wb') as file:
+                file.write(wav)
+            self._paths[name] = path
+        return path
+
+    def play(self, name: str, wav: bytes) -> None:
+        import subprocess
+        path = self.path(name, wav)
+        if self.player:
+            subprocess.run([self.player, '-q', path], check=False,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def default_backend():
+    """
+    Returns the best audio backend available on this platform.
+    """
+    import shutil
+    if sys.platform == 'win32':
+        return WinsoundBackend()
+    if shutil.which('aplay'):
+        return WavFileBackend()
+    return NullBackend()
+
+
+class CuePlayer:
+    """
+    Plays pre-rendered audio cues from a background worker thread.
+
+    The backend is chosen and every cue is rendered once, on the worker
+    thread, so creating a player costs the caller nothing. `play` only puts
+    the cue name on a queue and never waits on the audio device; cues that
+    arrive while the queue is full are dropped.
+
+    Attributes
+    ----------
+    backend : object
+        The backend the worker thread plays cues through.
+    buffers : Dict[str, bytes]
+        The pre-rendered cues as WAV data, by name.
+    store : object
+        Source of the cues not in `buffers`, with `wav(name)` and
+        `prefetch(names)` methods, such as a voice_cues.VoicePack, or None.
+    instruments : Optional[Instruments]
+        Records the queueing delay and playback time of every cue, if set.
+    failures : int
+        Cues that could not be loaded from the store or played by the backend.
+    """
+
+    def __init__(self, backend=None, tones: Dict[str, Tuple[int, int]] = CUE_TONES,
+                 max_pending: int = 8, store=None):
+        """
+        Constructs all the necessary attributes for the CuePlayer object.
+
+        Parameters
+        ----------
+        backend : object, optional
+            Backend with a `play(name, wav)` method (default is `default_backend()`).
+        tones : Dict[str, Tuple[int, int]], optional
+            Cue name to (frequency, duration in ms) (default is CUE_TONES).
+        max_pending : int, optional
+            Maximum number of cues waiting to be played (default is 8).
+        store : object, optional
+            Source of the cues not in `tones`, used on the worker thread (default is None).
+        """
+        self.backend = backend
+        self.tones = tones
+        self.buffers: Dict[str, bytes] = {}
+        self.store = store
+        self.instruments = None
+        self.failures = 0
+        self._queue: queue.Queue = queue.Queue(max_pending)
+        self._thread = threading.Thread(target=self._run, name='CuePlayer', daemon=True)
+        self._thread.start()
+
+    def play(self, name: str) -> bool:
+        """
+        Queues a cue for playback without blocking.
+
+        Returns
+        -------
+        bool
+            False if the cue was dropped because the queue is full.
+        """
+        try:
+            self._queue.put_nowait((name, time.perf_counter()))
+        except queue.Full:
+            return False
+        return True
+
+    def prefetch(self, names: Sequence[str]) -> bool:
+        """
+        Queues cues for the store to prepare before they are played, without blocking.
+
+        Returns
+        -------
+        bool
+            False if there is no store or the queue is full.
+        """
+        if self.store is None:
+            return False
+        try:
+            self._queue.put_nowait((tuple(names), None))
+        except queue.Full:
+            return False
+        return True
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Stops the worker thread once the queued cues have been played.
+        """
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        if self.backend is None:
+            self.backend = default_backend()
+        self.buffers = {name: to_wav(render_tone(frequency, duration))
+                        for name, (frequency, duration) in self.tones.items()}
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            name, queued = item
+            try:
+                if queued is None:
+                    self.store.prefetch(name)
+                    continue
+                wav = self.buffers.get(name)
+                if wav is None and self.store is not None:
+                    wav = self.store.wav(name)
+            except (OSError, ValueError, struct.error, zlib.error):
+                # A damaged or unwritable store loses this cue, not the worker
+                self.failures += 1
+                log_failure('cannot load cue %r', name)
+                continue
+            if wav is None:
+                continue
+            started = time.perf_counter()
+            try:
+                self.backend.play(name, wav)
+            except Exception:
+                # The worker keeps going, so one bad device call does not silence every later cue
+                self.failures += 1
+                log_failure('cannot play cue %r through %s', name, type(self.backend).__name__)
+            if self.instruments is not None:
+                self.instruments.record('audio_queue', started - queued)
+                self.instruments.record('audio_cue', time.perf_counter() - started)
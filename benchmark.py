@@ -0,0 +1,1283 @@
+"""
+Benchmarks for the workout timer.
+
+Run from the repository root, for example:
+
+    python benchmark.py --json before.json
+    python benchmark.py qt_render tk_labels --compare before.json
+
+Qt benchmarks use the offscreen platform. Tk benchmarks need a display and
+start Xvfb when none is set; they are skipped when neither is available.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace], dict]] = {}
+
+
+def benchmark(function: Callable[[argparse.Namespace], dict]) -> Callable[[argparse.Namespace], dict]:
+    """
+    Registers a benchmark under its function name.
+    """
+    BENCHMARKS[function.__name__] = function
+    return function
+
+
+def qt_application():
+    """
+    Returns the QApplication, creating it on the offscreen platform if needed.
+    """
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication
+    return QApplication.instance() or QApplication(sys.argv[:1])
+
+
+def x_display() -> Optional[subprocess.Popen]:
+    """
+    Makes sure Tk has a display, starting Xvfb if none is set.
+
+    Returns
+    -------
+    Optional[subprocess.Popen]
+        The Xvfb process to terminate afterwards, if one was started.
+
+    Raises
+    ------
+    RuntimeError
+        If there is no display and Xvfb is not installed.
+    """
+    if os.environ.get('DISPLAY'):
+        return None
+    xvfb = shutil.which('Xvfb')
+    if xvfb is None:
+        raise RuntimeError('no display and Xvfb is not installed')
+    server = subprocess.Popen([xvfb, ':99', '-screen', '0', '1280x720x24'],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ['DISPLAY'] = ':99'
+    time.sleep(0.5)
+    return server
+
+
+def qt_window(work: int, rest: int, repetitions: int):
+    """
+    Returns a shown Qt Interface whose timer runs on a manual clock.
+    """
+    app = qt_application()
+    from audio_cues import CuePlayer, NullBackend
+    from workout_timer_Qt5 import Interface, WorkoutTimer
+    clock = [0.0]
+    timer = WorkoutTimer(work, rest, repetitions)
+    timer.clock = lambda: clock[0]
+    window = Interface(timer)
+    window.cues = CuePlayer(NullBackend())
+    window.show()
+    app.processEvents()
+    return app, window, clock
+
+
+def legacy_qt_render(window) -> None:
+    """
+    Renders one tick the way the Qt Interface did before the render cache:
+    restyling both widgets and resetting the maximum on every tick.
+    """
+    from PyQt5.QtCore import QTime
+    from workout_engine import WORK_STAGE
+    timer = window.timer
+    window.time_label.setText(QTime(0, 0).addSecs(timer.current_time).toString())
+    if timer.current_stage == WORK_STAGE:
+        window.state_label.setText('Work')
+        window.state_label.setStyleSheet("color: #00FF00;")
+        window.progress_bar.setStyleSheet("QProgressBar::chunk { background-color: #00FF00; }")
+    else:
+        window.state_label.setText('Rest')
+        window.state_label.setStyleSheet("color: yellow;")
+        window.progress_bar.setStyleSheet("QProgressBar::chunk { background-color: yellow; }")
+    window.progress_bar.setMaximum(int(timer.current_duration))
+    window.progress_bar.setValue(timer.current_time)
+    window.repetitions_indicator.setCount(timer.repetitions)
+
+
+@benchmark
+def qt_render(args: argparse.Namespace) -> dict:
+    """
+    Per-tick render cost of the Qt Interface, redrawing every widget the old
+    way and redrawing only the fields a state snapshot marks as changed.
+    """
+    app, window, clock = qt_window(1, 1, args.ticks)
+
+    def run(render: Callable[[], None]) -> tuple:
+        window.timer.stop()
+        window.timer.start()
+        updating = painting = 0.0
+        for _ in range(args.ticks):
+            clock[0] += 1.0
+            window.timer.update()
+            started = time.perf_counter()
+            render()
+            updated = time.perf_counter()
+            app.processEvents()
+            updating += updated - started
+            painting += time.perf_counter() - updated
+        return updating / args.ticks * 1e6, painting / args.ticks * 1e6
+
+    legacy_update, legacy_paint = run(lambda: legacy_qt_render(window))
+    window.state_label.setStyleSheet('')
+    window.progress_bar.setStyleSheet('')
+    window.refresh()
+    feed_update, feed_paint = run(window.timer.feed.publish)
+    return {'legacy_update_us': legacy_update, 'legacy_paint_us': legacy_paint,
+            'feed_update_us': feed_update, 'feed_paint_us': feed_paint}
+
+
+@benchmark
+def engine_throughput(args: argparse.Namespace) -> dict:
+    """
+    Events per second of the headless engine running full 8x(8+2) workouts.
+    """
+    from workout_simulation import simulate
+    started = time.perf_counter()
+    streams = simulate(480, 120, 16, args.sessions)
+    elapsed = time.perf_counter() - started
+    events = sum(len(stream) for stream in streams)
+    return {'sessions': args.sessions, 'events': events, 'seconds': elapsed,
+            'events_per_second': events / elapsed}
+
+
+@benchmark
+def drift(args: argparse.Namespace) -> dict:
+    """
+    End time of a 16-stage 8x(8+2) session waking up every second, each
+    wake-up delayed by up to 300 ms, net of the delay of the last wake-up,
+    and how late the latest stage began.
+    """
+    import random
+    from workout_simulation import simulate
+    delays = []
+
+    def lateness() -> float:
+        delays.append(random.uniform(0, 0.3))
+        return delays[-1]
+
+    events = simulate(480, 120, 16, lateness=lateness, tick_every_second=True)[0]
+    planned = 8 * 480 + 8 * 120
+    starts = [480 * ((index + 1) // 2) + 120 * (index // 2) for index in range(1, 16)]
+    stage_times = [event.time for event in events if event.kind == 'stage']
+    stage_late = max(moment - start for moment, start in zip(stage_times, starts))
+    end_error = events[-1].time - planned - delays[-1]
+    return {'wakeups': len(delays), 'injected_s': sum(delays), 'stage_late_max_ms': stage_late * 1e3,
+            'end_drift_ms': end_error * 1e3}
+
+
+@benchmark
+def server_sessions(args: argparse.Namespace) -> dict:
+    """
+    Scheduling jitter and CPU use of concurrent sessions on one asyncio loop.
+    Every session must complete on time, with callbacks at most 50 ms late
+    at the 99th percentile.
+    """
+    import asyncio
+    from timer_server import SessionManager
+
+    async def run() -> dict:
+        loop = asyncio.get_running_loop()
+        manager = SessionManager(loop, record_lateness=True)
+        completed = []
+        manager.listeners.append(lambda session_id, event: event.kind == 'complete' and completed.append(1))
+        for number in range(args.concurrent):
+            # Uneven durations spread the transitions over the run
+            manager.start(manager.create(work=2 + number % 3, rest=1 + number % 2, repetitions=4))
+        cpu = time.process_time()
+        started = time.perf_counter()
+        # The longest sessions run 12 s
+        while len(completed) < args.concurrent and time.perf_counter() - started < 30:
+            await asyncio.sleep(0.1)
+        assert len(completed) == args.concurrent, \
+            f'{args.concurrent - len(completed)} sessions did not complete'
+        lateness = sorted(manager.scheduler.lateness)
+        assert lateness[int(len(lateness) * 0.99)] < 0.050, \
+            f'callbacks ran {lateness[int(len(lateness) * 0.99)] * 1e3:.1f} ms late at the 99th percentile'
+        return {
+            'sessions': args.concurrent,
+            'seconds': time.perf_counter() - started,
+            'cpu_seconds': time.process_time() - cpu,
+            'wakeups': manager.scheduler.wakeups,
+            'jitter_p50_ms': lateness[len(lateness) // 2] * 1e3,
+            'jitter_p99_ms': lateness[int(len(lateness) * 0.99)] * 1e3,
+            'jitter_max_ms': lateness[-1] * 1e3,
+        }
+
+    return asyncio.run(run())
+
+
+@benchmark
+def broadcast_clients(args: argparse.Namespace) -> dict:
+    """
+    Bandwidth per display when one 8x(8+2) session is broadcast to many loopback clients.
+    """
+    from timer_broadcast import FULL_MASK, BroadcastPublisher, RemoteTimer, encode
+    from workout_engine import VirtualClock, VirtualScheduler, WorkoutSession
+    clock = VirtualClock()
+    scheduler = VirtualScheduler(clock)
+    session = WorkoutSession(480, 120, 16, scheduler, clock, tick_every_second=False)
+    clients = [RemoteTimer(port=0, group=None, host='127.0.0.1', clock=clock) for _ in range(args.clients)]
+    publisher = BroadcastPublisher(session, [client.socket.getsockname() for client in clients],
+                                   keyframe_interval=0)
+    mismatches = 0
+
+    def check(event) -> None:
+        nonlocal mismatches
+        if event.kind == 'cue':
+            return
+        for client in clients:
+            while not client.receive():
+                pass
+            mismatches += (client.stage_index, client.current_time) != (session.stage_index, session.current_time)
+
+    session.add_listener(check)
+    session.start()
+    scheduler.run(until=1000)
+    session.pause()
+    clock.advance(60)
+    session.pause()
+    session.next()
+    scheduler.run()
+    keyframe = len(encode(0, publisher.capture(), FULL_MASK))
+    for client in clients:
+        client.close()
+    assert mismatches == 0, f'displays showed another second {mismatches} times'
+    return {
+        'clients': args.clients,
+        'messages_per_client': publisher.messages_sent,
+        'bytes_per_client': publisher.bytes_sent,
+        'bytes_per_second_per_client': publisher.bytes_sent / clock.now,
+        'keyframe_bytes_per_second': keyframe / 5.0,
+        'mismatches': mismatches,
+    }
+
+
+@benchmark
+def engine_step(args: argparse.Namespace) -> dict:
+    """
+    Cost of one state machine step: a bare engine update and a full session tick.
+    """
+    from workout_engine import VirtualClock, VirtualScheduler, WorkoutSession
+    clock = VirtualClock()
+    scheduler = VirtualScheduler(clock)
+    session = WorkoutSession(480, 120, 10 ** 6, scheduler, clock)
+    session.add_listener(lambda event: None)
+    session.start()
+
+    started = time.perf_counter()
+    for _ in range(args.ticks):
+        clock.advance(1.0)
+        session.update()
+    update = (time.perf_counter() - started) / args.ticks
+
+    started = time.perf_counter()
+    ticks = scheduler.run(until=clock.now + args.ticks)
+    tick = (time.perf_counter() - started) / ticks
+    results = {'update_us': update * 1e6, 'tick_us': tick * 1e6}
+
+    # Every snapshot is computed once, however many renderers subscribe
+    for subscribers in (1, 8):
+        while len(session.feed.subscribers) < subscribers:
+            session.subscribe(lambda snapshot: None)
+        started = time.perf_counter()
+        ticks = scheduler.run(until=clock.now + args.ticks)
+        tick = (time.perf_counter() - started) / ticks
+        results[f'tick_{subscribers}_subscribers_us'] = tick * 1e6
+    return results
+
+
+@benchmark
+def terminal_render(args: argparse.Namespace) -> dict:
+    """
+    Bytes the terminal frontend writes per second of a running session, against
+    redrawing the whole screen on every frame, and the cost of one frame.
+    """
+    import io
+    from audio_cues import CuePlayer, NullBackend
+    from workout_engine import VirtualClock, VirtualScheduler
+    from workout_timer_term import Interface, WorkoutTimer
+    clock = VirtualClock()
+    timer = WorkoutTimer(1, 1, 10 ** 6, CuePlayer(NullBackend()), VirtualScheduler(clock), clock)
+    stream = io.BytesIO()
+    interface = Interface(timer, stream, size=(64, 9))
+    interface.draw()
+    full_frame = interface.screen.bytes_written
+    timer.start()
+
+    started = time.perf_counter()
+    timer.scheduler.run(until=clock.now + args.ticks)
+    elapsed = time.perf_counter() - started
+    screen = interface.screen
+    return {
+        'bytes_per_second': (screen.bytes_written - full_frame) / args.ticks,
+        'full_redraw_bytes_per_second': full_frame,
+        'frame_us': elapsed / (screen.frames - 1) * 1e6,
+    }
+
+
+@benchmark
+def cue_latency(args: argparse.Namespace) -> dict:
+    """
+    How late the ticks of a session run on a select loop, silent and with a
+    cue played on every tick through a device that blocks for 80 ms.
+    """
+    from audio_cues import CuePlayer, RecordingBackend
+    from instrumentation import Instruments
+    from workout_engine import SelectScheduler, WorkoutSession
+    results = {}
+    for mode in ('silent', 'cues'):
+        scheduler = SelectScheduler()
+        session = WorkoutSession(2, 2, 2, scheduler, cue_seconds=2, fine_seconds=2, fine_interval=0.05)
+        session.instruments = Instruments()
+        backend = RecordingBackend(delay=0.08)
+        player = CuePlayer(backend)
+        if mode == 'cues':
+            # Every wake-up plays a cue, far more often than the countdown does
+            session.subscribe(lambda snapshot: player.play('countdown'))
+        session.start()
+        while not session.finished:
+            time.sleep(scheduler.timeout() or 0)
+            scheduler.run_due()
+        player.close(1.0)
+        lateness = session.instruments.histogram('tick_lateness')
+        results[f'{mode}_p99_ms'] = lateness.percentile(0.99) * 1e3
+        results[f'{mode}_max_ms'] = lateness.maximum * 1e3
+        results[f'{mode}_played'] = len(backend.played)
+    return results
+
+
+@benchmark
+def render_rate(args: argparse.Namespace) -> dict:
+    """
+    Wake-ups and CPU time per second of a rendering session in each mode:
+    stopped, paused, a normal interval and the final sub-second countdown.
+    """
+    import io
+    from audio_cues import CuePlayer, NullBackend
+    from workout_engine import VirtualClock, VirtualScheduler
+    from workout_timer_term import Interface, WorkoutTimer
+    clock = VirtualClock()
+    scheduler = VirtualScheduler(clock)
+    timer = WorkoutTimer(1, 1, 10 ** 6, CuePlayer(NullBackend()), scheduler, clock)
+    Interface(timer, io.BytesIO(), size=(64, 9)).draw()
+    fine = timer.fine_seconds
+
+    def measure(seconds: float) -> Dict[str, float]:
+        started = time.process_time()
+        wakeups = scheduler.run(until=clock.now + seconds)
+        cpu = time.process_time() - started
+        return {'wakeups': wakeups / seconds, 'cpu_us': cpu / seconds * 1e6}
+
+    results = {}
+    modes = {}
+    modes['stopped'] = measure(3600)
+    timer.start()
+    timer.pause()
+    modes['paused'] = measure(3600)
+    for _ in range(args.ticks // 60 + 1):
+        timer.pause()
+        # One minute stages: the interval part first, then the final countdown
+        interval = measure(60 - fine)
+        countdown = measure(fine)
+        timer.pause()
+        for mode, stats in (('interval', interval), ('countdown', countdown)):
+            for key, value in stats.items():
+                modes.setdefault(mode, {}).setdefault(key, []).append(value)
+    for mode, stats in modes.items():
+        for key, value in stats.items():
+            results[f'{mode}_{key}'] = max(value) if isinstance(value, list) else value
+    return results
+
+
+@benchmark
+def config_reload(args: argparse.Namespace) -> dict:
+    """
+    Cost of polling an unchanged and a changed workout file, and the virtual
+    time an edit takes to reach a running session.
+    """
+    import tempfile
+    from workout_config import ConfigWatcher
+    from workout_engine import VirtualClock, VirtualScheduler, WorkoutSession
+    directory = tempfile.mkdtemp(prefix='workout_config_')
+    path = os.path.join(directory, 'workout.json')
+
+    def write(work: int) -> None:
+        with open(path, 'w') as file:
+            json.dump({'work': work, 'rest': 30, 'repetitions': 1000}, file)
+        # Editors save with a new mtime; force one even on coarse file systems
+        stamp = time.time_ns() + write.count * 10 ** 9
+        write.count += 1
+        os.utime(path, ns=(stamp, stamp))
+
+    write.count = 0
+    try:
+        write(60)
+        clock = VirtualClock()
+        scheduler = VirtualScheduler(clock)
+        timer = WorkoutSession(1, 1, 1, scheduler, clock)
+        watcher = ConfigWatcher(path)
+        watcher.apply(timer, watcher.poll())
+        watcher.attach(timer)
+        timer.start()
+        scheduler.run(until=clock.now + args.ticks)
+        reparses = watcher.parses - 1
+
+        applied = []
+        timer.add_listener(lambda event: applied.append(event.time)
+                           if timer.timeline is watcher.config.timeline else None)
+        pickups = []
+        for work in (45, 75, 50, 90, 40):
+            edited = clock.now
+            limit = timer.current_duration
+            write(work)
+            applied.clear()
+            scheduler.run(until=edited + limit + watcher.interval)
+            pickups.append(applied[0] - edited)
+
+        started = time.perf_counter()
+        for _ in range(args.ticks):
+            watcher.poll()
+        unchanged = time.perf_counter() - started
+        changed = 0.0
+        for work in range(100):
+            write(work + 1)
+            started = time.perf_counter()
+            watcher.poll()
+            changed += time.perf_counter() - started
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {
+        'unchanged_reparses': reparses,
+        'pickup_max_s': max(pickups),
+        'poll_unchanged_us': unchanged / args.ticks * 1e6,
+        'poll_changed_us': changed / 100 * 1e6,
+    }
+
+
+def library_programs(count: int):
+    """
+    Yields `count` varied (name, program, tag) triples, the same on every run.
+    """
+    import random
+    generator = random.Random(17)
+    words = ['tabata', 'pyramid', 'ladder', 'sprint', 'tempo', 'endurance', 'recovery', 'threshold',
+             'hill', 'rowing', 'cycling', 'circuit', 'strength', 'core', 'mobility', 'vo2max']
+    tags = ['', 'beginner', 'intermediate', 'advanced', 'rehab', 'team']
+    for number in range(count):
+        name = f'{generator.choice(words).title()} {generator.choice(words)} {number}'
+        if generator.random() < 0.5:
+            program = {'work': generator.randrange(10, 600, 5), 'rest': generator.randrange(0, 300, 5),
+                       'repetitions': generator.randrange(2, 40)}
+        else:
+            program = {'warmup': 300, 'cooldown': 300, 'blocks': [
+                {'name': generator.choice(words), 'rounds': generator.randrange(1, 12),
+                 'work': generator.randrange(10, 300, 5), 'rest': generator.randrange(5, 120, 5)}
+                for _ in range(generator.randrange(1, 5))]}
+        yield name, program, generator.choice(tags)
+
+
+@benchmark
+def library_search(args: argparse.Namespace) -> dict:
+    """
+    Per-keystroke cost of searching a library of 50k programs, in the library
+    alone and through the Qt picker including the repaint. A keystroke must
+    stay under one 60 Hz frame (16 ms).
+    """
+    import tempfile
+    from workout_library import ProgramLibrary
+    directory = tempfile.mkdtemp(prefix='workout_library_')
+    path = os.path.join(directory, 'library.sqlite')
+    try:
+        library = ProgramLibrary(path)
+        started = time.perf_counter()
+        library.add_many(library_programs(50000))
+        build = time.perf_counter() - started
+        typed = ['sprint tempo 4', 'Ladder hill', 'vo2max core 99', 'zzz', 'c']
+        queries = [dict(prefix=text[:length]) for text in typed for length in range(len(text) + 1)]
+        queries += [dict(query, tag='advanced') for query in queries]
+        queries += [dict(prefix='t', min_total=1800, max_total=2400), dict(min_ratio=2, max_ratio=3),
+                    dict(min_intervals=20, tag='rehab'), dict(prefix='rowing', max_total=600)]
+        searches = []
+        for query in queries:
+            started = time.perf_counter()
+            library.search(limit=101, **query)
+            searches.append(time.perf_counter() - started)
+        library.close()
+
+        app = qt_application()
+        from workout_timer_Qt5 import Interface, WorkoutTimer
+        window = Interface(WorkoutTimer(1, 1, 2), path)
+        window.show()
+        window.tab_widget.setCurrentWidget(window.tab3)
+        app.processEvents()
+        keystrokes = []
+        for text in typed:
+            for length in range(len(text) + 1):
+                started = time.perf_counter()
+                window.library_search_input.setText(text[:length])
+                app.processEvents()
+                keystrokes.append(time.perf_counter() - started)
+        window.library.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    searches.sort()
+    keystrokes.sort()
+    assert keystrokes[-1] < 0.016, f'a keystroke took {keystrokes[-1] * 1e3:.1f} ms'
+    return {
+        'build_50k_s': build,
+        'search_p50_ms': searches[len(searches) // 2] * 1e3,
+        'search_max_ms': searches[-1] * 1e3,
+        'keystroke_p50_ms': keystrokes[len(keystrokes) // 2] * 1e3,
+        'keystroke_max_ms': keystrokes[-1] * 1e3,
+    }
+
+
+@benchmark
+def analytics(args: argparse.Namespace) -> dict:
+    """
+    Cost of the weekly and monthly training report over five years of history
+    for 300 athletes: computed from scratch, reopened from its cached totals,
+    and after new sessions land. The incremental totals must equal a rebuild.
+    """
+    import tempfile
+    import numpy as np
+    from workout_analytics import HISTORY_DTYPE, METRICS, PERIODS, TrainingReport
+    from workout_history import MAGIC
+    generator = np.random.default_rng(18)
+    count = 300 * 5 * 52 * 4
+    records = np.empty(count, HISTORY_DTYPE)
+    records['start'] = np.sort(generator.uniform(1.5e9, 1.5e9 + 5 * 365 * 86400, count))
+    records['athlete'] = generator.integers(0, 300, count)
+    records['planned'] = generator.integers(4, 40, count)
+    records['skipped'] = generator.integers(0, 3, count)
+    records['achieved'] = records['planned'] - records['skipped']
+    records['work_time'] = records['achieved'] * generator.uniform(30, 300, count)
+    records['pause_time'] = generator.exponential(60, count)
+    directory = tempfile.mkdtemp(prefix='workout_analytics_')
+    path = os.path.join(directory, 'history')
+    try:
+        with open(path, 'wb') as file:
+            file.write(MAGIC)
+            records[:-1000].tofile(file)
+        started = time.perf_counter()
+        TrainingReport(path, utc_offset=0).refresh()
+        full = time.perf_counter() - started
+        started = time.perf_counter()
+        report = TrainingReport(path, utc_offset=0)
+        report.refresh()
+        report.table('week', 17)
+        cached = time.perf_counter() - started
+        with open(path, 'ab') as file:
+            records[-1000:].tofile(file)
+        started = time.perf_counter()
+        report = TrainingReport(path, utc_offset=0)
+        new = report.refresh()
+        incremental = time.perf_counter() - started
+        rebuilt = TrainingReport(path, os.path.join(directory, 'rebuilt.totals'), utc_offset=0)
+        rebuilt.refresh()
+        for period in PERIODS:
+            assert np.array_equal(report.totals[period].keys, rebuilt.totals[period].keys)
+            for metric in METRICS:
+                assert np.allclose(report.totals[period].values[metric],
+                                   rebuilt.totals[period].values[metric])
+        assert new == 1000 and report.records == count
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {'sessions': count, 'full_ms': full * 1e3, 'cached_open_ms': cached * 1e3,
+            'incremental_1000_ms': incremental * 1e3}
+
+
+def schedule_lateness(events, timeline, cue_seconds: int) -> Tuple[float, int]:
+    """
+    Returns how late the latest 'stage', 'cue' or 'complete' event of a
+    session started with the first 'start' event ran compared to its
+    schedule, and how many scheduled events never ran.
+    """
+    started = next(moment for kind, moment in events if kind == 'start')
+    expected = {'stage': [started + offset for offset in timeline.offsets[1:-1]],
+                'complete': [started + timeline.total], 'cue': []}
+    for index in range(len(timeline)):
+        end = timeline.offsets[index + 1]
+        expected['cue'] += [started + end - second for second in range(1, cue_seconds + 1)
+                            if end - second >= timeline.offsets[index]]
+    lateness = 0.0
+    missed = 0
+    for kind, schedule in expected.items():
+        actual = [moment for event, moment in events if event == kind]
+        # Events run in schedule order, so the n-th one that ran is the n-th one due
+        for moment, due in zip(actual, schedule):
+            lateness = max(lateness, moment - due)
+        missed += max(0, len(schedule) - len(actual))
+    return lateness, missed
+
+
+@benchmark
+def isolated_engine(args: argparse.Namespace) -> dict:
+    """
+    How late transitions and cues run while the GUI thread is frozen for
+    three seconds, with the session on the GUI thread and in an engine
+    process. The engine process must stay on schedule.
+    """
+    from timer_process import IsolatedTimer
+    from workout_engine import SelectScheduler, WorkoutSession
+    freeze = 3.0
+    scheduler = SelectScheduler()
+    session = WorkoutSession(2, 1, 6, scheduler, cue_seconds=1, fine_seconds=1)
+    events = []
+    session.add_listener(lambda event: events.append((event.kind, event.time)))
+    session.start()
+    frozen = False
+    while not session.finished:
+        time.sleep(scheduler.timeout() or 0)
+        if not frozen and session.clock() - events[0][1] > 0.5:
+            # A long layout pass or a modal loop on the GUI thread
+            time.sleep(freeze)
+            frozen = True
+        scheduler.run_due()
+    in_process, in_process_missed = schedule_lateness(events, session.timeline, 1)
+
+    timer = IsolatedTimer(2, 1, 6, cue_seconds=1, fine_seconds=1, sound=False, keep_events=True)
+    try:
+        timer.start()
+        time.sleep(0.5)
+        time.sleep(freeze)
+        deadline = time.monotonic() + 10
+        while not any(kind == 'complete' for kind, _ in timer.events) and time.monotonic() < deadline:
+            time.sleep(0.05)
+            timer.receive()
+        isolated, isolated_missed = schedule_lateness(timer.events, session.timeline, 1)
+    finally:
+        timer.close()
+    assert isolated < 0.05 and not isolated_missed, \
+        f'the engine process ran {isolated * 1e3:.0f} ms late and missed {isolated_missed} events'
+    return {'freeze_s': freeze, 'in_process_late_ms': in_process * 1e3, 'in_process_missed': in_process_missed,
+            'isolated_late_ms': isolated * 1e3, 'isolated_missed': isolated_missed}
+
+
+@benchmark
+def heart_rate(args: argparse.Namespace) -> dict:
+    """
+    Cost and memory growth of ingesting heart-rate samples, how soon a rest
+    ends after the smoothed heart rate recovers, and how late the session's
+    own events run while a 200 Hz stream arrives over UDP. Ingestion must not
+    allocate per sample, a recovered rest must end within one check interval
+    and the stream must not delay the session.
+    """
+    import socket
+    import threading
+    import tracemalloc
+    from heart_rate import SAMPLE, AdaptiveRest, HeartRateBuffer, HeartRateMonitor, SocketSource
+    from workout_engine import SelectScheduler, VirtualClock, VirtualScheduler, WorkoutSession
+    from workout_program import KINDS, REST
+    samples = 100000
+    buffer = HeartRateBuffer()
+    started = time.perf_counter()
+    for index in range(samples):
+        buffer.append(index * 0.01, 120.0 + index % 40)
+    append = (time.perf_counter() - started) / samples
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for index in range(samples, 2 * samples):
+        buffer.append(index * 0.01, 120.0 + index % 40)
+    growth = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    assert growth < 1024, f'ingesting {samples} samples kept {growth} bytes'
+
+    # A virtual session fed at 100 Hz: the heart rate climbs during work and
+    # recovers exponentially during rest
+    clock = VirtualClock()
+    scheduler = VirtualScheduler(clock)
+    session = WorkoutSession(60, 180, 6, scheduler, clock)
+    buffer = HeartRateBuffer()
+    rest = AdaptiveRest(buffer, threshold=120, min_rest=10)
+    rest.attach(session)
+    rests = []
+
+    def on_event(event) -> None:
+        if rests and rests[-1][1] is None and event.kind in ('stage', 'complete'):
+            rests[-1][1] = event.time
+        if event.kind == 'stage' and session.current_kind == KINDS[REST]:
+            rests.append([event.time, None])
+
+    session.add_listener(on_event)
+    session.start()
+    rate = 90.0
+    recovered = []
+    step = 0
+    while not session.finished:
+        step += 1
+        scheduler.run(until=step * 0.01)
+        resting = session.current_kind == KINDS[REST]
+        rate += ((95.0 if resting else 170.0) - rate) * (0.0003 if resting else 0.003)
+        buffer.append(clock.now, rate)
+        if resting and rests and len(recovered) < len(rests) and rest.recovered(clock.now):
+            recovered.append(clock.now)
+    lags = [end - moment for (_, end), moment in zip(rests, recovered)]
+    assert len(lags) == len(rests) and max(lags) <= rest.check_interval, \
+        f'rests ended {max(lags, default=math.inf):.2f} s after recovery'
+    rest_s = sum(end - start for start, end in rests) / len(rests)
+
+    # Real time: the same session schedule with and without a sensor stream
+    def lateness(stream: bool) -> Tuple[float, int, float]:
+        source = SocketSource(0)
+        monitor = HeartRateMonitor(source)
+        port = source.socket.getsockname()[1]
+        sending = stream
+
+        def send() -> None:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sender:
+                while sending:
+                    sender.sendto(SAMPLE.pack(time.monotonic(), 150.0), ('127.0.0.1', port))
+                    time.sleep(0.005)
+
+        thread = threading.Thread(target=send)
+        thread.start()
+        select = SelectScheduler()
+        timed = WorkoutSession(2, 1, 6, select, cue_seconds=1, fine_seconds=1)
+        # A threshold nobody reaches keeps the programmed schedule
+        AdaptiveRest(monitor.buffer, threshold=0).attach(timed)
+        events = []
+        timed.add_listener(lambda event: events.append((event.kind, event.time)))
+        timed.start()
+        while not timed.finished:
+            time.sleep(select.timeout() or 0)
+            select.run_due()
+        sending = False
+        thread.join()
+        monitor.close()
+        late, missed = schedule_lateness(events, timed.timeline, 1)
+        return late, missed, monitor.samples / timed.timeline.total
+
+    quiet, _, _ = lateness(False)
+    streamed, missed, received = lateness(True)
+    assert received > 100 and not missed and streamed < quiet + 0.02, \
+        f'with {received:.0f} samples/s the session ran {streamed * 1e3:.0f} ms late'
+    return {'append_us': append * 1e6, 'memory_growth_bytes': growth, 'recovery_lag_max_s': max(lags),
+            'rest_mean_s': rest_s, 'stream_samples_per_s': received,
+            'quiet_late_ms': quiet * 1e3, 'stream_late_ms': streamed * 1e3}
+
+
+@benchmark
+def voice_cues(args: argparse.Namespace) -> dict:
+    """
+    Cost of rendering, opening and playing from a voice pack for a 500-round
+    program. With prefetching every phrase must be a cache hit when it is
+    played, and the decoded cache must stay within its byte budget.
+    """
+    import tempfile
+    from audio_cues import CuePlayer, NullBackend
+    from voice_cues import VoiceAnnouncer, VoicePack
+    from workout_engine import VirtualClock, VirtualScheduler, WorkoutSession
+    rounds = 500
+    directory = tempfile.mkdtemp(prefix='workout_voice_')
+    path = os.path.join(directory, 'voice.pack')
+    try:
+        clock = VirtualClock()
+        session = WorkoutSession(30, 10, 2 * rounds, VirtualScheduler(clock), clock)
+        pack = VoicePack(path, max_bytes=256 * 1024)
+        silent = CuePlayer(NullBackend())
+        lister = VoiceAnnouncer(session, silent)
+        phrases = [phrase for index in range(len(session.timeline) + 1)
+                   for phrase in lister.interval_phrases(index)] + lister.countdown_phrases()
+        silent.close()
+        started = time.perf_counter()
+        pack.render(phrases)
+        render = time.perf_counter() - started
+        pack.close()
+        started = time.perf_counter()
+        pack = VoicePack(path, max_bytes=256 * 1024)
+        open_ms = (time.perf_counter() - started) * 1e3
+
+        class Player:
+            """
+            Plays straight from the pack on the calling thread, timing each cue.
+            """
+            latencies = []
+            misses = 0
+            peak = 0
+
+            def play(self, name: str) -> None:
+                decodes = pack.decodes
+                started = time.perf_counter()
+                pack.wav(name)
+                self.latencies.append(time.perf_counter() - started)
+                self.misses += pack.decodes - decodes
+                self.peak = max(self.peak, pack.cached_bytes)
+
+            def prefetch(self, names) -> None:
+                pack.prefetch(names)
+                self.peak = max(self.peak, pack.cached_bytes)
+
+        player = Player()
+        announcer = VoiceAnnouncer(session, player)
+        session.add_listener(announcer.announce)
+        session.start()
+        session.scheduler.run()
+        assert not player.misses, f'{player.misses} phrases were decoded when played'
+        assert player.peak <= pack.max_bytes, f'the cache held {player.peak} bytes'
+        latencies = sorted(player.latencies)
+        decoded = 0.0
+        for phrase in phrases[:200]:
+            pack.cache.clear()
+            started = time.perf_counter()
+            pack.wav(phrase)
+            decoded += time.perf_counter() - started
+        size = os.path.getsize(path)
+        pack.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {'phrases': len(set(phrases)), 'render_s': render, 'pack_kib': size / 1024, 'open_ms': open_ms,
+            'played': len(latencies), 'play_p50_us': latencies[len(latencies) // 2] * 1e6,
+            'play_max_us': latencies[-1] * 1e6, 'decode_us': decoded / 200 * 1e6,
+            'cache_peak_kib': player.peak / 1024}
+
+
+@benchmark
+def clock_sync(args: argparse.Namespace) -> dict:
+    """
+    How far from the leader displays with offset, drifting clocks place the
+    stage ends, over loopback with 5 ms added before each message is read:
+    mapping the published deadline through a ClockSync, and counting from
+    the arrival of the message. Synchronized displays must be within 2 ms.
+    """
+    from clock_sync import ClockServer, ClockSync
+    from timer_broadcast import BroadcastPublisher, RemoteTimer
+    from workout_engine import SelectScheduler, WorkoutSession
+    latency = 0.005
+    # Drift and offset of each display's clock from the leader's
+    skews = ((250e-6, 41.5), (-180e-6, -1234.25))
+    clocks = [lambda drift=drift, offset=offset: time.monotonic() * (1 + drift) + offset
+              for drift, offset in skews]
+    server = ClockServer(0, '127.0.0.1')
+    syncs = [ClockSync(server.address, clock, interval=0.1) for clock in clocks]
+    synced = [RemoteTimer(port=0, group=None, host='127.0.0.1', clock=clock, clock_sync=sync)
+              for clock, sync in zip(clocks, syncs)]
+    arrival = [RemoteTimer(port=0, group=None, host='127.0.0.1', clock=clock) for clock in clocks]
+    time.sleep(1.0)
+    offset_errors = []
+    for sync, (drift, offset) in zip(syncs, skews):
+        now = time.monotonic()
+        offset_errors.append(abs(sync.to_local(now) - (now * (1 + drift) + offset)))
+
+    scheduler = SelectScheduler()
+    session = WorkoutSession(1, 1, 6, scheduler)
+    publisher = BroadcastPublisher(session, [client.socket.getsockname() for client in synced + arrival],
+                                   keyframe_interval=0)
+    errors = {'synced': [], 'arrival': []}
+    session.start()
+    while not session.finished:
+        time.sleep(scheduler.timeout() or 0)
+        scheduler.run_due()
+        if not session.running:
+            continue
+        # A Wi-Fi hop and a busy event loop between sending and reading
+        time.sleep(latency)
+        for mode, clients in (('synced', synced), ('arrival', arrival)):
+            for client, (drift, offset) in zip(clients, skews):
+                if client.receive() and client.running:
+                    # The display's deadline on the leader's clock
+                    end = (client.deadline - offset) / (1 + drift)
+                    errors[mode].append(abs(end - session.deadline))
+    publisher.close()
+    for sync in syncs:
+        sync.close()
+    server.close()
+    for client in synced + arrival:
+        client.close()
+    assert errors['synced'] and max(errors['synced']) < 0.002, \
+        f"synchronized displays were {max(errors['synced'], default=math.inf) * 1e3:.2f} ms off"
+    return {'offset_error_us': max(offset_errors) * 1e6,
+            # The estimate is the drift of the leader's clock from the display's
+            'drift_error_ppm': max(abs(sync.estimate.drift + drift / (1 + drift)) * 1e6
+                                   for sync, (drift, _) in zip(syncs, skews)),
+            'synced_max_ms': max(errors['synced']) * 1e3, 'arrival_max_ms': max(errors['arrival']) * 1e3}
+
+
+@benchmark
+def undo_history(args: argparse.Namespace) -> dict:
+    """
+    Cost of recording a control action and of undoing it, on a short program
+    and on one with a million intervals.
+    """
+    from workout_engine import VirtualClock, VirtualScheduler, WorkoutSession
+    from workout_undo import UndoHistory
+    results = {}
+    for repetitions in (10, 10 ** 6):
+        clock = VirtualClock()
+        session = WorkoutSession(480, 120, repetitions, VirtualScheduler(clock), clock)
+        history = UndoHistory(session, limit=100)
+        session.start()
+        clock.advance(100.25)
+
+        started = time.perf_counter()
+        for _ in range(args.ticks):
+            history.perform(session.pause)
+        perform = (time.perf_counter() - started) / args.ticks
+        started = time.perf_counter()
+        undone = 0
+        while history.undo():
+            undone += 1
+        undo = (time.perf_counter() - started) / undone
+        results[f'perform_{repetitions}_us'] = perform * 1e6
+        results[f'undo_{repetitions}_us'] = undo * 1e6
+    results['state_bytes'] = sys.getsizeof(history.capture())
+    return results
+
+
+@benchmark
+def remote_control(args: argparse.Namespace) -> dict:
+    """
+    Command-to-render latency of the HTTP remote control, with four
+    keep-alive clients firing a steady `--rate` commands per second between
+    them at a session run by a select loop standing in for the GUI loop,
+    then the most commands per second they get through flat out. Every
+    command must run, in batches, within 10 ms at the 99th percentile of
+    the steady load.
+
+    The clients send prepared requests and read the replies off the socket,
+    like a pedal, so their own HTTP library does not take the CPU the server
+    is measured on.
+    """
+    import selectors
+    import socket
+    import threading
+    from instrumentation import Histogram, Instruments
+    from remote_control import RemoteControl, session_commands
+    from workout_engine import SelectScheduler, WorkoutSession
+    from workout_undo import UndoHistory
+    clients = 4
+    per_client = args.commands // clients
+    scheduler = SelectScheduler()
+    session = WorkoutSession(480, 120, 16, scheduler)
+    history = UndoHistory(session)
+    renders = []
+    session.subscribe(renders.append)
+    remote = RemoteControl(session, session_commands(session, history.perform, history), 0)
+    session.start()
+    selector = selectors.DefaultSelector()
+    selector.register(remote, selectors.EVENT_READ)
+    refused = []
+
+    host = f'{remote.address[0]}:{remote.address[1]}'
+    sequence = [f'POST /{name} HTTP/1.1\r\nHost: {host}\r\nContent-Length: 0\r\n\r\n'.encode()
+                for name in ('next', 'back', 'toggle', 'next', 'undo', 'toggle')]
+
+    def client(number: int, interval: float) -> None:
+        connection = socket.create_connection(remote.address)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        replies = connection.makefile('rb')
+        due = time.perf_counter()
+        for index in range(per_client):
+            due += interval
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            connection.sendall(sequence[(number + index) % len(sequence)])
+            status = int(replies.readline().split()[1])
+            length = 0
+            for line in iter(replies.readline, b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line[15:])
+            replies.read(length)
+            if status != 202:
+                refused.append(status)
+        replies.close()
+        connection.close()
+
+    def run(interval: float) -> Tuple[Histogram, float, int, int]:
+        remote.instruments = Instruments()
+        batches, rendered = remote.batches, len(renders)
+        threads = [threading.Thread(target=client, args=(number, interval)) for number in range(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        ran = 0
+        while ran < per_client * clients:
+            if selector.select(min(scheduler.timeout() or 0.1, 0.1)):
+                ran += remote.run_pending()
+            scheduler.run_due()
+        elapsed = time.perf_counter() - started
+        for thread in threads:
+            thread.join()
+        return (remote.instruments.histogram('remote_latency'), ran / elapsed,
+                remote.batches - batches, len(renders) - rendered)
+
+    steady, rate, batches, rendered = run(clients / args.rate)
+    flat_out, peak, _, _ = run(0.0)
+
+    selector.close()
+    remote.close()
+    assert not refused, f'{len(refused)} commands were refused'
+    assert steady.percentile(0.99) < 0.010, \
+        f'commands took {steady.percentile(0.99) * 1e3:.1f} ms to render at the 99th percentile'
+    return {'commands_per_second': rate, 'batches': batches, 'renders': rendered,
+            'latency_p50_ms': steady.percentile(0.5) * 1e3, 'latency_p99_ms': steady.percentile(0.99) * 1e3,
+            'latency_max_ms': steady.maximum * 1e3, 'peak_commands_per_second': peak,
+            'peak_latency_p99_ms': flat_out.percentile(0.99) * 1e3}
+
+
+@benchmark
+def tk_labels(args: argparse.Namespace) -> dict:
+    """
+    Per-tick cost of the Tk Interface updates, with three labels and with
+    the single canvas, at the default size and, for the canvas, fullscreen
+    on a 4K wall display.
+    """
+    try:
+        server = x_display()
+    except RuntimeError as error:
+        return {'skipped': str(error)}
+    try:
+        from audio_cues import CuePlayer, NullBackend
+        from workout_engine import VirtualClock
+        from workout_timer_Tk import Interface, WorkoutTimer
+        results = {}
+        for prefix, canvas, geometry in (('', False, None), ('canvas_', True, None),
+                                         ('canvas_4k_', True, '3840x2160')):
+            clock = VirtualClock()
+            timer = WorkoutTimer(1, 1, args.ticks, cues=CuePlayer(NullBackend()))
+            timer.clock = clock
+            interface = Interface(timer, canvas=canvas)
+            if geometry is not None:
+                interface.root.geometry(geometry)
+            interface.root.update()
+            timer.start()
+            updating = drawing = 0.0
+            for _ in range(args.ticks):
+                clock.advance(1.0)
+                timer.update()
+                started = time.perf_counter()
+                timer.feed.publish()
+                updated = time.perf_counter()
+                interface.root.update_idletasks()
+                updating += updated - started
+                drawing += time.perf_counter() - updated
+            if canvas:
+                display = interface.display
+                assert display.texts[1] == display.canvas.itemcget(display.items[1], 'text'), \
+                    'the canvas does not show the countdown'
+                results[prefix + 'font_size'] = display.font_size
+            interface.root.destroy()
+            results[prefix + 'update_us'] = updating / args.ticks * 1e6
+            results[prefix + 'draw_us'] = drawing / args.ticks * 1e6
+        return results
+    finally:
+        if server is not None:
+            server.terminate()
+
+
+def import_times(module: str, environment: dict) -> Dict[str, float]:
+    """
+    Cumulative import time in milliseconds of a module and of each of its
+    direct imports, as reported by `python -X importtime`.
+    """
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                               env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                               text=True)
+    times = {}
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth <= 1:
+            times[name.strip()] = int(fields[1]) / 1e3
+    return times
+
+
+def imported_modules(module: str, environment: dict) -> List[str]:
+    """
+    Names of every module loaded by importing `module` in a fresh interpreter.
+    """
+    completed = subprocess.run([sys.executable, '-c', f'import sys, {module}; print(*sys.modules)'],
+                               env=environment, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    return completed.stdout.split()
+
+
+# Features a frontend only loads when a command-line flag turns them on
+OPTIONAL_MODULES = ('clock_sync', 'heart_rate', 'remote_control', 'timer_broadcast', 'timer_process',
+                    'voice_cues', 'workout_config', 'workout_history', 'workout_journal', 'workout_library',
+                    'logging')
+
+# Most milliseconds importing each frontend may take
+IMPORT_BUDGETS_MS = {'qt': 230, 'tk': 150}
+
+
+@benchmark
+def startup(args: argparse.Namespace) -> dict:
+    """
+    Wall time from launching each entry point to its first frame and the
+    import time of its module, best of a few runs. Importing a frontend
+    must not load any optional feature nor take longer than its budget.
+    """
+    results = {}
+    entry_points = {'qt': 'workout_timer_Qt5.py', 'tk': 'workout_timer_Tk.py'}
+    environment = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    for name, script in entry_points.items():
+        module = script[:-3]
+        loaded = [feature for feature in OPTIONAL_MODULES if feature in imported_modules(module, environment)]
+        assert not loaded, f'importing {module} loads {", ".join(loaded)}'
+        imports = min((import_times(module, environment) for _ in range(args.runs)),
+                      key=lambda times: times.get(module, math.inf))
+        if module in imports:
+            results[f'{name}_import_ms'] = imports.pop(module)
+            slowest = sorted(imports.items(), key=lambda item: -item[1])[:3]
+            results[f'{name}_slowest_imports'] = ', '.join(f'{imported} {ms:.1f} ms' for imported, ms in slowest)
+            assert results[f'{name}_import_ms'] < IMPORT_BUDGETS_MS[name], \
+                f"importing {module} took {results[f'{name}_import_ms']:.0f} ms"
+        if name == 'tk':
+            try:
+                server = x_display()
+            except RuntimeError as error:
+                results['tk_skipped'] = str(error)
+                continue
+            environment['DISPLAY'] = os.environ['DISPLAY']
+        else:
+            server = None
+        try:
+            best = None
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                completed = subprocess.run([sys.executable, script, '--first-frame', '--journal', ''],
+                                           env=environment,
+                                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                elapsed = time.perf_counter() - started
+                if completed.returncode != 0:
+                    results[f'{name}_failed'] = f'exit status {completed.returncode}'
+                    break
+                best = elapsed if best is None else min(best, elapsed)
+            if best is not None:
+                results[f'{name}_ms'] = best * 1e3
+        finally:
+            if server is not None:
+                server.terminate()
+    return results
+
+
+JOURNAL_CHILD = """
+import sys, time
+from workout_engine import WorkoutSession
+from workout_journal import SessionJournal
+session = WorkoutSession(60, 30, 8)
+SessionJournal(sys.argv[1]).attach(session)
+session.start()
+time.sleep(0.3)
+session.next()
+print(time.time(), flush=True)
+time.sleep(60)
+"""
+
+
+@benchmark
+def journal(args: argparse.Namespace) -> dict:
+    """
+    Per-event journal cost, and recovery accuracy after killing a process mid-interval.
+    """
+    import tempfile
+    from workout_engine import Event, WorkoutSession
+    from workout_journal import SessionJournal
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'session.journal')
+        session = WorkoutSession(60, 30, 8)
+        writer = SessionJournal(path, flush_interval=3600)
+        writer.attach(session)
+        event = Event(time.monotonic(), 'stage', session.current_stage, 8, 60)
+        started = time.perf_counter()
+        for _ in range(args.ticks):
+            writer.record(event)
+        record = (time.perf_counter() - started) / args.ticks
+        started = time.perf_counter()
+        writer.flush()
+        flush = time.perf_counter() - started
+        writer.close()
+
+        child = subprocess.Popen([sys.executable, '-c', JOURNAL_CHILD, path], stdout=subprocess.PIPE, text=True)
+        skipped_at = float(child.stdout.readline())
+        time.sleep(0.8)
+        child.kill()
+        child.wait()
+        resumed = WorkoutSession(60, 30, 8)
+        reader = SessionJournal(path)
+        reader.attach(resumed)
+        # The child skipped to the rest stage, 60 s into the session, and kept running
+        error = resumed.elapsed() - (60 + time.time() - skipped_at)
+        reader.close()
+    return {'record_us': record * 1e6, 'flush_ms_per_batch': flush * 1e3, 'batch_events': args.ticks,
+            'recovered_stage': resumed.current_stage, 'recovery_error_ms': error * 1e3}
+
+
+def git_commit() -> Optional[str]:
+    """
+    Returns the current commit hash, if the benchmarks run from a git checkout.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_value(value) -> str:
+    return f'{value:.2f}' if isinstance(value, float) else str(value)
+
+
+def compare(results: Dict[str, dict], path: str) -> None:
+    """
+    Prints every numeric result next to the same result from an earlier JSON file.
+    """
+    with open(path) as file:
+        baseline = json.load(file)
+    print(f"compared with {baseline.get('commit')} ({path})")
+    for name, result in results.items():
+        previous = baseline['results'].get(name, {})
+        for key, value in result.items():
+            before = previous.get(key)
+            if isinstance(value, (int, float)) and isinstance(before, (int, float)) and before:
+                print(f'  {name}.{key}: {format_value(before)} -> {format_value(value)} '
+                      f'({(value - before) / before:+.1%})')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('names', nargs='*', help='benchmarks to run (default: all)')
+    parser.add_argument('--ticks', type=int, default=2000, help='ticks per render benchmark')
+    parser.add_argument('--sessions', type=int, default=1000, help='sessions per engine benchmark')
+    parser.add_argument('--concurrent', type=int, default=10000, help='sessions per server benchmark')
+    parser.add_argument('--clients', type=int, default=48, help='displays per broadcast benchmark')
+    parser.add_argument('--commands', type=int, default=8000, help='commands per remote control benchmark')
+    parser.add_argument('--rate', type=float, default=2000, help='commands per second of the steady remote load')
+    parser.add_argument('--runs', type=int, default=5, help='launches per startup benchmark')
+    parser.add_argument('--json', metavar='PATH', help='write the results to a JSON file')
+    parser.add_argument('--compare', metavar='PATH', help='compare with results from an earlier JSON file')
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)} (choose from {', '.join(BENCHMARKS)})")
+
+    results = {}
+    for name in args.names or BENCHMARKS:
+        results[name] = BENCHMARKS[name](args)
+        print(name, ' '.join(f'{key}={format_value(value)}' for key, value in results[name].items()))
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({'commit': git_commit(), 'python': platform.python_version(),
+                       'platform': platform.platform(), 'results': results}, file, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
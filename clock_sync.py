@@ -0,0 +1,240 @@
+"""
+Clock synchronization between the station publishing a session and its displays.
+
+The leader runs a ClockServer that answers timestamped probes over UDP. A
+follower's ClockSync sends a probe every second and, like NTP, derives the
+offset of the leader's clock from the four timestamps of each round trip:
+
+    offset = ((t1 - t0) + (t2 - t3)) / 2      delay = (t3 - t0) - (t2 - t1)
+
+Round trips that queued somewhere carry the most error, so only the faster
+half of the recent ones are kept, and a least-squares line through them
+gives both the offset and the drift of the leader's clock. A RemoteTimer
+uses the estimate to map the stage deadlines the leader publishes on its
+own monotonic clock onto the follower's, so every display ends the stage
+at the same moment regardless of when the message arrived.
+"""
+import argparse
+import math
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, NamedTuple, Optional, Tuple
+
+from workout_defaults import CLOCK_PORT as PORT
+
+MAGIC = b'WTC1'
+# Magic and the follower's send time
+REQUEST = struct.Struct('!4sd')
+# Magic, the follower's send time, the leader's receive and send times
+REPLY = struct.Struct('!4sddd')
+
+# Fastest probes sent at first, before one per interval
+BURST = 8
+BURST_INTERVAL = 0.02
+# Quartz is good to a few hundred parts per million; more is noise
+MAX_DRIFT = 500e-6
+
+
+class ClockEstimate(NamedTuple):
+    """
+    The leader's clock as a line over the follower's: at follower time `t`,
+    leader time is `t + offset + drift * (t - reference)`.
+
+    `uncertainty` is half the fastest round trip used, a bound on the error
+    of the offset.
+    """
+    reference: float
+    offset: float
+    drift: float
+    uncertainty: float
+
+
+class ClockServer:
+    """
+    Answers clock probes with timestamps of `clock`, on a background thread.
+
+    Attributes
+    ----------
+    address : Tuple[str, int]
+        address the server listens on
+    requests : int
+        number of probes answered
+    """
+
+    def __init__(self, port: int = PORT, host: str = '', clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.requests = 0
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.socket.settimeout(0.5)
+        self.address = self.socket.getsockname()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='ClockServer', daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._closed = True
+        self._thread.join(1.0)
+        self.socket.close()
+
+    def _run(self) -> None:
+        clock = self.clock
+        while not self._closed:
+            try:
+                data, sender = self.socket.recvfrom(64)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            received = clock()
+            try:
+                magic, sent = REQUEST.unpack(data)
+            except struct.error:
+                continue
+            if magic != MAGIC:
+                continue
+            try:
+                self.socket.sendto(REPLY.pack(MAGIC, sent, received, clock()), sender)
+            except OSError:
+                continue
+            self.requests += 1
+
+
+class ClockSync:
+    """
+    Estimates the offset and drift of a ClockServer's clock from `clock`, on
+    a background thread.
+
+    The estimate is replaced as a whole, so readers on other threads always
+    see a consistent one.
+
+    Attributes
+    ----------
+    server : Tuple[str, int]
+        address of the ClockServer
+    interval : float
+        seconds between probes once the first burst is done
+    estimate : Optional[ClockEstimate]
+        the latest estimate, None until the first round trip
+    samples : Deque[Tuple[float, float, float]]
+        follower time, offset and round-trip delay of the recent probes
+    """
+
+    def __init__(self, server: Tuple[str, int], clock: Callable[[], float] = time.monotonic,
+                 interval: float = 1.0, window: int = 16):
+        self.server = server
+        self.clock = clock
+        self.interval = interval
+        self.estimate: Optional[ClockEstimate] = None
+        self.samples: Deque[Tuple[float, float, float]] = deque(maxlen=window)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.connect(server)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='ClockSync', daemon=True)
+        self._thread.start()
+
+    @property
+    def ready(self) -> bool:
+        return self.estimate is not None
+
+    def to_leader(self, moment: float) -> float:
+        """
+        Returns the leader's time at follower time `moment`.
+        """
+        reference, offset, drift, _ = self.estimate
+        return moment + offset + drift * (moment - reference)
+
+    def to_local(self, moment: float) -> float:
+        """
+        Returns the follower's time at leader time `moment`.
+        """
+        reference, offset, drift, _ = self.estimate
+        return (moment - offset + drift * reference) / (1 + drift)
+
+    def probe(self, timeout: float) -> bool:
+        """
+        Measures one round trip and updates the estimate.
+
+        Returns
+        -------
+        bool
+            False if no reply arrived within `timeout` seconds.
+        """
+        clock = self.clock
+        sent = clock()
+        self.socket.send(REQUEST.pack(MAGIC, sent))
+        deadline = sent + timeout
+        while True:
+            remaining = deadline - clock()
+            if remaining <= 0:
+                return False
+            self.socket.settimeout(remaining)
+            try:
+                data = self.socket.recv(64)
+            except (socket.timeout, ConnectionRefusedError):
+                return False
+            returned = clock()
+            try:
+                magic, echoed, received, replied = REPLY.unpack(data)
+            except struct.error:
+                continue
+            # Replies to earlier probes that timed out are stale
+            if magic == MAGIC and echoed == sent:
+                break
+        offset = ((received - sent) + (replied - returned)) / 2
+        delay = (returned - sent) - (replied - received)
+        self.samples.append(((sent + returned) / 2, offset, max(0.0, delay)))
+        self.estimate = self._fit()
+        return True
+
+    def close(self) -> None:
+        self._closed.set()
+        self._thread.join(1.0)
+        self.socket.close()
+
+    def _fit(self) -> ClockEstimate:
+        """
+        Fits a line through the faster half of the recent round trips.
+        """
+        samples = sorted(self.samples, key=lambda sample: sample[2])
+        best = samples[:max(1, (len(samples) + 1) // 2)]
+        count = len(best)
+        reference = math.fsum(moment for moment, _, _ in best) / count
+        offset = math.fsum(offset for _, offset, _ in best) / count
+        spread = math.fsum((moment - reference) ** 2 for moment, _, _ in best)
+        drift = 0.0
+        if count > 2 and spread > 0:
+            drift = math.fsum((moment - reference) * (value - offset) for moment, value, _ in best) / spread
+            drift = max(-MAX_DRIFT, min(MAX_DRIFT, drift))
+        return ClockEstimate(reference, offset, drift, best[0][2] / 2)
+
+    def _run(self) -> None:
+        probes = 0
+        while not self._closed.is_set():
+            interval = BURST_INTERVAL if probes < BURST else self.interval
+            try:
+                self.probe(min(interval, 0.5))
+            except OSError:
+                pass
+            probes += 1
+            self._closed.wait(interval)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the clock offset of a workout timer station')
+    parser.add_argument('host', help='station running with --broadcast')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    sync = ClockSync((args.host, args.port))
+    time.sleep(args.seconds)
+    sync.close()
+    if sync.estimate is None:
+        parser.exit(1, f'no reply from {args.host}:{args.port}\n')
+    estimate = sync.estimate
+    print(f'offset {estimate.offset * 1e3:.3f} ms ± {estimate.uncertainty * 1e3:.3f} ms, '
+          f'drift {estimate.drift * 1e6:.1f} ppm over {len(sync.samples)} round trips')
@@ -0,0 +1,336 @@
+"""
+Heart-rate input: sample sources, a ring buffer with rolling smoothing, and
+rest stages that end when the athlete has recovered.
+
+A HeartRateMonitor reads samples from a source on a background thread into
+a HeartRateBuffer, whose storage is allocated once and whose rolling mean is
+updated in constant time per sample. AdaptiveRest checks the smoothed rate
+a few times a second on the session's scheduler and ends a rest stage as
+soon as it is below the recovery threshold, so the GUI thread never touches
+individual samples.
+
+Sources stand in for a BLE strap:
+
+    udp:PORT    datagrams of little-endian (seconds, bpm) float64 pairs
+    PATH        a text file of "seconds,bpm" lines, replayed in real time
+"""
+import math
+import selectors
+import socket
+import struct
+import sys
+import threading
+import time
+from array import array
+from typing import Any, Callable, Optional
+
+from workout_engine import Event
+from workout_program import KINDS, REST
+
+PORT = 5008
+SAMPLE = struct.Struct('<dd')
+# Largest datagram read at once: 256 samples
+DATAGRAM_SIZE = 256 * SAMPLE.size
+
+
+class HeartRateBuffer:
+    """
+    The latest heart-rate samples in fixed-size arrays, with their rolling mean.
+
+    Samples are written by one thread and read by any; the smoothed value is
+    a plain attribute read, so readers never wait for the writer.
+
+    Attributes
+    ----------
+    capacity : int
+        number of samples kept
+    window : float
+        seconds of samples the rolling mean covers
+    times : array
+        sample times on the local monotonic clock, as a ring
+    values : array
+        heart rates in beats per minute, as a ring
+    count : int
+        number of samples appended so far
+    smoothed : Optional[float]
+        mean of the samples in the last `window` seconds, None before the first
+    """
+
+    def __init__(self, capacity: int = 4096, window: float = 5.0):
+        self.capacity = capacity
+        self.window = window
+        self.times = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.count = 0
+        self.smoothed: Optional[float] = None
+        # Index of the oldest sample in the window, counted like `count`
+        self._first = 0
+        self._sum = 0.0
+
+    @property
+    def latest_time(self) -> Optional[float]:
+        """
+        Time of the newest sample, None before the first.
+        """
+        return self.times[(self.count - 1) % self.capacity] if self.count else None
+
+    def append(self, moment: float, value: float) -> None:
+        """
+        Adds a sample and updates the rolling mean.
+        """
+        capacity = self.capacity
+        times = self.times
+        values = self.values
+        count = self.count
+        first = self._first
+        total = self._sum
+        if count - first == capacity:
+            # The oldest sample in the window is about to be overwritten
+            total -= values[first % capacity]
+            first += 1
+        slot = count % capacity
+        times[slot] = moment
+        values[slot] = value
+        total += value
+        count += 1
+        start = moment - self.window
+        while times[first % capacity] < start:
+            total -= values[first % capacity]
+            first += 1
+        if slot == capacity - 1:
+            # Resynchronize the running sum once per lap so rounding errors cannot build up
+            total = math.fsum(values[index % capacity] for index in range(first, count))
+        self.count = count
+        self._first = first
+        self._sum = total
+        self.smoothed = total / (count - first)
+
+
+class SocketSource:
+    """
+    Receives heart-rate samples as UDP datagrams.
+
+    Each datagram holds one or more (seconds, bpm) pairs in the sender's
+    clock; they are moved onto the local monotonic clock by the offset
+    measured at the first datagram.
+    """
+
+    def __init__(self, port: int = PORT, host: str = '127.0.0.1',
+                 clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.socket.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.socket, selectors.EVENT_READ)
+        # Datagrams are received straight into an array of floats, read without unpacking
+        self._data = array('d', bytes(DATAGRAM_SIZE))
+        self._offset: Optional[float] = None
+
+    def wait(self, timeout: float) -> None:
+        """
+        Blocks until samples may be available or `timeout` seconds passed.
+        """
+        self.selector.select(timeout)
+
+    def read(self, buffer: HeartRateBuffer) -> int:
+        """
+        Appends every waiting sample to `buffer` and returns how many there were.
+        """
+        data = self._data
+        count = 0
+        while True:
+            try:
+                size = self.socket.recv_into(data)
+            except (BlockingIOError, InterruptedError):
+                return count
+            samples = size // SAMPLE.size
+            if not samples:
+                continue
+            if sys.byteorder == 'big':
+                data.byteswap()
+            if self._offset is None:
+                self._offset = self.clock() - data[0]
+            offset = self._offset
+            append = buffer.append
+            for index in range(0, 2 * samples, 2):
+                append(data[index] + offset, data[index + 1])
+            count += samples
+
+    def close(self) -> None:
+        self.selector.close()
+        self.socket.close()
+
+
+class ReplaySource:
+    """
+    Replays a recording of "seconds,bpm" lines in real time, starting on the first read.
+    """
+
+    def __init__(self, path: str, speed: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.speed = speed
+        self.times = array('d')
+        self.values = array('d')
+        with open(path) as file:
+            for number, line in enumerate(file, 1):
+                line = line.split('#')[0].strip()
+                if not line:
+                    continue
+                try:
+                    moment, value = (float(field) for field in line.split(','))
+                except ValueError:
+                    raise ValueError(f'{path}:{number}: expected "seconds,bpm", got {line!r}') from None
+                self.times.append(moment)
+                self.values.append(value)
+        self._next = 0
+        self._start: Optional[float] = None
+
+    def _due(self, index: int) -> float:
+        return self._start + (self.times[index] - self.times[0]) / self.speed
+
+    def wait(self, timeout: float) -> None:
+        """
+        Sleeps until the next sample is due or `timeout` seconds passed.
+        """
+        if self._start is None or self._next >= len(self.times):
+            time.sleep(timeout)
+        else:
+            time.sleep(min(timeout, max(0.0, self._due(self._next) - self.clock())))
+
+    def read(self, buffer: HeartRateBuffer) -> int:
+        """
+        Appends the samples due by now to `buffer` and returns how many there were.
+        """
+        now = self.clock()
+        if self._start is None:
+            self._start = now
+        first = index = self._next
+        while index < len(self.times) and self._due(index) <= now:
+            buffer.append(self._due(index), self.values[index])
+            index += 1
+        self._next = index
+        return index - first
+
+    def close(self) -> None:
+        pass
+
+
+def open_source(spec: str, clock: Callable[[], float] = time.monotonic) -> Any:
+    """
+    Opens a source from its command-line form: udp:PORT or a recording to replay.
+
+    Raises
+    ------
+    OSError, ValueError
+        If the source cannot be opened.
+    """
+    if spec.startswith('udp:'):
+        try:
+            port = int(spec[4:])
+        except ValueError:
+            raise ValueError(f'not a port: {spec[4:]!r}') from None
+        return SocketSource(port, clock=clock)
+    return ReplaySource(spec, clock=clock)
+
+
+class HeartRateMonitor:
+    """
+    Reads a source into a buffer on a background thread.
+
+    Attributes
+    ----------
+    source : object
+        anything with `wait(timeout)`, `read(buffer) -> int` and `close()`
+    buffer : HeartRateBuffer
+        the buffer the samples go to
+    samples : int
+        number of samples read
+    """
+
+    def __init__(self, source: Any, buffer: Optional[HeartRateBuffer] = None):
+        self.source = source
+        self.buffer = buffer if buffer is not None else HeartRateBuffer()
+        self.samples = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='HeartRateMonitor', daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._closed = True
+        self._thread.join(1.0)
+        self.source.close()
+
+    def _run(self) -> None:
+        while not self._closed:
+            self.source.wait(0.1)
+            self.samples += self.source.read(self.buffer)
+
+
+class AdaptiveRest:
+    """
+    Ends rest stages once the smoothed heart rate has recovered below a threshold.
+
+    The programmed rest duration stays as the upper bound, so a session with
+    a lost sensor still moves on.
+
+    Attributes
+    ----------
+    buffer : HeartRateBuffer
+        the heart rate to follow
+    threshold : float
+        recovered heart rate in beats per minute
+    min_rest : float
+        seconds every rest lasts at least
+    max_age : float
+        seconds after which the latest sample is too old to end a rest
+    check_interval : float
+        seconds between checks during rest
+    """
+
+    def __init__(self, buffer: HeartRateBuffer, threshold: float, min_rest: float = 10.0,
+                 max_age: float = 3.0, check_interval: float = 0.25):
+        self.buffer = buffer
+        self.threshold = threshold
+        self.min_rest = min_rest
+        self.max_age = max_age
+        self.check_interval = check_interval
+        self.session = None
+        self.scheduler = None
+        self._handle = None
+
+    def attach(self, session, scheduler: Any = None) -> None:
+        """
+        Follows the rest stages of `session`, checking on `scheduler` (default is the session's).
+        """
+        self.session = session
+        self.scheduler = scheduler if scheduler is not None else session.scheduler
+        session.add_listener(self._on_event)
+
+    def recovered(self, now: float) -> bool:
+        """
+        Returns whether the current rest stage can end at `now`.
+        """
+        session = self.session
+        latest = self.buffer.latest_time
+        smoothed = self.buffer.smoothed
+        return (latest is not None and now - latest <= self.max_age and smoothed < self.threshold
+                and session.current_duration - session.remaining_time(now) >= self.min_rest)
+
+    def _on_event(self, event: Event) -> None:
+        if self._handle is not None:
+            self.scheduler.cancel(self._handle)
+            self._handle = None
+        session = self.session
+        if session.running and session.current_kind == KINDS[REST]:
+            self._handle = self.scheduler.call_later(self.check_interval, self._check)
+
+    def _check(self) -> None:
+        self._handle = None
+        session = self.session
+        if not session.running or session.current_kind != KINDS[REST]:
+            return
+        if self.recovered(session.clock()):
+            session.finish_stage()
+        else:
+            self._handle = self.scheduler.call_later(self.check_interval, self._check)
@@ -0,0 +1,160 @@
+"""
+Fixed-size latency histograms for ticks, renders and audio cues.
+
+Recording a value is a few arithmetic operations and one array increment, so
+the histograms stay enabled all the time and can be read at any moment from
+the debug overlay, the --stats summary or the JSON export.
+"""
+import math
+import time
+from array import array
+from functools import wraps
+from typing import Any, Callable, Dict, Optional
+
+# Bucket i holds values up to MIN_VALUE * 2 ** ((i + 1) / STEPS_PER_OCTAVE) seconds
+MIN_VALUE = 1e-6
+STEPS_PER_OCTAVE = 4
+BUCKETS = 112
+
+
+class Histogram:
+    """
+    A log-scale histogram of durations in seconds with a fixed number of buckets.
+
+    Values from 1 us to about 4 minutes are resolved to within 19 %;
+    smaller and larger values fall into the first and last bucket.
+
+    Attributes
+    ----------
+    counts : array
+        number of values recorded in each bucket
+    count : int
+        number of values recorded
+    total : float
+        sum of the values recorded
+    maximum : float
+        largest value recorded
+    """
+
+    def __init__(self):
+        self.counts = array('L', bytes(array('L').itemsize * BUCKETS))
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, value: float) -> None:
+        """
+        Adds a duration in seconds to the histogram.
+        """
+        if value > MIN_VALUE:
+            bucket = min(BUCKETS - 1, int(math.log2(value / MIN_VALUE) * STEPS_PER_OCTAVE))
+        else:
+            bucket = 0
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += value
+        if value > self.maximum:
+            self.maximum = value
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Returns the upper bound of the bucket holding the given fraction of values.
+        """
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.maximum, MIN_VALUE * 2 ** ((bucket + 1) / STEPS_PER_OCTAVE))
+        return self.maximum
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Returns the count and the main statistics in milliseconds.
+        """
+        return {
+            'count': self.count,
+            'mean_ms': self.mean * 1e3,
+            'p50_ms': self.percentile(0.5) * 1e3,
+            'p99_ms': self.percentile(0.99) * 1e3,
+            'max_ms': self.maximum * 1e3,
+        }
+
+
+class Instruments:
+    """
+    A named set of histograms.
+
+    Attributes
+    ----------
+    histograms : Dict[str, Histogram]
+        the histograms by name, created on first use
+    """
+
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def record(self, name: str, value: float) -> None:
+        """
+        Records a duration in seconds under the given name.
+        """
+        self.histogram(name).record(value)
+
+    def timed(self, name: str, function: Callable[..., Any]) -> Callable[..., Any]:
+        """
+        Wraps a function so the wall time of every call is recorded under `name`.
+        """
+        histogram = self.histogram(name)
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.record(time.perf_counter() - started)
+
+        return wrapper
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+    def format(self) -> str:
+        """
+        Returns a one-line-per-histogram text summary.
+        """
+        lines = []
+        for name, stats in self.summary().items():
+            lines.append(f"{name:<26} n={stats['count']:<6} p50={stats['p50_ms']:.2f} ms "
+                         f"p99={stats['p99_ms']:.2f} ms max={stats['max_ms']:.2f} ms")
+        return '\n'.join(lines)
+
+    def export(self, path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Returns the summaries and raw bucket counts, writing them as JSON to `path` if given.
+        """
+        data = {
+            'min_value': MIN_VALUE,
+            'steps_per_octave': STEPS_PER_OCTAVE,
+            'histograms': {
+                name: dict(histogram.summary(), buckets=list(histogram.counts))
+                for name, histogram in sorted(self.histograms.items())
+            },
+        }
+        if path is not None:
+            import json
+            with open(path, 'w') as file:
+                json.dump(data, file, indent=2)
+        return data
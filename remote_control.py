@@ -0,0 +1,338 @@
+"""
+Remote control of a timer over HTTP, from a phone or a foot pedal.
+
+A RemoteControl serves a small HTTP API on a background thread:
+
+    POST /toggle   start or pause          POST /next    skip to the next stage
+    POST /start    start                   POST /back    go back a stage
+    POST /pause    pause                   POST /stop    stop
+    POST /undo     undo the last action    POST /redo    redo it
+    GET  /state    the displayed state as JSON
+    GET  /         a page of buttons for a phone browser
+
+The server thread never touches the timer. It appends each command to a
+CommandQueue and wakes the event loop of the frontend through a socket
+pair, which the loop watches like any other descriptor. The loop runs
+every command waiting when it wakes up and redraws once for the whole
+burst.
+
+Commands from a page of another site are refused, so a page open in the
+phone's browser cannot drive the timer: a POST whose Origin is not the
+server itself, or that carries a form body without an Origin, gets 403.
+Pedals and the command line send no Origin and no form body. A page can
+also have its own name resolve to this computer (DNS rebinding), so that
+its requests look same-origin; every request must therefore name the
+server by an IP address, localhost or one of the names it was given.
+"""
+import argparse
+import ipaddress
+import json
+import socket
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Tuple
+from urllib.parse import urlsplit
+
+from workout_defaults import REMOTE_PORT as PORT
+
+# Bodies an HTML form can send across sites without a preflight
+FORM_TYPES = ('application/x-www-form-urlencoded', 'multipart/form-data', 'text/plain')
+
+PAGE = b"""<!DOCTYPE html>
+<html><head><meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Workout timer</title>
+<style>
+body { background: #2F4F4F; margin: 0; display: grid; grid-template-columns: 1fr 1fr 1fr; gap: 8px; padding: 8px; }
+button { font: bold 6vw Helvetica, sans-serif; color: #00FF00; background: #4B0082; border: 0; padding: 8vh 0; }
+#toggle { grid-column: 1 / 4; }
+</style></head><body>
+<button id="toggle">Start/Pause</button>
+<button id="back">Back</button><button id="stop">Stop</button><button id="next">Next</button>
+<button id="undo">Undo</button><button id="redo">Redo</button>
+<script>
+for (const button of document.querySelectorAll('button'))
+  button.onclick = () => fetch('/' + button.id, {method: 'POST'});
+</script>
+</body></html>
+"""
+
+
+def session_commands(timer, control: Callable[[Callable[[], None]], None],
+                     history=None) -> Dict[str, Callable[[], None]]:
+    """
+    Returns the commands of the API for a timer, each running its action
+    through `control` like the buttons of the frontend do.
+    """
+    def pause() -> None:
+        # pause() resumes a paused timer, which a pause command must not do
+        if timer.running:
+            control(timer.pause)
+
+    commands = {
+        'toggle': lambda: control(timer.pause if timer.running else timer.start),
+        'start': lambda: control(timer.start),
+        'pause': pause,
+        'next': lambda: control(timer.next),
+        'back': lambda: control(timer.back),
+        'stop': lambda: control(timer.stop),
+    }
+    if history is not None:
+        commands['undo'] = history.undo
+        commands['redo'] = history.redo
+    return commands
+
+
+class CommandQueue:
+    """
+    Commands queued by any thread and run by the thread of an event loop.
+
+    Appending to and popping from a deque are atomic, so neither side takes
+    a lock. The first command queued after the loop has looked also writes
+    a byte to a socket pair, so a burst of commands wakes the loop once.
+
+    Attributes
+    ----------
+    queued : int
+        commands queued so far
+    """
+
+    def __init__(self):
+        self.queued = 0
+        self._commands: Deque[Tuple[float, str]] = deque()
+        self._reader, self._writer = socket.socketpair()
+        self._reader.setblocking(False)
+        self._writer.setblocking(False)
+        self._signalled = False
+
+    def fileno(self) -> int:
+        """
+        Returns the descriptor that becomes readable when commands are waiting.
+        """
+        return self._reader.fileno()
+
+    def put(self, command: str) -> None:
+        """
+        Queues a command, noting when it arrived.
+        """
+        self._commands.append((time.perf_counter(), command))
+        self.queued += 1
+        if not self._signalled:
+            self._signalled = True
+            try:
+                self._writer.send(b'\0')
+            except (BlockingIOError, OSError):
+                # The loop already has bytes to read, or is gone
+                pass
+
+    def drain(self) -> List[Tuple[float, str]]:
+        """
+        Returns the commands waiting, with the times they arrived, oldest first.
+        """
+        try:
+            while self._reader.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+        # Cleared after reading, so a command queued from now on writes a new byte
+        self._signalled = False
+        commands = []
+        while True:
+            try:
+                commands.append(self._commands.popleft())
+            except IndexError:
+                return commands
+
+    def close(self) -> None:
+        self._reader.close()
+        self._writer.close()
+
+
+class RemoteControl:
+    """
+    Serves the control API on a background thread and runs its commands on
+    the thread calling `run_pending`.
+
+    Attributes
+    ----------
+    timer : object
+        the timer whose displayed state is served, a WorkoutSession or a mirror of one
+    commands : Dict[str, Callable[[], None]]
+        the action run for each command name
+    queue : CommandQueue
+        commands received and not yet run
+    address : Tuple[str, int]
+        address the server listens on
+    allowed_hosts : FrozenSet[str]
+        host names, besides IP addresses, that requests may name the server by
+    instruments : Optional[Instruments]
+        records the time from receiving each command to redrawing after it
+        under 'remote_latency', if set
+    batches : int
+        number of times waiting commands were run
+    """
+
+    def __init__(self, timer, commands: Dict[str, Callable[[], None]], port: int = PORT,
+                 host: str = '127.0.0.1', allowed_hosts: Iterable[str] = ()):
+        self.timer = timer
+        self.commands = commands
+        self.allowed_hosts = frozenset(['localhost', *(name.lower() for name in allowed_hosts)])
+        self.queue = CommandQueue()
+        self.instruments = None
+        self.batches = 0
+        # http.server is slow to import, so frontends can read PORT without it
+        from http.server import ThreadingHTTPServer
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.address = self.server.server_address
+        threading.Thread(target=self.server.serve_forever, name='RemoteControl', daemon=True).start()
+
+    def fileno(self) -> int:
+        return self.queue.fileno()
+
+    def run_pending(self) -> int:
+        """
+        Runs every command waiting, then redraws once for all of them.
+
+        Returns
+        -------
+        int
+            The number of commands run.
+        """
+        commands = self.queue.drain()
+        if not commands:
+            return 0
+        with self.timer.feed.batch():
+            for _, name in commands:
+                self.commands[name]()
+        self.batches += 1
+        if self.instruments is not None:
+            now = time.perf_counter()
+            for received, _ in commands:
+                self.instruments.record('remote_latency', now - received)
+        return len(commands)
+
+    def state(self) -> Dict[str, object]:
+        """
+        Returns the last state sent to the renderers.
+        """
+        snapshot = self.timer.feed.snapshot
+        if snapshot is None:
+            return {}
+        state = snapshot._asdict()
+        del state['changed']
+        return state
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.queue.close()
+
+    def _handler(self) -> type:
+        from http.server import BaseHTTPRequestHandler
+        control = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so a client sends command after command on one connection
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately, which Nagle's algorithm would hold back
+            disable_nagle_algorithm = True
+
+            def do_GET(self) -> None:
+                if self.unknown_host():
+                    self.reply(403, b'{"error": "unknown host"}', 'application/json')
+                elif self.path == '/':
+                    self.reply(200, PAGE, 'text/html; charset=utf-8')
+                elif self.path == '/state':
+                    self.reply(200, json.dumps(control.state()).encode(), 'application/json')
+                else:
+                    self.reply(404, b'{"error": "not found"}', 'application/json')
+
+            def do_POST(self) -> None:
+                # Pedals and phones send no body, but any sent must be read off the connection
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # The end of the body is unknown, so the connection cannot be reused
+                    self.close_connection = True
+                    self.reply(400, b'{"error": "invalid Content-Length"}', 'application/json')
+                    return
+                if length:
+                    self.rfile.read(length)
+                if self.unknown_host():
+                    self.reply(403, b'{"error": "unknown host"}', 'application/json')
+                    return
+                if self.cross_site():
+                    self.reply(403, b'{"error": "cross-site request"}', 'application/json')
+                    return
+                name = self.path.strip('/')
+                if name not in control.commands:
+                    self.reply(404, json.dumps({'error': f'unknown command {name!r}'}).encode(),
+                               'application/json')
+                    return
+                control.queue.put(name)
+                self.reply(202, b'{"queued": true}', 'application/json')
+
+            def unknown_host(self) -> bool:
+                """
+                Whether the request names the server by a host name it was not given.
+
+                An IP address needs no lookup, so only names can be rebound.
+                Browsers always send a Host, so a request without one is no threat.
+                """
+                host = self.headers.get('Host')
+                if host is None:
+                    return False
+                name = urlsplit('//' + host).hostname
+                if not name:
+                    return True
+                try:
+                    ipaddress.ip_address(name)
+                except ValueError:
+                    return name not in control.allowed_hosts
+                return False
+
+            def cross_site(self) -> bool:
+                """
+                Whether the request was sent by a page of another site.
+                """
+                origin = self.headers.get('Origin')
+                if origin is not None:
+                    return urlsplit(origin).netloc != self.headers.get('Host')
+                # Browsers too old to send an Origin can still submit forms
+                content_type = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+                return content_type in FORM_TYPES
+
+            def reply(self, status: int, body: bytes, content_type: str) -> None:
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Send a command to a workout timer running with --remote')
+    parser.add_argument('command', help='toggle, start, pause, next, back, stop, undo, redo or state')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=PORT)
+    args = parser.parse_args()
+
+    from http.client import HTTPConnection
+    connection = HTTPConnection(args.host, args.port, timeout=5)
+    try:
+        connection.request('GET' if args.command == 'state' else 'POST', '/' + args.command)
+        response = connection.getresponse()
+    except OSError as error:
+        parser.exit(1, f'cannot reach {args.host}:{args.port}: {error}\n')
+    body = response.read().decode()
+    if response.status >= 400:
+        parser.exit(1, body + '\n')
+    print(body)
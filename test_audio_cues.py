@@ -0,0 +1,62 @@
+import threading
+import zlib
+
+from audio_cues import CuePlayer, RecordingBackend
+from workout_engine import VirtualClock, VirtualScheduler, WorkoutSession
+
+
+class BlockedBackend(RecordingBackend):
+    """
+    Holds every cue until `release` is set, like a device that never returns.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def play(self, name: str, wav: bytes) -> None:
+        super().play(name, wav)
+        self.release.wait(5)
+
+
+class FailingBackend(RecordingBackend):
+    def play(self, name: str, wav: bytes) -> None:
+        super().play(name, wav)
+        if name == 'countdown_low':
+            raise RuntimeError('device unplugged')
+
+
+class DamagedStore:
+    def wav(self, name: str) -> bytes:
+        raise zlib.error('invalid stored block lengths')
+
+    def prefetch(self, names) -> None:
+        pass
+
+
+def test_a_blocked_device_does_not_hold_up_the_session():
+    backend = BlockedBackend()
+    player = CuePlayer(backend, max_pending=4)
+    clock = VirtualClock()
+    scheduler = VirtualScheduler(clock)
+    session = WorkoutSession(10, 10, 2, scheduler, clock, cue_seconds=5)
+    queued = []
+    session.add_listener(lambda event: queued.append(player.play('countdown')) if event.kind == 'cue' else None)
+    session.start()
+    scheduler.run()
+    assert session.finished and len(queued) == 10
+    # The queue filled up behind the blocked device and the rest were dropped
+    assert not all(queued)
+    backend.release.set()
+    player.close(5)
+
+
+def test_failures_are_counted_and_the_worker_keeps_playing():
+    backend = FailingBackend()
+    player = CuePlayer(backend, store=DamagedStore())
+    player.play('spoken')
+    player.play('countdown_low')
+    player.play('countdown')
+    player.close(5)
+    assert player.failures == 2
+    assert [name for name, _ in backend.played] == ['countdown_low', 'countdown']
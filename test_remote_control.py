@@ -0,0 +1,63 @@
+from http.client import HTTPConnection
+
+import pytest
+
+from remote_control import RemoteControl, session_commands
+from workout_engine import SelectScheduler, WorkoutSession
+
+
+@pytest.fixture(scope='module')
+def remote():
+    session = WorkoutSession(480, 120, 16, SelectScheduler())
+    remote = RemoteControl(session, session_commands(session, lambda action: action()), 0,
+                           allowed_hosts=['Timer.local'])
+    yield remote
+    remote.close()
+
+
+def send(remote: RemoteControl, method: str, path: str, headers: dict) -> int:
+    connection = HTTPConnection(*remote.address)
+    try:
+        connection.putrequest(method, path, skip_host='Host' in headers)
+        for header, value in headers.items():
+            connection.putheader(header, value)
+        connection.endheaders()
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize('headers, status', [
+    ({'Content-Length': 'x'}, 400),
+    ({'Origin': 'http://example.com', 'Host': '127.0.0.1:8766'}, 403),
+    ({'Content-Type': 'text/plain', 'Host': '127.0.0.1:8766'}, 403),
+    ({'Origin': 'http://127.0.0.1:8766', 'Host': '127.0.0.1:8766'}, 202),
+    ({'Origin': 'http://[::1]:8766', 'Host': '[::1]:8766'}, 202),
+    ({'Origin': 'http://timer.local:8766', 'Host': 'timer.local:8766'}, 202),
+    ({'Host': 'localhost:8766'}, 202),
+    ({}, 202),
+])
+def test_commands_from_other_sites_are_refused(remote, headers, status):
+    queued = remote.queue.queued
+    assert send(remote, 'POST', '/next', headers) == status
+    assert remote.queue.queued == queued + (status == 202)
+
+
+def test_a_rebound_name_is_refused(remote):
+    # evil.example resolves to this computer, so its pages are same-origin with it
+    rebound = {'Origin': 'http://evil.example:8766', 'Host': 'evil.example:8766'}
+    queued = remote.queue.queued
+    assert send(remote, 'POST', '/next', rebound) == 403
+    assert send(remote, 'GET', '/state', {'Host': 'evil.example:8766'}) == 403
+    assert remote.queue.queued == queued
+
+
+def test_commands_run_in_one_batch(remote):
+    remote.run_pending()
+    batches = remote.batches
+    for _ in range(3):
+        assert send(remote, 'POST', '/toggle', {}) == 202
+    assert remote.run_pending() == 3
+    assert remote.batches == batches + 1 and remote.timer.running
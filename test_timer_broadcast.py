@@ -0,0 +1,57 @@
+import socket
+
+import pytest
+
+from timer_broadcast import FULL_MASK, HEADER, MAGIC, TIMING_BITS, VERSION, BroadcastPublisher, RemoteTimer, \
+    decode, encode
+from workout_engine import VirtualClock, VirtualScheduler, WorkoutSession
+
+
+@pytest.fixture
+def mirrored():
+    clock = VirtualClock()
+    scheduler = VirtualScheduler(clock)
+    session = WorkoutSession(60, 30, 4, scheduler, clock, tick_every_second=False)
+    client = RemoteTimer(port=0, group=None, host='127.0.0.1', clock=clock)
+    publisher = BroadcastPublisher(session, [client.socket.getsockname()], keyframe_interval=0)
+    yield session, scheduler, client, publisher
+    publisher.close()
+    client.close()
+
+
+def receive(client: RemoteTimer) -> None:
+    while not client.receive():
+        pass
+
+
+def test_displays_follow_the_session(mirrored):
+    session, scheduler, client, publisher = mirrored
+    publisher.keyframe()
+    session.start()
+    receive(client)
+    scheduler.run(until=60)
+    receive(client)
+    assert client.synced and client.stage_index == 1 and client.current_stage == session.current_stage
+    assert client.current_time == session.current_time
+
+
+def test_malformed_messages_are_rejected():
+    state = {'stage_index': 0, 'kind': 9, 'repetitions': 4, 'initial_repetitions': 4, 'running': 1,
+             'duration_ms': 60000, 'remaining_ms': 60000, 'deadline': 60.0}
+    with pytest.raises(ValueError):
+        decode(encode(1, state, FULL_MASK))
+    with pytest.raises(ValueError):
+        decode(encode(1, state, FULL_MASK & ~TIMING_BITS))
+    with pytest.raises(ValueError):
+        decode(encode(1, state, FULL_MASK)[:-3])
+
+
+def test_a_malformed_datagram_does_not_stop_the_display(mirrored):
+    session, scheduler, client, publisher = mirrored
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender.sendto(HEADER.pack(MAGIC, VERSION, 1, 1 << 1) + b'\xff', client.socket.getsockname())
+    sender.sendto(HEADER.pack(MAGIC, VERSION, 2, FULL_MASK) + b'\xff' * 40, client.socket.getsockname())
+    sender.close()
+    publisher.keyframe()
+    receive(client)
+    assert client.synced and client.current_stage == session.current_stage
@@ -0,0 +1,34 @@
+import time
+
+from timer_process import SEQUENCE, SIZE, IsolatedTimer, read_state, write_state
+from workout_engine import VirtualClock, VirtualScheduler, WorkoutSession
+
+
+def test_a_written_state_reads_back():
+    clock = VirtualClock()
+    session = WorkoutSession(60, 30, 4, VirtualScheduler(clock), clock)
+    buffer = memoryview(bytearray(SIZE))
+    write_state(buffer, session, clock())
+    sequence, fields = read_state(buffer)
+    assert sequence == 2
+    assert fields[:5] == (0, 1, False, 4, 4) and fields[6] == 60
+
+
+def test_a_write_left_half_done_does_not_hang_the_reader():
+    buffer = memoryview(bytearray(SIZE))
+    SEQUENCE.pack_into(buffer, 0, 7)
+    started = time.perf_counter()
+    assert read_state(buffer) is None
+    assert time.perf_counter() - started < 1
+
+
+def test_the_last_state_is_kept_when_the_engine_dies_mid_write():
+    timer = IsolatedTimer(60, 30, 4, sound=False)
+    try:
+        timer.process.kill()
+        timer.process.join(5)
+        SEQUENCE.pack_into(timer.shared.buf, 0, timer.sequence + 1)
+        assert not timer.receive()
+        assert timer.current_duration == 60 and timer.repetitions == 4
+    finally:
+        timer.close()
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from timer_server import HeapScheduler, SessionManager
+
+
+def run_scheduler(setup, seconds: float = 0.1) -> list:
+    """
+    Runs `setup(scheduler, calls)` on a fresh loop, then the loop for `seconds`.
+    """
+    calls = []
+
+    async def main() -> None:
+        setup(HeapScheduler(asyncio.get_running_loop()), calls)
+        await asyncio.sleep(seconds)
+
+    asyncio.run(main())
+    return calls
+
+
+def test_a_failing_callback_does_not_stop_the_others():
+    def setup(scheduler, calls):
+        def fail():
+            calls.append('fail')
+            raise RuntimeError('broken session')
+        scheduler.call_later(0.0, fail)
+        scheduler.call_later(0.0, lambda: calls.append('same wake-up'))
+        scheduler.call_later(0.02, lambda: calls.append('later'))
+
+    assert run_scheduler(setup) == ['fail', 'same wake-up', 'later']
+
+
+def test_cancelling_the_earliest_callback_rearms_for_the_next():
+    def setup(scheduler, calls):
+        first = scheduler.call_later(0.01, lambda: calls.append('cancelled'))
+        scheduler.call_later(0.03, lambda: calls.append('next'))
+        scheduler.cancel(first)
+        calls.append(round(scheduler._armed[0] - scheduler.loop.time(), 2))
+
+    assert run_scheduler(setup) == [0.03, 'next']
+
+
+def test_a_manager_needs_a_loop():
+    with pytest.raises(RuntimeError):
+        SessionManager()
+
+
+def test_requests_must_be_objects():
+    async def main() -> None:
+        manager = SessionManager()
+        for request in ([1, 2], 'start', 3):
+            with pytest.raises(ValueError):
+                manager.handle(request)
+        session_id = manager.handle({'command': 'create', 'work': 1, 'rest': 1, 'repetitions': 2})['id']
+        assert manager.handle({'command': 'start', 'id': session_id})['running']
+
+    asyncio.run(main())
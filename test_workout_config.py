@@ -0,0 +1,89 @@
+import json
+import os
+import random
+
+import pytest
+
+from workout_config import ConfigWatcher
+from workout_engine import VirtualClock, VirtualScheduler, WorkoutSession
+from workout_program import Timeline
+
+
+class Workout:
+    """
+    A configuration file whose every save gets a new modification time.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.saves = 0
+
+    def write(self, work: int, rest: int = 30, repetitions: int = 1000) -> None:
+        with open(self.path, 'w') as file:
+            json.dump({'work': work, 'rest': rest, 'repetitions': repetitions}, file)
+        stamp = (1_000_000_000 + self.saves) * 10 ** 9
+        self.saves += 1
+        os.utime(self.path, ns=(stamp, stamp))
+
+
+@pytest.fixture
+def watched(tmp_path):
+    workout = Workout(tmp_path / 'workout.json')
+    workout.write(60)
+    clock = VirtualClock()
+    scheduler = VirtualScheduler(clock)
+    session = WorkoutSession(1, 1, 1, scheduler, clock)
+    watcher = ConfigWatcher(workout.path)
+    watcher.apply(session, watcher.poll())
+    watcher.attach(session)
+    session.start()
+    return workout, watcher, session, scheduler, clock
+
+
+def test_an_unchanged_file_is_not_parsed_again(watched):
+    workout, watcher, session, scheduler, clock = watched
+    scheduler.run(until=3600)
+    assert watcher.polls > 3000 and watcher.parses == 1
+
+
+def test_edits_apply_at_the_next_stage(watched):
+    workout, watcher, session, scheduler, clock = watched
+    stages = []
+    session.add_listener(lambda event: stages.append((event.time, event.repetitions))
+                         if event.kind == 'stage' else None)
+    scheduler.run(until=10)
+    for work in (45, 75, 50, 90, 40):
+        edited = clock.now
+        limit = session.current_duration + watcher.interval
+        workout.write(work)
+        scheduler.run(until=edited + limit)
+        assert session.work_duration == work
+        assert session.timeline is watcher.config.timeline
+    assert len(stages) == len({repetitions for _, repetitions in stages}), 'a reload emitted a stage twice'
+
+
+def test_a_swap_keeps_the_stage_boundary():
+    clock = VirtualClock()
+    generator = random.Random(3)
+    scheduler = VirtualScheduler(clock, lateness=lambda: generator.uniform(0, 0.5))
+    session = WorkoutSession(60, 30, 10, scheduler, clock)
+    swapped = Timeline.alternating(40, 20, 10)
+    session.add_listener(lambda event: session.swap(swapped)
+                         if event.kind == 'stage' and session.timeline is not swapped else None)
+    session.start()
+    scheduler.run(until=65)
+    # The first stage ended at 60 however late its wake-up was
+    assert session.timeline is swapped and session.stage_index == 1
+    assert session.deadline == 60 + 20
+    scheduler.run()
+    assert session.finished and clock.now - 0.5 <= 60 + 20 + 4 * 60 <= clock.now
+
+
+def test_a_swap_while_paused_keeps_the_time_spent_in_the_stage():
+    clock = VirtualClock()
+    session = WorkoutSession(60, 30, 4, VirtualScheduler(clock), clock)
+    session.restore(70)
+    session.swap(Timeline.alternating(40, 20, 4))
+    assert session.stage_index == 1 and session.elapsed() == 50
+    session.swap(Timeline.alternating(40, 20, 1))
+    assert session.finished and not session.running
@@ -0,0 +1,53 @@
+import random
+
+from workout_engine import VirtualClock, VirtualScheduler, WorkoutSession
+from workout_simulation import simulate
+
+# A 16-stage 8x(8+2) session
+WORK, REST, REPETITIONS = 480, 120, 16
+PLANNED = 8 * WORK + 8 * REST
+STARTS = [WORK * ((index + 1) // 2) + REST * (index // 2) for index in range(1, REPETITIONS)]
+
+
+def late_wakeups(seed: int, most: float):
+    generator = random.Random(seed)
+    delays = []
+
+    def lateness() -> float:
+        delays.append(generator.uniform(0, most))
+        return delays[-1]
+
+    return lateness, delays
+
+
+def test_wakeup_delays_do_not_add_up():
+    lateness, delays = late_wakeups(1, 0.3)
+    events = simulate(WORK, REST, REPETITIONS, lateness=lateness, tick_every_second=True)[0]
+    stage_times = [event.time for event in events if event.kind == 'stage']
+    assert events[-1].kind == 'complete'
+    assert len(stage_times) == len(STARTS)
+    for moment, start in zip(stage_times, STARTS):
+        assert start <= moment <= start + 0.3
+    # Only the wake-up that ends the session is late, by its own delay
+    assert abs(events[-1].time - PLANNED - delays[-1]) < 1e-6
+
+
+def test_delays_longer_than_a_second_do_not_add_up():
+    lateness, delays = late_wakeups(2, 1.5)
+    events = simulate(WORK, REST, REPETITIONS, lateness=lateness, tick_every_second=True)[0]
+    assert len(delays) > 1000
+    assert abs(events[-1].time - PLANNED - delays[-1]) < 1e-6
+
+
+def test_pause_keeps_the_remaining_time():
+    clock = VirtualClock()
+    scheduler = VirtualScheduler(clock)
+    session = WorkoutSession(60, 30, 4, scheduler, clock)
+    session.start()
+    scheduler.run(until=20.5)
+    session.pause()
+    scheduler.run(until=1000)
+    assert session.remaining_time() == 39.5
+    session.pause()
+    scheduler.run(until=1000 + 39.5)
+    assert session.stage_index == 1 and session.remaining_time() == 30
@@ -0,0 +1,71 @@
+import threading
+
+import workout_history
+from workout_engine import VirtualClock, VirtualScheduler, WorkoutSession
+from workout_history import RECORD, SessionRecorder, read_history
+from workout_undo import UndoHistory
+
+
+def recorded(tmp_path, work: int = 60, rest: int = 30, repetitions: int = 4):
+    clock = VirtualClock()
+    scheduler = VirtualScheduler(clock)
+    session = WorkoutSession(work, rest, repetitions, scheduler, clock)
+    recorder = SessionRecorder(str(tmp_path / 'history'), athlete=3, wall_clock=lambda: 1000.0)
+    recorder.attach(session)
+    return session, scheduler, recorder
+
+
+def test_a_finished_session_is_summarized(tmp_path):
+    session, scheduler, recorder = recorded(tmp_path)
+    session.start()
+    scheduler.run(until=100)
+    session.next()
+    scheduler.run()
+    recorder.close()
+    assert read_history(recorder.path) == [(1000.0, 3, 70.0, 0.0, 4, 3, 1)]
+
+
+def test_the_record_is_written_away_from_the_event(tmp_path, monkeypatch):
+    writers = []
+    monkeypatch.setattr(workout_history, 'append_history',
+                        lambda path, summary: writers.append(threading.current_thread().name))
+    session, scheduler, recorder = recorded(tmp_path)
+    session.start()
+    scheduler.run()
+    recorder.flush()
+    assert writers == ['SessionRecorder'] and recorder.sessions_written == 1
+    recorder.close()
+
+
+def test_going_back_over_a_skipped_interval_does_not_count_it(tmp_path):
+    session, scheduler, recorder = recorded(tmp_path)
+    session.start()
+    scheduler.run(until=10)
+    session.next()
+    assert recorder.skipped == 1
+    session.back()
+    assert recorder.skipped == 0
+    scheduler.run()
+    recorder.close()
+    assert read_history(recorder.path)[0].skipped == 0
+    assert read_history(recorder.path)[0].achieved == 4
+
+
+def test_an_undone_next_is_not_counted_as_skipped(tmp_path):
+    session, scheduler, recorder = recorded(tmp_path)
+    history = UndoHistory(session)
+    session.start()
+    scheduler.run(until=70)
+    history.perform(session.next)
+    assert recorder.skipped == 1
+    history.undo()
+    assert recorder.skipped == 0
+    scheduler.run()
+    recorder.close()
+    summary = read_history(recorder.path)[0]
+    assert (summary.work_time, summary.achieved, summary.skipped) == (120.0, 4, 0)
+
+
+def test_history_records_match_the_analytics_columns():
+    from workout_analytics import HISTORY_DTYPE
+    assert HISTORY_DTYPE.itemsize == RECORD.size
@@ -0,0 +1,55 @@
+from workout_engine import VirtualClock, VirtualScheduler, WorkoutSession
+from workout_journal import SessionJournal, read_journal
+
+
+def session(work: int = 60, rest: int = 30, repetitions: int = 8) -> WorkoutSession:
+    clock = VirtualClock()
+    return WorkoutSession(work, rest, repetitions, VirtualScheduler(clock), clock)
+
+
+def crash_while_paused(path: str) -> float:
+    """
+    Records a session paused 75 s in, flushed but never closed, like a crashed process.
+    """
+    crashed = session()
+    journal = SessionJournal(path, flush_interval=3600)
+    journal.attach(crashed)
+    crashed.start()
+    crashed.scheduler.run(until=75)
+    crashed.pause()
+    journal.flush()
+    return crashed.elapsed()
+
+
+def test_a_crashed_session_resumes_where_it_was(tmp_path):
+    path = str(tmp_path / 'session.journal')
+    elapsed = crash_while_paused(path)
+    resumed = session()
+    journal = SessionJournal(path)
+    record = journal.attach(resumed)
+    assert record is not None and record.kind == 'pause'
+    assert resumed.elapsed() == elapsed and resumed.stage_index == 1 and not resumed.running
+    journal.close()
+
+
+def test_another_program_of_the_same_length_is_not_resumed(tmp_path):
+    path = str(tmp_path / 'session.journal')
+    crash_while_paused(path)
+    # As many intervals and as long in total, with work and rest swapped
+    swapped = session(30, 60)
+    journal = SessionJournal(path)
+    assert journal.attach(swapped) is None
+    assert swapped.elapsed() == 0
+    journal.close()
+
+
+def test_a_clean_exit_is_not_resumed(tmp_path):
+    path = str(tmp_path / 'session.journal')
+    crash_while_paused(path)
+    resumed = session()
+    journal = SessionJournal(path)
+    journal.attach(resumed)
+    resumed.start()
+    journal.close(stopped=True)
+    assert read_journal(path)[-1].kind == 'stop'
+    assert SessionJournal(path).recover() is None
@@ -0,0 +1,16 @@
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from workout_engine import STAGE_NAMES  # noqa: E402
+from workout_timer_Qt5 import STAGE_PALETTES, STYLESHEET  # noqa: E402
+
+
+def test_every_stage_has_a_palette():
+    assert set(STAGE_PALETTES) == set(STAGE_NAMES.values())
+
+
+def test_every_palette_is_styled():
+    for _, palette in STAGE_PALETTES.values():
+        assert f'QLabel[stage="{palette}"]' in STYLESHEET
+        assert f'QProgressBar[stage="{palette}"]::chunk' in STYLESHEET
@@ -0,0 +1,39 @@
+import io
+
+from audio_cues import CuePlayer, NullBackend
+from workout_engine import VirtualClock, VirtualScheduler
+from workout_timer_term import Interface, WorkoutTimer
+
+
+def rendering_timer(work: int, rest: int, repetitions: int):
+    clock = VirtualClock()
+    scheduler = VirtualScheduler(clock)
+    timer = WorkoutTimer(work, rest, repetitions, CuePlayer(NullBackend()), scheduler, clock)
+    Interface(timer, io.BytesIO(), size=(64, 9)).draw()
+    return timer, scheduler, clock
+
+
+def test_a_stopped_session_never_wakes_up():
+    timer, scheduler, clock = rendering_timer(1, 1, 4)
+    assert scheduler.run(until=3600) == 0
+
+
+def test_a_paused_session_never_wakes_up():
+    timer, scheduler, clock = rendering_timer(1, 1, 4)
+    timer.start()
+    scheduler.run(until=10)
+    timer.pause()
+    assert scheduler.run(until=3600) == 0
+    timer.pause()
+    assert scheduler.run(until=3601) > 0
+
+
+def test_the_final_countdown_renders_faster_than_the_interval():
+    # One minute stages: the interval part first, then the final countdown
+    timer, scheduler, clock = rendering_timer(1, 1, 4)
+    timer.start()
+    fine = timer.fine_seconds
+    interval = scheduler.run(until=60 - fine) / (60 - fine)
+    countdown = scheduler.run(until=60 - 0.5) / (fine - 0.5)
+    assert interval <= 1.1 and countdown >= 5 * interval
+
@@ -0,0 +1,113 @@
+from workout_engine import VirtualClock, VirtualScheduler, WorkoutSession
+from workout_program import Timeline
+from workout_undo import UndoHistory
+
+
+class WatchedArray:
+    """
+    An array that counts the items read from it.
+    """
+
+    def __init__(self, items):
+        self.items = items
+        self.reads = 0
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __getitem__(self, index):
+        item = self.items[index]
+        self.reads += len(item) if isinstance(index, slice) else 1
+        return item
+
+    def __iter__(self):
+        self.reads += len(self.items)
+        return iter(self.items)
+
+
+def undoable(repetitions: int = 16):
+    clock = VirtualClock()
+    scheduler = VirtualScheduler(clock)
+    session = WorkoutSession(480, 120, repetitions, scheduler, clock)
+    return session, UndoHistory(session, limit=100), scheduler, clock
+
+
+def test_undo_restores_the_time_left():
+    session, history, scheduler, clock = undoable()
+    session.start()
+    scheduler.run(until=100.25)
+    position = (session.stage_index, session.remaining_time(), session.repetitions)
+    for _ in range(5):
+        history.perform(session.next)
+    scheduler.run(until=107.75)
+    while history.undo():
+        pass
+    assert session.running
+    assert (session.stage_index, session.remaining_time(), session.repetitions) == position
+    history.redo()
+    assert session.stage_index == position[0] + 1 and session.remaining_time() == 120
+
+
+def test_undo_restores_the_timeline():
+    session, history, scheduler, clock = undoable()
+    session.start()
+    history.perform(session.configure, 60, 30, 4)
+    assert len(session.timeline) == 4 and not session.running
+    history.undo()
+    assert len(session.timeline) == 16 and session.work_duration == 480 and session.running
+
+
+def test_undo_emits_and_publishes_once():
+    session, history, scheduler, clock = undoable()
+    events, snapshots = [], []
+    session.start()
+    scheduler.run(until=30)
+    history.perform(session.next)
+    history.perform(session.pause)
+    session.add_listener(lambda event: events.append(event.kind))
+    session.subscribe(snapshots.append)
+    snapshots.clear()
+    history.undo()
+    assert events == ['start'] and len(snapshots) == 1 and snapshots[0].running
+    history.undo()
+    assert events == ['start', 'start'] and len(snapshots) == 2
+    history.perform(session.stop)
+    history.perform(session.start)
+    published = len(snapshots)
+    history.undo()
+    assert events[-1] == 'stop' and len(snapshots) == published + 1 and not snapshots[-1].running
+
+
+def test_the_history_stays_within_its_limit():
+    session, history, scheduler, clock = undoable()
+    session.start()
+    for _ in range(1000):
+        history.perform(session.pause)
+    undone = 0
+    while history.undo():
+        undone += 1
+    assert undone == history.limit
+
+
+def test_recording_an_action_does_not_read_the_timeline():
+    session, history, scheduler, clock = undoable(10 ** 5)
+    session.start()
+    scheduler.run(until=1000)
+    timeline = session.timeline
+    watched = [WatchedArray(timeline.durations), WatchedArray(timeline.offsets), WatchedArray(timeline.kinds)]
+    timeline.durations, timeline.offsets, timeline.kinds = watched
+    for _ in range(10):
+        history.perform(session.pause)
+    # A pause looks up the current interval; a copy or a walk reads every item
+    assert sum(array.reads for array in watched) < 10 * 100
+    assert all(state.timeline is timeline for state in history._undo)
+
+
+def test_undo_of_a_finished_session_pauses_at_its_end():
+    session, history, scheduler, clock = undoable(2)
+    session.start()
+    scheduler.run()
+    history.perform(session.stop)
+    history.undo()
+    assert session.finished and not session.running
+    assert Timeline.alternating(480, 120, 2).total == session.elapsed()
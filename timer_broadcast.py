@@ -0,0 +1,354 @@
+"""
+Publishes the state of a workout session over UDP to any number of displays.
+
+Messages are sent only when the state changes and carry only the fields that
+changed since the previous message, plus the time left in the stage at the
+moment of sending and the stage deadline on the publisher's monotonic clock.
+Receivers turn that into a deadline on their own monotonic clock and
+interpolate the countdown locally, so every display shows the same second
+without a message per tick. A receiver with a ClockSync maps the published
+deadline through it, which takes out the network delay and the drift
+between the machines; without one it counts from the moment of arrival.
+A full keyframe is sent every few seconds, and receivers ignore deltas
+until they have one, so late joiners and lost packets recover on their own.
+"""
+import math
+import socket
+import struct
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from workout_engine import STAGE_NAMES, Event, Snapshot, StateFeed
+from workout_program import KINDS
+
+MULTICAST_GROUP = '239.255.42.99'
+PORT = 5007
+
+MAGIC = b'WT'
+VERSION = 2
+HEADER = struct.Struct('!2sBIB')
+
+# Field name -> struct format, in the order they appear in a message.
+# The bit of each field in the header mask is its position in this tuple.
+FIELDS: Tuple[Tuple[str, str], ...] = (
+    ('stage_index', 'I'),
+    ('kind', 'B'),
+    ('repetitions', 'I'),
+    ('initial_repetitions', 'I'),
+    ('running', 'B'),
+    ('duration_ms', 'I'),
+    ('remaining_ms', 'I'),
+    ('deadline', 'd'),
+)
+FIELD_STRUCTS = tuple(struct.Struct('!' + fmt) for _, fmt in FIELDS)
+FULL_MASK = (1 << len(FIELDS)) - 1
+# The time left and the deadline are sent with every message
+TIMING_BITS = 3 << (len(FIELDS) - 2)
+
+
+def encode(sequence: int, state: Dict[str, int], mask: int) -> bytes:
+    """
+    Encodes the fields of `state` selected by `mask` into one datagram.
+    """
+    parts = [HEADER.pack(MAGIC, VERSION, sequence, mask)]
+    for bit, ((name, _), field) in enumerate(zip(FIELDS, FIELD_STRUCTS)):
+        if mask & (1 << bit):
+            parts.append(field.pack(state[name]))
+    return b''.join(parts)
+
+
+def decode(data: bytes) -> Tuple[int, int, Dict[str, int]]:
+    """
+    Decodes a datagram into its sequence number, mask and fields.
+
+    Raises
+    ------
+    ValueError
+        If the datagram is not a well-formed timer message.
+    """
+    try:
+        magic, version, sequence, mask = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('not a workout timer message')
+        if mask & TIMING_BITS != TIMING_BITS:
+            raise ValueError(f'invalid field mask {mask:#x}')
+        offset = HEADER.size
+        fields = {}
+        for bit, ((name, _), field) in enumerate(zip(FIELDS, FIELD_STRUCTS)):
+            if mask & (1 << bit):
+                fields[name] = field.unpack_from(data, offset)[0]
+                offset += field.size
+    except struct.error as error:
+        raise ValueError(f'truncated timer message: {error}') from None
+    if fields.get('kind', 0) >= len(KINDS):
+        raise ValueError(f'unknown interval kind {fields["kind"]}')
+    return sequence, mask, fields
+
+
+class BroadcastPublisher:
+    """
+    Sends the state of a WorkoutSession to UDP targets whenever it changes.
+
+    Attributes
+    ----------
+    session : WorkoutSession
+        the published session
+    targets : Sequence[Tuple[str, int]]
+        addresses every message is sent to
+    keyframe_interval : float
+        seconds between full keyframes
+    bytes_sent : int
+        payload bytes sent to each target so far
+    messages_sent : int
+        messages sent to each target so far
+    """
+
+    def __init__(self, session, targets: Sequence[Tuple[str, int]] = ((MULTICAST_GROUP, PORT),),
+                 keyframe_interval: float = 5.0, ttl: int = 1):
+        self.session = session
+        self.targets = list(targets)
+        self.keyframe_interval = keyframe_interval
+        self.bytes_sent = 0
+        self.messages_sent = 0
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._sent: Dict[str, int] = {}
+        self._captured: Tuple[Dict[str, int], float] = (self.capture(), time.monotonic())
+        self._closed = threading.Event()
+        session.add_listener(self.publish)
+        if keyframe_interval:
+            threading.Thread(target=self._send_keyframes, name='BroadcastPublisher', daemon=True).start()
+
+    def capture(self) -> Dict[str, int]:
+        """
+        Returns the current state of the session as message fields.
+        """
+        session = self.session
+        now = session.clock()
+        remaining = session.remaining_time(now)
+        return {
+            'stage_index': session.stage_index,
+            'kind': KINDS.index(session.current_kind),
+            'repetitions': session.repetitions,
+            'initial_repetitions': session.initial_repetitions,
+            'running': int(session.running),
+            'duration_ms': round(session.current_duration * 1000),
+            'remaining_ms': math.ceil(remaining * 1000),
+            'deadline': now + remaining if session.running else 0.0,
+        }
+
+    def publish(self, event: Optional[Event] = None) -> None:
+        """
+        Sends the fields that changed since the last message.
+        Cue events change nothing a display shows and are not sent.
+        """
+        if event is not None and event.kind == 'cue':
+            return
+        state = self.capture()
+        with self._lock:
+            self._captured = (state, time.monotonic())
+            mask = TIMING_BITS
+            for bit, (name, _) in enumerate(FIELDS):
+                if self._sent.get(name) != state[name]:
+                    mask |= 1 << bit
+            self._send(state, mask)
+
+    def keyframe(self) -> None:
+        """
+        Sends every field, extrapolating the remaining time from the last capture.
+        """
+        with self._lock:
+            state, captured_at = self._captured
+            state = dict(state)
+            if state['running']:
+                elapsed_ms = (time.monotonic() - captured_at) * 1000
+                state['remaining_ms'] = max(0, math.ceil(state['remaining_ms'] - elapsed_ms))
+            self._send(state, FULL_MASK)
+
+    def close(self) -> None:
+        self._closed.set()
+        self._socket.close()
+
+    def _send(self, state: Dict[str, int], mask: int) -> None:
+        self._sequence = (self._sequence + 1) & 0xFFFFFFFF
+        data = encode(self._sequence, state, mask)
+        for target in self.targets:
+            try:
+                self._socket.sendto(data, target)
+            except OSError:
+                pass
+        self._sent = state
+        self.bytes_sent += len(data)
+        self.messages_sent += 1
+
+    def _send_keyframes(self) -> None:
+        while not self._closed.wait(self.keyframe_interval):
+            self.keyframe()
+
+
+class RemoteTimer:
+    """
+    A read-only timer mirroring a BroadcastPublisher.
+
+    It has the attributes the frontends render, so an Interface can display
+    it in place of a WorkoutTimer. Control methods are accepted and ignored:
+    only the publishing station controls the session.
+
+    Attributes
+    ----------
+    synced : bool
+        whether a keyframe has been received
+    deadline : Optional[float]
+        local monotonic time the current stage ends at, while running
+    clock_sync : Optional[ClockSync]
+        maps the publisher's deadlines onto `clock` once it has an estimate
+    listeners : List[Callable[[Event], None]]
+        callbacks receiving a 'stage' event whenever a message changes the state
+    feed : StateFeed
+        sends a Snapshot to its subscribers on every `feed.publish()` that finds a change
+    """
+
+    def __init__(self, port: int = PORT, group: Optional[str] = MULTICAST_GROUP,
+                 host: str = '', clock: Callable[[], float] = time.monotonic, clock_sync=None):
+        self.clock = clock
+        self.clock_sync = clock_sync
+        self.listeners: List[Callable[[Event], None]] = []
+        self.synced = False
+        self.stage_index = 0
+        self.current_kind = KINDS[1]
+        self.repetitions = 0
+        self.initial_repetitions = 0
+        self.running = False
+        self.current_duration = 0.0
+        # Settings forms read these; a mirror has nothing to configure
+        self.work_duration = self.rest_duration = 0
+        # Mirrors redraw once a second, without the final sub-second countdown
+        self.fine_seconds = 0
+        self.feed = StateFeed(self)
+        self._deadline: Optional[float] = None
+        self._published_deadline: Optional[float] = None
+        self._remaining = 0.0
+        self._sequence: Optional[int] = None
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        if group:
+            membership = struct.pack('4s4s', socket.inet_aton(group), socket.inet_aton('0.0.0.0'))
+            self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        self.socket.setblocking(False)
+
+    @property
+    def current_stage(self) -> str:
+        return STAGE_NAMES[self.current_kind]
+
+    @property
+    def current_time(self) -> int:
+        return math.ceil(self.remaining_time())
+
+    @property
+    def deadline(self) -> Optional[float]:
+        if self._published_deadline is not None and self.clock_sync is not None and self.clock_sync.ready:
+            return self.clock_sync.to_local(self._published_deadline)
+        return self._deadline
+
+    def remaining_time(self, now: Optional[float] = None) -> float:
+        if not self.running:
+            return self._remaining
+        if now is None:
+            now = self.clock()
+        return max(0.0, self.deadline - now)
+
+    def next_tick_delay(self, now: Optional[float] = None) -> float:
+        remaining = self.remaining_time(now)
+        fraction = remaining - math.floor(remaining)
+        return fraction if fraction > 0 else 1.0
+
+    def fileno(self) -> int:
+        """
+        Returns the descriptor that becomes readable when a message arrives.
+        """
+        return self.socket.fileno()
+
+    def add_listener(self, listener: Callable[[Event], None]) -> None:
+        self.listeners.append(listener)
+
+    def subscribe(self, callback: Callable[[Snapshot], None]) -> None:
+        self.feed.subscribe(callback)
+
+    def receive(self) -> bool:
+        """
+        Applies every message waiting on the socket without blocking.
+
+        Returns
+        -------
+        bool
+            True if any message was applied.
+        """
+        changed = False
+        while True:
+            try:
+                data = self.socket.recv(512)
+            except (BlockingIOError, InterruptedError):
+                break
+            try:
+                changed |= self.apply(data, self.clock())
+            except ValueError:
+                continue
+        return changed
+
+    def apply(self, data: bytes, now: float) -> bool:
+        """
+        Applies one message received at local time `now`.
+        """
+        sequence, mask, fields = decode(data)
+        if mask != FULL_MASK and (not self.synced or sequence != (self._sequence + 1) & 0xFFFFFFFF):
+            # A delta only applies on top of the message right before it
+            self.synced = False
+            return False
+        self.synced = True
+        self._sequence = sequence
+        before = (self.stage_index, self.running)
+        if 'stage_index' in fields:
+            self.stage_index = fields['stage_index']
+        if 'kind' in fields:
+            self.current_kind = KINDS[fields['kind']]
+        if 'repetitions' in fields:
+            self.repetitions = fields['repetitions']
+        if 'initial_repetitions' in fields:
+            self.initial_repetitions = fields['initial_repetitions']
+        if 'running' in fields:
+            self.running = bool(fields['running'])
+        if 'duration_ms' in fields:
+            self.current_duration = fields['duration_ms'] / 1000
+        self._remaining = fields['remaining_ms'] / 1000
+        self._deadline = now + self._remaining if self.running else None
+        self._published_deadline = fields['deadline'] if self.running else None
+        if before != (self.stage_index, self.running):
+            event = Event(now, 'stage', self.current_stage, self.repetitions, self.current_time)
+            for listener in self.listeners:
+                listener(event)
+        return True
+
+    def start(self, *args) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def pause(self) -> None:
+        pass
+
+    def next(self) -> None:
+        pass
+
+    def back(self) -> None:
+        pass
+
+    def configure(self, *args) -> None:
+        pass
+
+    def close(self) -> None:
+        self.socket.close()
@@ -0,0 +1,323 @@
+"""
+Runs the workout session in a separate process and shares its state with the GUI.
+
+The engine process owns the WorkoutSession, its scheduler and everything
+that must happen on time: audio cues, the journal and the history. It
+publishes the session state into a small block of shared memory guarded by
+a sequence lock (the writer makes the counter odd before it writes and even
+after, and a reader retries a bounded number of times if the counter changed
+or was odd, keeping the last state it read if the engine died mid-write), and sends
+a one-line notification down a pipe for every event so the GUI can wake up.
+
+The GUI holds an IsolatedTimer, which reads the state straight out of the
+shared buffer and interpolates the countdown from the stage deadline, like
+a RemoteTimer does. A GUI that stops processing events for any reason only
+stops redrawing; the session keeps its schedule and the cues keep playing.
+"""
+import math
+import multiprocessing
+import struct
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from workout_engine import STAGE_NAMES, Event, Snapshot, StateFeed, step_delay
+from workout_program import KINDS, Timeline
+
+SEQUENCE = struct.Struct('<I')
+# stage index, kind, running, repetitions, initial repetitions, stage duration,
+# time left while stopped, deadline while running, work and rest durations
+STATE = struct.Struct('<IBBIIddddd')
+SIZE = SEQUENCE.size + STATE.size
+
+EVENT_KINDS = ('start', 'pause', 'stop', 'next', 'back', 'stage', 'cue', 'complete')
+COMMANDS = ('start', 'pause', 'stop', 'next', 'back', 'configure', 'load')
+
+
+def write_state(buffer: memoryview, session, now: float) -> None:
+    """
+    Publishes the state of `session` into the shared buffer under the sequence lock.
+    """
+    sequence = SEQUENCE.unpack_from(buffer)[0]
+    SEQUENCE.pack_into(buffer, 0, (sequence + 1) & 0xFFFFFFFF)
+    remaining = session.remaining_time(now)
+    STATE.pack_into(buffer, SEQUENCE.size, session.stage_index, KINDS.index(session.current_kind),
+                    session.running, session.repetitions, session.initial_repetitions,
+                    session.current_duration, remaining, now + remaining if session.running else 0.0,
+                    session.work_duration, session.rest_duration)
+    SEQUENCE.pack_into(buffer, 0, (sequence + 2) & 0xFFFFFFFF)
+
+
+def read_state(buffer: memoryview, attempts: int = 1000) -> Optional[Tuple[int, tuple]]:
+    """
+    Returns the sequence number and fields of a consistent state from the shared buffer.
+
+    The fields are unpacked from the buffer itself; a read that overlapped a
+    write is retried, yielding to the writer, up to `attempts` times.
+
+    Returns
+    -------
+    Optional[Tuple[int, tuple]]
+        None if no consistent state was read, as when the writer died in the
+        middle of a write.
+    """
+    for _ in range(attempts):
+        sequence = SEQUENCE.unpack_from(buffer)[0]
+        if not sequence & 1:
+            fields = STATE.unpack_from(buffer, SEQUENCE.size)
+            if SEQUENCE.unpack_from(buffer)[0] == sequence:
+                return sequence, fields
+        time.sleep(0)
+    return None
+
+
+def run_engine(connection: Connection, name: str, settings: Dict[str, Any]) -> None:
+    """
+    Runs a session until the GUI closes the connection. This is the engine process.
+
+    `settings` holds the arguments of IsolatedTimer.
+    """
+    from audio_cues import CuePlayer, NullBackend
+    from workout_engine import SelectScheduler, WorkoutSession
+    shared = shared_memory.SharedMemory(name)
+    scheduler = SelectScheduler()
+    session = WorkoutSession(settings['work_duration'], settings['rest_duration'], settings['repetitions'],
+                             scheduler, cue_seconds=settings['cue_seconds'],
+                             fine_seconds=settings['fine_seconds'])
+    cues = CuePlayer(None if settings['sound'] else NullBackend())
+
+    def on_event(event: Event) -> None:
+        write_state(shared.buf, session, event.time)
+        if event.kind == 'cue':
+            cues.play(settings['cue'])
+        connection.send_bytes(f'{event.kind} {event.time!r}'.encode())
+
+    session.add_listener(on_event)
+    session.subscribe(lambda snapshot: write_state(shared.buf, session, session.clock()))
+    if settings['config']:
+        from workout_config import ConfigWatcher
+        watcher = ConfigWatcher(settings['config'])
+        watcher.apply(session, watcher.poll())
+        watcher.attach(session)
+    if settings['broadcast']:
+        from clock_sync import ClockServer
+        from timer_broadcast import BroadcastPublisher
+        publisher = BroadcastPublisher(session)
+        clock_server = ClockServer(clock=session.clock)
+    if settings['history']:
+        from workout_history import SessionRecorder
+        SessionRecorder(settings['history'], settings['athlete']).attach(session)
+    resumed = None
+    journal = None
+    if settings['journal']:
+        from workout_journal import SessionJournal
+        journal = SessionJournal(settings['journal'])
+        resumed = journal.attach(session)
+    write_state(shared.buf, session, session.clock())
+    connection.send_bytes(b'ready 0.0')
+    if resumed is not None and resumed.running:
+        session.start()
+    try:
+        while True:
+            if connection.poll(scheduler.timeout()):
+                try:
+                    command, *arguments = connection.recv()
+                except EOFError:
+                    break
+                if command == 'close':
+                    # The window was closed, so the next run must not resume this session
+                    if journal is not None:
+                        journal.close(stopped=True)
+                    break
+                if command == 'load':
+                    session.work_duration, session.rest_duration = arguments[1:]
+                    arguments = arguments[:1]
+                if command in COMMANDS:
+                    getattr(session, command)(*arguments)
+            scheduler.run_due()
+    finally:
+        cues.close(1.0)
+        shared.close()
+
+
+class IsolatedTimer:
+    """
+    A timer whose session runs in an engine process, for a GUI to display and control.
+
+    It has the attributes the frontends render, read from shared memory by
+    `receive()`, and its control methods send commands to the engine. Events
+    reach the listeners when `receive()` runs, except cues, which the engine
+    process plays itself.
+
+    Attributes
+    ----------
+    process : multiprocessing.Process
+        the engine process
+    listeners : List[Callable[[Event], None]]
+        callbacks receiving the engine's events, except cues, on `receive()`
+    feed : StateFeed
+        sends a Snapshot to its subscribers on every `feed.publish()` that finds a change
+    events : List[Tuple[str, float]]
+        kind and engine time of every event received, cues included, when `keep_events` is set
+    """
+
+    def __init__(self, work_duration: float, rest_duration: float, repetitions: int,
+                 cue: str = 'countdown', cue_seconds: int = 5, fine_seconds: float = 0,
+                 config: Optional[str] = None, journal: Optional[str] = None,
+                 history: Optional[str] = None, athlete: int = 0, broadcast: bool = False,
+                 sound: bool = True, keep_events: bool = False,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Starts the engine process and waits until it has published its state.
+
+        Parameters
+        ----------
+        work_duration, rest_duration : float
+            durations in seconds
+        repetitions : int
+            number of stages
+        cue : str, optional
+            name of the CuePlayer cue played on every second of the final countdown
+        cue_seconds, fine_seconds : int, float, optional
+            as for WorkoutSession
+        config, journal, history : Optional[str], optional
+            files the engine reloads its workout from, journals to and records the history to
+        athlete : int, optional
+            athlete the history records
+        broadcast : bool, optional
+            whether the engine publishes its state on the local network
+        sound : bool, optional
+            whether cues are played (default is True)
+        keep_events : bool, optional
+            whether to keep every received event in `events` (default is False)
+        """
+        self.clock = clock
+        self.fine_seconds = fine_seconds
+        self.fine_interval = 0.1
+        self.listeners: List[Callable[[Event], None]] = []
+        self.feed = StateFeed(self)
+        self.keep_events = keep_events
+        self.events: List[Tuple[str, float]] = []
+        self.sequence: Optional[int] = None
+        self.shared = shared_memory.SharedMemory(create=True, size=SIZE)
+        self.shared.buf[:SIZE] = bytes(SIZE)
+        self.connection, child = multiprocessing.Pipe()
+        settings = dict(work_duration=work_duration, rest_duration=rest_duration, repetitions=repetitions,
+                        cue=cue, cue_seconds=cue_seconds, fine_seconds=fine_seconds, config=config,
+                        journal=journal, history=history, athlete=athlete, broadcast=broadcast, sound=sound)
+        self.process = multiprocessing.Process(target=run_engine, args=(child, self.shared.name, settings),
+                                               name='WorkoutEngine', daemon=True)
+        self.process.start()
+        child.close()
+        # The engine publishes its first state before it says it is ready
+        self.connection.recv_bytes()
+        self.receive()
+
+    @property
+    def current_stage(self) -> str:
+        return STAGE_NAMES[self.current_kind]
+
+    @property
+    def current_time(self) -> int:
+        return math.ceil(self.remaining_time())
+
+    def remaining_time(self, now: Optional[float] = None) -> float:
+        if not self.running:
+            return self._remaining
+        if now is None:
+            now = self.clock()
+        return max(0.0, self.deadline - now)
+
+    def next_tick_delay(self, now: Optional[float] = None) -> float:
+        """
+        Returns the seconds until the displayed countdown next changes.
+        """
+        remaining = self.remaining_time(now)
+        if remaining <= self.fine_seconds:
+            return step_delay(remaining, self.fine_interval)
+        delay = step_delay(remaining, 1.0)
+        if self.fine_seconds:
+            delay = min(delay, remaining - self.fine_seconds)
+        return delay
+
+    def fileno(self) -> int:
+        """
+        Returns the descriptor that becomes readable when the engine sends an event.
+        """
+        return self.connection.fileno()
+
+    def add_listener(self, listener: Callable[[Event], None]) -> None:
+        self.listeners.append(listener)
+
+    def subscribe(self, callback: Callable[[Snapshot], None]) -> None:
+        self.feed.subscribe(callback)
+
+    def receive(self) -> bool:
+        """
+        Reads the latest state from shared memory and hands pending events to the listeners.
+
+        Returns
+        -------
+        bool
+            True if the state changed since the last call. The last state read
+            is kept if no consistent one could be read.
+        """
+        state = read_state(self.shared.buf)
+        changed = state is not None and state[0] != self.sequence
+        if changed:
+            self.sequence, fields = state
+            (self.stage_index, kind, running, self.repetitions, self.initial_repetitions,
+             self.current_duration, self._remaining, self.deadline,
+             self.work_duration, self.rest_duration) = fields
+            self.current_kind = KINDS[kind]
+            self.running = bool(running)
+        while self.connection.poll():
+            try:
+                kind, moment = self.connection.recv_bytes().decode().split()
+            except EOFError:
+                break
+            if self.keep_events:
+                self.events.append((kind, float(moment)))
+            if kind in EVENT_KINDS and kind != 'cue':
+                event = Event(float(moment), kind, self.current_stage, self.repetitions, self.current_time)
+                for listener in self.listeners:
+                    listener(event)
+        return changed
+
+    def start(self) -> None:
+        self.connection.send(('start',))
+
+    def stop(self) -> None:
+        self.connection.send(('stop',))
+
+    def pause(self) -> None:
+        self.connection.send(('pause',))
+
+    def next(self) -> None:
+        self.connection.send(('next',))
+
+    def back(self) -> None:
+        self.connection.send(('back',))
+
+    def configure(self, work_duration: float, rest_duration: float, repetitions: int) -> None:
+        self.connection.send(('configure', work_duration, rest_duration, repetitions))
+
+    def load(self, timeline: Timeline) -> None:
+        # The caller sets the durations first, as with a WorkoutSession
+        self.connection.send(('load', timeline, self.work_duration, self.rest_duration))
+
+    def close(self) -> None:
+        """
+        Stops the engine process and releases the shared memory.
+        """
+        try:
+            self.connection.send(('close',))
+        except OSError:
+            pass
+        self.process.join(2.0)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.connection.close()
+        self.shared.close()
+        self.shared.unlink()
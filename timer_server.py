@@ -0,0 +1,261 @@
+"""
+Hosts many independent workout sessions on one asyncio event loop.
+
+Every session shares a single heap scheduler, so the loop wakes up once per
+upcoming transition instead of once per session per second. Sessions are
+controlled by ID through SessionManager, or over TCP with one JSON command
+per line:
+
+    python timer_server.py --port 8765
+    {"command": "create", "work": 480, "rest": 120, "repetitions": 16}
+    {"command": "start", "id": 1}
+"""
+import argparse
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from workout_engine import Event, WorkoutSession
+from workout_program import compile_program
+
+logger = logging.getLogger(__name__)
+
+
+class HeapScheduler:
+    """
+    Runs callbacks from a heap on an asyncio loop, keeping only one loop timer
+    armed for the earliest entry.
+
+    Attributes
+    ----------
+    loop : asyncio.AbstractEventLoop
+        the loop the callbacks run on
+    wakeups : int
+        number of times the loop timer fired
+    lateness : List[float]
+        how late each callback ran in seconds, when `record_lateness` is set
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, record_lateness: bool = False):
+        self.loop = loop
+        self.wakeups = 0
+        self.lateness: List[float] = []
+        self.record_lateness = record_lateness
+        self._heap: List[list] = []
+        self._sequence = itertools.count()
+        self._armed: Optional[Tuple[float, asyncio.TimerHandle]] = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> list:
+        """
+        Schedules `callback` to run `delay` seconds from now.
+        """
+        entry = [self.loop.time() + delay, next(self._sequence), callback]
+        heapq.heappush(self._heap, entry)
+        if self._armed is None or entry[0] < self._armed[0]:
+            self._arm()
+        return entry
+
+    def cancel(self, handle: list) -> None:
+        """
+        Cancels a scheduled callback.
+        """
+        handle[2] = None
+        if self._heap and self._heap[0] is handle:
+            # The loop was armed for this entry, so arm it for the next live one
+            self._arm()
+
+    def _arm(self) -> None:
+        if self._armed is not None:
+            self._armed[1].cancel()
+            self._armed = None
+        heap = self._heap
+        while heap and heap[0][2] is None:
+            heapq.heappop(heap)
+        if heap:
+            when = heap[0][0]
+            self._armed = (when, self.loop.call_at(when, self._run))
+
+    def _run(self) -> None:
+        self._armed = None
+        self.wakeups += 1
+        heap = self._heap
+        now = self.loop.time()
+        while heap and heap[0][0] <= now:
+            when, _, callback = heapq.heappop(heap)
+            if callback is None:
+                continue
+            if self.record_lateness:
+                self.lateness.append(now - when)
+            try:
+                callback()
+            except Exception:
+                # One broken session must not stop the wake-ups of every other
+                logger.exception('scheduled callback %r failed', callback)
+        self._arm()
+
+
+class SessionManager:
+    """
+    Creates and controls workout sessions by ID on one event loop.
+
+    Attributes
+    ----------
+    scheduler : HeapScheduler
+        the scheduler shared by every session
+    sessions : Dict[int, WorkoutSession]
+        the hosted sessions by ID
+    listeners : List[Callable[[int, Event], None]]
+        callbacks receiving the events of every session with its ID
+    """
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None, record_lateness: bool = False):
+        """
+        Constructs all the necessary attributes for the SessionManager object.
+
+        Parameters
+        ----------
+        loop : Optional[asyncio.AbstractEventLoop], optional
+            The loop the sessions tick on, which the caller runs (default is
+            the running loop; RuntimeError is raised if there is none).
+        record_lateness : bool, optional
+            Record how late every callback runs (default is False).
+        """
+        self.loop = loop if loop is not None else asyncio.get_running_loop()
+        self.scheduler = HeapScheduler(self.loop, record_lateness)
+        self.sessions: Dict[int, WorkoutSession] = {}
+        self.listeners: List[Callable[[int, Event], None]] = []
+        self._ids = itertools.count(1)
+
+    def create(self, work: int = 480, rest: int = 120, repetitions: int = 16,
+               program: Optional[Dict[str, Any]] = None, cue_seconds: int = 0) -> int:
+        """
+        Creates a stopped session and returns its ID.
+
+        Parameters
+        ----------
+        work : int, optional
+            Duration of work in seconds (default is 480).
+        rest : int, optional
+            Duration of rest in seconds (default is 120).
+        repetitions : int, optional
+            Number of stages (default is 16).
+        program : Optional[Dict[str, Any]], optional
+            A workout program replacing work, rest and repetitions (default is None).
+        cue_seconds : int, optional
+            Length of the final countdown that emits cue events (default is 0).
+        """
+        session_id = next(self._ids)
+        session = WorkoutSession(work, rest, repetitions, self.scheduler, self.loop.time,
+                                 cue_seconds=cue_seconds, tick_every_second=False)
+        if program is not None:
+            session.load(compile_program(program))
+        session.add_listener(lambda event: self._emit(session_id, event))
+        self.sessions[session_id] = session
+        return session_id
+
+    def remove(self, session_id: int) -> None:
+        """
+        Stops a session and forgets it.
+        """
+        self.sessions.pop(session_id).stop()
+
+    def start(self, session_id: int) -> None:
+        self.sessions[session_id].start()
+
+    def pause(self, session_id: int) -> None:
+        self.sessions[session_id].pause()
+
+    def next(self, session_id: int) -> None:
+        self.sessions[session_id].next()
+
+    def back(self, session_id: int) -> None:
+        self.sessions[session_id].back()
+
+    def stop(self, session_id: int) -> None:
+        self.sessions[session_id].stop()
+
+    def state(self, session_id: int) -> Dict[str, Any]:
+        """
+        Returns a JSON-friendly description of a session.
+        """
+        session = self.sessions[session_id]
+        return {
+            'id': session_id,
+            'stage': session.current_stage,
+            'repetitions': session.repetitions,
+            'remaining': session.remaining_time(),
+            'running': session.running,
+        }
+
+    def _emit(self, session_id: int, event: Event) -> None:
+        for listener in self.listeners:
+            listener(session_id, event)
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Executes one command of the line protocol and returns the reply.
+        """
+        if not isinstance(request, dict):
+            raise ValueError('a request must be a JSON object')
+        command = request.get('command')
+        if command == 'create':
+            session_id = self.create(request.get('work', 480), request.get('rest', 120),
+                                     request.get('repetitions', 16), request.get('program'))
+            return self.state(session_id)
+        if command == 'list':
+            return {'ids': list(self.sessions)}
+        if command not in ('start', 'pause', 'next', 'back', 'stop', 'state', 'remove'):
+            raise ValueError(f'unknown command {command!r}')
+        session_id = request['id']
+        if session_id not in self.sessions:
+            raise ValueError(f'no session with id {session_id}')
+        if command == 'remove':
+            self.remove(session_id)
+            return {'id': session_id}
+        if command != 'state':
+            getattr(self, command)(session_id)
+        return self.state(session_id)
+
+    async def serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serves the line protocol to one TCP client.
+        """
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                reply = self.handle(json.loads(line))
+            except (ValueError, KeyError, TypeError) as error:
+                reply = {'error': str(error)}
+            writer.write(json.dumps(reply).encode() + b'\n')
+            await writer.drain()
+        writer.close()
+
+
+async def serve(host: str, port: int) -> None:
+    manager = SessionManager(asyncio.get_running_loop())
+    server = await asyncio.start_server(manager.serve_client, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+"""
+Spoken cues: a memory-mapped pack of rendered clips and a bounded cache of
+decoded ones.
+
+Every phrase is rendered once, or loaded from a recorded WAV clip, and
+stored zlib-compressed in a pack file that is memory-mapped, so opening it
+costs no reads and the clips of programs with hundreds of rounds stay on
+disk until used. Decoded WAV buffers are kept in a least-recently-used
+cache capped in bytes. A VoiceAnnouncer asks the CuePlayer worker to
+prefetch the phrases of the next interval when one begins, so the tick
+never waits for rendering or decoding.
+
+Without recorded clips, phrases are rendered as a stand-in of one tone per
+word; a clip named after the phrase with spaces as underscores, such as
+`round_5_of_8.wav`, takes its place.
+"""
+import math
+import mmap
+import os
+import struct
+import zlib
+from collections import OrderedDict
+from itertools import accumulate
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from audio_cues import SAMPLE_RATE, CuePlayer, render_tone, to_wav
+from workout_defaults import VOICE_PATH as DEFAULT_PATH
+from workout_engine import Event
+from workout_program import KINDS, WORK
+
+MAGIC = b'WTV1'
+# Magic and offset of the index, followed by the compressed clips and the index.
+# New clips are appended after the index, followed by a new index, and the
+# header is switched to it last, so a crash leaves the old pack intact.
+HEADER = struct.Struct('<4sQ')
+# Clip count, followed by one entry per clip
+INDEX = struct.Struct('<I')
+# Offset and length of the compressed clip, sample rate and length of the name, followed by the name
+ENTRY = struct.Struct('<QIIH')
+
+NUMBER_WORDS = ('zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten')
+COMPLETE_PHRASE = 'workout complete'
+
+
+def render_phrase(phrase: str, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """
+    Renders a stand-in for a spoken phrase into 16-bit mono PCM: one short
+    tone per word, its pitch derived from the word, with a gap between words.
+    """
+    gap = bytes(2 * (sample_rate * 40 // 1000))
+    pcm = bytearray()
+    for word in phrase.split():
+        frequency = 300 + zlib.crc32(word.encode()) % 600
+        pcm += render_tone(frequency, min(80 + 20 * len(word), 250), sample_rate=sample_rate)
+        pcm += gap
+    return bytes(pcm)
+
+
+def load_clip(path: str) -> Optional[Tuple[bytes, int]]:
+    """
+    Returns the PCM and sample rate of a recorded 16-bit mono WAV clip, or
+    None if there is no such file or it has another format.
+    """
+    import wave
+    try:
+        with wave.open(path, 'rb') as wav:
+            if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+                return None
+            return wav.readframes(wav.getnframes()), wav.getframerate()
+    except (OSError, EOFError, wave.Error):
+        return None
+
+
+class VoicePack:
+    """
+    Rendered phrases in a memory-mapped pack file, decoded on demand into a
+    byte-capped LRU cache.
+
+    It is meant to be used from one thread, the CuePlayer worker.
+
+    Attributes
+    ----------
+    path : str
+        the pack file
+    clips : Optional[str]
+        directory of recorded clips used instead of rendered ones
+    max_bytes : int
+        most bytes of decoded WAV data kept in `cache`
+    cache : OrderedDict
+        decoded WAV data by phrase, least recently used first
+    cached_bytes : int
+        bytes of WAV data in `cache`
+    renders, decodes, hits : int
+        phrases rendered into the pack, clips decoded and cache hits so far
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, clips: Optional[str] = None, max_bytes: int = 1 << 20):
+        self.path = path
+        self.clips = clips
+        self.max_bytes = max_bytes
+        self.cache: 'OrderedDict[str, bytes]' = OrderedDict()
+        self.cached_bytes = 0
+        self.renders = self.decodes = self.hits = 0
+        # Phrase -> (offset, length, sample rate) in the map
+        self._index: Dict[str, Tuple[int, int, int]] = {}
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._open()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, phrase: str) -> bool:
+        return phrase in self._index
+
+    def wav(self, phrase: str) -> bytes:
+        """
+        Returns a phrase as WAV data, rendering it into the pack first if needed.
+        """
+        wav = self.cache.get(phrase)
+        if wav is not None:
+            self.cache.move_to_end(phrase)
+            self.hits += 1
+            return wav
+        if phrase not in self._index:
+            self.render([phrase])
+        offset, length, sample_rate = self._index[phrase]
+        wav = to_wav(zlib.decompress(self._map[offset:offset + length]), sample_rate)
+        self.decodes += 1
+        self.cache[phrase] = wav
+        self.cached_bytes += len(wav)
+        while self.cached_bytes > self.max_bytes and len(self.cache) > 1:
+            self.cached_bytes -= len(self.cache.popitem(last=False)[1])
+        return wav
+
+    def prefetch(self, phrases: Iterable[str]) -> None:
+        """
+        Renders and decodes phrases ahead of their use.
+        """
+        phrases = list(phrases)
+        self.render(phrases)
+        for phrase in phrases:
+            self.wav(phrase)
+
+    def render(self, phrases: Iterable[str]) -> int:
+        """
+        Adds the phrases missing from the pack in one rewrite and returns how many there were.
+        """
+        missing = list(dict.fromkeys(phrase for phrase in phrases if phrase not in self._index))
+        if not missing:
+            return 0
+        clips = {}
+        for phrase in missing:
+            clip = None
+            if self.clips:
+                clip = load_clip(os.path.join(self.clips, phrase.replace(' ', '_') + '.wav'))
+            if clip is None:
+                clip = (render_phrase(phrase), SAMPLE_RATE)
+            clips[phrase] = (zlib.compress(clip[0]), clip[1])
+        self._write(clips)
+        self.renders += len(missing)
+        return len(missing)
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self) -> None:
+        self._index = {}
+        try:
+            self._file = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, position = HEADER.unpack_from(self._map)
+            if magic != MAGIC:
+                raise ValueError(f'{self.path} is not a voice pack')
+            end = position
+            count, = INDEX.unpack_from(self._map, position)
+            position += INDEX.size
+            index = {}
+            for _ in range(count):
+                offset, length, sample_rate, size = ENTRY.unpack_from(self._map, position)
+                position += ENTRY.size
+                index[self._map[position:position + size].decode()] = (offset, length, sample_rate)
+                position += size
+            if any(offset + length > end for offset, length, _ in index.values()):
+                raise ValueError(f'{self.path} is damaged')
+        except (ValueError, struct.error):
+            # An empty, foreign or damaged pack is rebuilt from scratch
+            self.close()
+            return
+        self._index = index
+
+    def _write(self, clips: Dict[str, Tuple[bytes, int]]) -> None:
+        """
+        Appends compressed clips and a new index to the pack, then maps it again.
+
+        The stale indexes left behind are dropped by rewriting the pack once
+        they take more room than the clips.
+        """
+        index = dict(self._index)
+        # Windows cannot write a mapped file
+        self.close()
+        with open(self.path, 'r+b' if index else 'wb') as file:
+            if not index:
+                file.write(HEADER.pack(MAGIC, 0))
+            offset = file.seek(0, os.SEEK_END)
+            for phrase, (data, sample_rate) in clips.items():
+                file.write(data)
+                index[phrase] = (offset, len(data), sample_rate)
+                offset += len(data)
+            self._write_index(file, index)
+            file.flush()
+            file.seek(0)
+            file.write(HEADER.pack(MAGIC, offset))
+            stale = offset - HEADER.size - sum(length for _, length, _ in index.values())
+        self._open()
+        if stale > offset - HEADER.size - stale:
+            self._compact()
+
+    def _compact(self) -> None:
+        """
+        Rewrites the pack with only its clips and the current index.
+        """
+        temporary = self.path + '.tmp'
+        index = {}
+        with open(temporary, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, 0))
+            offset = HEADER.size
+            for phrase, (start, length, sample_rate) in self._index.items():
+                file.write(self._map[start:start + length])
+                index[phrase] = (offset, length, sample_rate)
+                offset += length
+            self._write_index(file, index)
+            file.seek(0)
+            file.write(HEADER.pack(MAGIC, offset))
+        self.close()
+        os.replace(temporary, self.path)
+        self._open()
+
+    @staticmethod
+    def _write_index(file, index: Dict[str, Tuple[int, int, int]]) -> None:
+        entries = bytearray(INDEX.pack(len(index)))
+        for phrase, (offset, length, sample_rate) in index.items():
+            name = phrase.encode()
+            entries += ENTRY.pack(offset, length, sample_rate, len(name))
+            entries += name
+        file.write(entries)
+
+
+def countdown_phrase(second: int) -> Optional[str]:
+    """
+    Returns the phrase spoken with `second` seconds left, if any.
+    """
+    if second == 10:
+        return 'ten seconds'
+    if 0 < second < 10:
+        return NUMBER_WORDS[second]
+    return None
+
+
+class VoiceAnnouncer:
+    """
+    Speaks the stage and round when an interval begins and the seconds of
+    the final countdown, through a CuePlayer with a VoicePack store.
+
+    When an interval begins it asks the player to prefetch the phrases of
+    the next one, so they are decoded long before they are due.
+
+    Attributes
+    ----------
+    session : WorkoutSession
+        the session announced
+    player : CuePlayer
+        the player the phrases are played and prefetched through
+    """
+
+    def __init__(self, session, player: CuePlayer):
+        self.session = session
+        self.player = player
+        self._timeline = None
+        self._rounds: List[int] = []
+        self.prefetch(session.stage_index)
+
+    def announce(self, event: Event) -> None:
+        """
+        Plays the phrases for an event of the session.
+        """
+        session = self.session
+        if event.kind == 'cue':
+            phrase = countdown_phrase(event.remaining)
+            if phrase is not None:
+                self.player.play(phrase)
+        elif event.kind == 'complete':
+            self.player.play(COMPLETE_PHRASE)
+        elif event.kind == 'stage' and event.repetitions != session.repetitions:
+            # A stage a late tick passed on its way to the current one
+            return
+        elif event.kind in ('start', 'stage', 'next', 'back') and not session.finished:
+            index = session.stage_index
+            # Resuming in the middle of an interval repeats nothing
+            if event.kind != 'start' or event.remaining >= math.ceil(session.current_duration):
+                for phrase in self.interval_phrases(index):
+                    self.player.play(phrase)
+            self.prefetch(index + 1)
+        elif event.kind == 'stop':
+            # Loading a program stops the session
+            self.prefetch(session.stage_index)
+
+    def prefetch(self, index: int) -> None:
+        """
+        Asks the player to prepare the phrases of the interval with the given index.
+        """
+        self.player.prefetch(self.interval_phrases(index) + self.countdown_phrases())
+
+    def interval_phrases(self, index: int) -> List[str]:
+        """
+        Returns the phrases announcing the interval with the given index.
+        """
+        timeline = self.session.timeline
+        if index >= len(timeline):
+            return [COMPLETE_PHRASE]
+        if timeline is not self._timeline:
+            self._timeline = timeline
+            self._rounds = list(accumulate(int(kind == WORK) for kind in timeline.kinds))
+        kind = timeline.kinds[index]
+        if kind != WORK:
+            return [KINDS[kind]]
+        return [KINDS[kind], f'round {self._rounds[index]} of {self._rounds[-1]}']
+
+    def countdown_phrases(self) -> List[str]:
+        """
+        Returns the phrases of the final countdown.
+        """
+        phrases = (countdown_phrase(second) for second in range(self.session.cue_seconds, 0, -1))
+        return [phrase for phrase in phrases if phrase is not None]
@@ -0,0 +1,270 @@
+"""
+Weekly and monthly training reports over the session history.
+
+The history file is read as NumPy columns and summed per athlete and period
+with `np.unique` and `np.bincount`, without a Python loop over sessions.
+The sums are cached next to the history together with the number of records
+they cover. Opening a report loads the cache and folds in only the records
+appended since, so years of history cost no more than the new sessions.
+"""
+import argparse
+import os
+import struct
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from workout_history import DEFAULT_PATH, MAGIC, RECORD
+
+HISTORY_DTYPE = np.dtype([('start', '<f8'), ('athlete', '<u4'), ('work_time', '<f8'),
+                          ('pause_time', '<f8'), ('planned', '<u4'), ('achieved', '<u4'),
+                          ('skipped', '<u4')])
+
+METRICS = ('sessions', 'work_time', 'pause_time', 'planned', 'achieved', 'skipped')
+PERIODS = ('week', 'month')
+
+# Keys pack the athlete above the period number
+ATHLETE_SHIFT = 32
+
+# Magic, history records covered, UTC offset, start of the first record and
+# the row count of each period, followed by the key and metric columns of each period
+CACHE_MAGIC = b'WTA1'
+CACHE_HEADER = struct.Struct('<4sQdd' + 'Q' * len(PERIODS))
+
+
+def read_columns(path: str, first: int = 0, limit: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    Returns up to `limit` history records from index `first` on as one array
+    per field. A record cut short by a crash is left out.
+    """
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        size = 0
+    count = max(0, (size - len(MAGIC)) // RECORD.size - first)
+    if limit is not None:
+        count = min(count, limit)
+    if count:
+        records = np.fromfile(path, HISTORY_DTYPE, count, offset=len(MAGIC) + first * RECORD.size)
+    else:
+        records = np.empty(0, HISTORY_DTYPE)
+    return {name: np.ascontiguousarray(records[name]) for name in HISTORY_DTYPE.names}
+
+
+def period_numbers(start: np.ndarray, period: str, utc_offset: float = 0) -> np.ndarray:
+    """
+    Returns the number of the week (starting on Monday) or month since 1970
+    of each Unix time, in the time zone `utc_offset` seconds from UTC.
+    """
+    local = start + utc_offset
+    if period == 'week':
+        # 1970-01-01 was a Thursday
+        return (np.floor_divide(local, 86400).astype(np.int64) + 3) // 7
+    if period == 'month':
+        return local.astype('datetime64[s]').astype('datetime64[M]').astype(np.int64)
+    raise ValueError(f'unknown period {period!r}, choose from {", ".join(PERIODS)}')
+
+
+def period_dates(numbers: np.ndarray, period: str) -> np.ndarray:
+    """
+    Returns the first day of each period numbered by period_numbers.
+    """
+    if period == 'week':
+        return (numbers * 7 - 3).astype('datetime64[D]')
+    return numbers.astype('datetime64[M]').astype('datetime64[D]')
+
+
+class PeriodTotals:
+    """
+    Sums of every metric per athlete and period, sorted by key.
+
+    Attributes
+    ----------
+    keys : np.ndarray
+        athlete << ATHLETE_SHIFT | period number, one per row
+    values : Dict[str, np.ndarray]
+        the sum of each metric, one per row
+    """
+
+    def __init__(self, keys: Optional[np.ndarray] = None,
+                 values: Optional[Dict[str, np.ndarray]] = None):
+        self.keys = keys if keys is not None else np.empty(0, np.int64)
+        self.values = values if values is not None else {
+            metric: np.empty(0, np.float64) for metric in METRICS}
+
+    def fold(self, keys: np.ndarray, values: Dict[str, np.ndarray]) -> None:
+        """
+        Adds the metrics of new sessions, one per key.
+
+        The new sessions are summed on their own first, so the existing rows
+        are only searched, and only copied when a new athlete or period appears.
+        """
+        if not len(keys):
+            return
+        new_keys, rows = np.unique(keys, return_inverse=True)
+        sums = {metric: np.bincount(rows, values[metric], len(new_keys)) for metric in METRICS}
+        positions = np.searchsorted(self.keys, new_keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == new_keys[found]
+        for metric in METRICS:
+            self.values[metric][positions[found]] += sums[metric][found]
+        if not found.all():
+            missing = ~found
+            self.keys = np.insert(self.keys, positions[missing], new_keys[missing])
+            for metric in METRICS:
+                self.values[metric] = np.insert(self.values[metric], positions[missing],
+                                                sums[metric][missing])
+
+
+class TrainingReport:
+    """
+    Per-period training totals of the history, kept up to date incrementally.
+
+    Attributes
+    ----------
+    path : str
+        the history file
+    cache_path : str
+        the file caching the totals between runs
+    utc_offset : float
+        seconds from UTC of the time zone periods start in
+    records : int
+        number of history records the totals cover
+    totals : Dict[str, PeriodTotals]
+        the totals by period
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, cache_path: Optional[str] = None,
+                 utc_offset: Optional[float] = None):
+        self.path = path
+        self.cache_path = cache_path or path + '.totals'
+        self.utc_offset = time.localtime().tm_gmtoff if utc_offset is None else utc_offset
+        self.records = 0
+        self.totals = {period: PeriodTotals() for period in PERIODS}
+        self._first_start: Optional[float] = None
+        self.load_cache()
+
+    def load_cache(self) -> bool:
+        """
+        Loads the cached totals if they still describe the start of the history.
+        """
+        try:
+            with open(self.cache_path, 'rb') as file:
+                data = bytearray(os.fstat(file.fileno()).st_size)
+                file.readinto(data)
+            magic, records, utc_offset, first_start, *sizes = CACHE_HEADER.unpack_from(data)
+        except (OSError, struct.error):
+            return False
+        if magic != CACHE_MAGIC or utc_offset != self.utc_offset or records > self._history_records():
+            return False
+        if records and read_columns(self.path, 0, 1)['start'].tolist() != [first_start]:
+            # The history was replaced
+            return False
+        if len(data) != CACHE_HEADER.size + 8 * (1 + len(METRICS)) * sum(sizes):
+            return False
+        # Writable views of the buffer, one per column
+        offset = CACHE_HEADER.size
+        totals = {}
+        for period, size in zip(PERIODS, sizes):
+            columns = []
+            for dtype in [np.int64] + [np.float64] * len(METRICS):
+                columns.append(np.frombuffer(data, dtype, size, offset))
+                offset += 8 * size
+            totals[period] = PeriodTotals(columns[0], dict(zip(METRICS, columns[1:])))
+        self.totals = totals
+        self.records = records
+        self._first_start = first_start if records else None
+        return True
+
+    def save_cache(self) -> None:
+        temporary = self.cache_path + '.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(CACHE_HEADER.pack(
+                CACHE_MAGIC, self.records, self.utc_offset,
+                self._first_start if self._first_start is not None else 0.0,
+                *(len(self.totals[period].keys) for period in PERIODS)))
+            for period in PERIODS:
+                totals = self.totals[period]
+                totals.keys.astype(np.int64, copy=False).tofile(file)
+                for metric in METRICS:
+                    totals.values[metric].astype(np.float64, copy=False).tofile(file)
+        os.replace(temporary, self.cache_path)
+
+    def refresh(self) -> int:
+        """
+        Folds the records appended to the history since the last refresh into
+        the totals and saves them, returning how many there were.
+        """
+        columns = read_columns(self.path, self.records)
+        count = len(columns['start'])
+        if not count:
+            return 0
+        if self._first_start is None:
+            self._first_start = float(columns['start'][0])
+        values = dict(columns, sessions=np.ones(count))
+        athletes = columns['athlete'].astype(np.int64) << ATHLETE_SHIFT
+        for period, totals in self.totals.items():
+            totals.fold(athletes | period_numbers(columns['start'], period, self.utc_offset), values)
+        self.records += count
+        self.save_cache()
+        return count
+
+    def rebuild(self) -> None:
+        """
+        Discards the totals and recomputes them from the whole history.
+        """
+        self.records = 0
+        self.totals = {period: PeriodTotals() for period in PERIODS}
+        self._first_start = None
+        self.refresh()
+
+    def table(self, period: str = 'week', athlete: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Returns the totals of each athlete and period as columns, sorted by
+        athlete and date: 'athlete', 'date' (first day of the period) and
+        one column per metric.
+        """
+        totals = self.totals[period]
+        keys = totals.keys
+        rows = slice(None)
+        if athlete is not None:
+            low = athlete << ATHLETE_SHIFT
+            rows = slice(*np.searchsorted(keys, [low, low + (1 << ATHLETE_SHIFT)]))
+        keys = keys[rows]
+        table = {'athlete': keys >> ATHLETE_SHIFT,
+                 'date': period_dates(keys & ((1 << ATHLETE_SHIFT) - 1), period)}
+        for metric, values in totals.values.items():
+            table[metric] = values[rows]
+        return table
+
+    def _history_records(self) -> int:
+        try:
+            return max(0, (os.path.getsize(self.path) - len(MAGIC)) // RECORD.size)
+        except FileNotFoundError:
+            return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Weekly and monthly training report')
+    parser.add_argument('--history', metavar='PATH', default=DEFAULT_PATH,
+                        help='session history to report on')
+    parser.add_argument('--period', choices=PERIODS, default='week')
+    parser.add_argument('--athlete', type=int, help='only this athlete')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='recompute the totals from the whole history')
+    args = parser.parse_args()
+
+    report = TrainingReport(args.history)
+    if args.rebuild:
+        report.rebuild()
+    else:
+        report.refresh()
+    table = report.table(args.period, args.athlete)
+    print(f"{'athlete':>7}  {args.period:<10}  {'sessions':>8}  {'work h':>7}  "
+          f"{'achieved':>13}  {'skipped':>7}  {'pause min':>9}")
+    for row in range(len(table['athlete'])):
+        print(f"{table['athlete'][row]:>7}  {str(table['date'][row]):<10}  {table['sessions'][row]:>8.0f}  "
+              f"{table['work_time'][row] / 3600:>7.1f}  "
+              f"{table['achieved'][row]:>6.0f}/{table['planned'][row]:<6.0f}  "
+              f"{table['skipped'][row]:>7.0f}  {table['pause_time'][row] / 60:>9.1f}")
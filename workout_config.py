@@ -0,0 +1,296 @@
+"""
+Workout configuration files, validated and reloaded while the timer runs.
+
+A configuration is a JSON or TOML file holding either the classic settings
+
+    work = 480
+    rest = 120
+    repetitions = 8
+
+or a program in the format of workout_program (warmup, blocks, cooldown).
+Durations are in seconds.
+
+ConfigWatcher polls the file's modification time and size, parses it only
+when they change and hands a new configuration to the session at the next
+interval boundary, so edits take effect without a restart.
+"""
+import json
+import os
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from workout_engine import Event
+from workout_program import Timeline, compile_program
+
+SETTINGS_KEYS = ('work', 'rest', 'repetitions')
+PROGRAM_KEYS = ('warmup', 'blocks', 'cooldown')
+
+
+class WorkoutConfig(NamedTuple):
+    """
+    A validated workout configuration.
+
+    `work` and `rest` are the durations in seconds of the classic settings,
+    or 0 for a program.
+    """
+    timeline: Timeline
+    work: float
+    rest: float
+
+
+def parse_duration(text: str) -> float:
+    """
+    Parses a duration typed by the user: seconds ("90") or minutes and seconds ("1:30").
+
+    Raises
+    ------
+    ValueError
+        If the text is not a duration.
+    """
+    parts = text.strip().split(':')
+    if len(parts) > 2 or not all(parts):
+        raise ValueError(f'not a duration: {text!r}')
+    try:
+        values = [float(part) for part in parts]
+    except ValueError:
+        raise ValueError(f'not a duration: {text!r}') from None
+    if len(values) == 2 and not 0 <= values[1] < 60:
+        raise ValueError(f'seconds must be between 0 and 59: {text!r}')
+    seconds = values[0] * 60 + values[1] if len(values) == 2 else values[0]
+    if seconds < 0:
+        raise ValueError(f'duration must not be negative: {text!r}')
+    return seconds
+
+
+def format_duration(seconds: float) -> str:
+    """
+    Formats a duration as minutes and seconds, the way parse_duration reads it.
+    """
+    minutes, seconds = divmod(seconds, 60)
+    return f'{int(minutes)}:{seconds:02g}' if seconds == int(seconds) else f'{int(minutes)}:{seconds:04.1f}'
+
+
+def _number(data: Dict[str, Any], key: str, minimum: float) -> float:
+    value = data[key]
+    # bool is an int, but "work = true" is a typo, not a duration
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f'{key} must be a number, got {value!r}')
+    if value < minimum:
+        raise ValueError(f'{key} must be at least {minimum}, got {value}')
+    return value
+
+
+def settings_config(work: float, rest: float, repetitions: int) -> WorkoutConfig:
+    """
+    Validates the classic settings and builds their configuration.
+
+    Raises
+    ------
+    ValueError
+        If a value is out of range.
+    """
+    data = {'work': work, 'rest': rest, 'repetitions': repetitions}
+    work = _number(data, 'work', 1)
+    rest = _number(data, 'rest', 0)
+    if _number(data, 'repetitions', 1) != int(repetitions):
+        raise ValueError(f'repetitions must be a whole number, got {repetitions}')
+    return WorkoutConfig(Timeline.alternating(work, rest, int(repetitions)), work, rest)
+
+
+def build_config(data: Dict[str, Any]) -> WorkoutConfig:
+    """
+    Validates parsed configuration data and builds the configuration.
+
+    Raises
+    ------
+    ValueError
+        If the data is not a valid configuration.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('a configuration must be a table of settings')
+    unknown = sorted(set(data) - set(SETTINGS_KEYS) - set(PROGRAM_KEYS))
+    if unknown:
+        raise ValueError(f'unknown settings: {", ".join(unknown)}')
+    settings = [key for key in SETTINGS_KEYS if key in data]
+    program = [key for key in PROGRAM_KEYS if key in data]
+    if settings and program:
+        raise ValueError('use either work, rest and repetitions or a program, not both')
+    if program:
+        try:
+            timeline = compile_program(data)
+        except (TypeError, KeyError, AttributeError) as error:
+            raise ValueError(f'malformed program: {error}') from None
+        if not len(timeline):
+            raise ValueError('the program has no intervals')
+        return WorkoutConfig(timeline, 0, 0)
+    missing = [key for key in SETTINGS_KEYS if key not in data]
+    if missing:
+        raise ValueError(f'missing settings: {", ".join(missing)}')
+    return settings_config(data['work'], data['rest'], data['repetitions'])
+
+
+def parse_config(path: str, content: bytes) -> Dict[str, Any]:
+    """
+    Parses the content of a JSON or TOML file, chosen by the file extension.
+
+    Raises
+    ------
+    ValueError
+        If the content cannot be parsed.
+    """
+    if path.endswith('.toml'):
+        try:
+            import tomllib
+        except ImportError:
+            # Python before 3.11
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise ValueError('reading TOML needs Python 3.11 or the tomli package') from None
+        try:
+            return tomllib.loads(content.decode())
+        except (tomllib.TOMLDecodeError, UnicodeDecodeError) as error:
+            raise ValueError(f'{path}: {error}') from None
+    try:
+        return json.loads(content)
+    except ValueError as error:
+        raise ValueError(f'{path}: {error}') from None
+
+
+def load_config(path: str) -> WorkoutConfig:
+    """
+    Reads, parses and validates a configuration file.
+
+    Raises
+    ------
+    OSError
+        If the file cannot be read.
+    ValueError
+        If the file is not a valid configuration.
+    """
+    with open(path, 'rb') as file:
+        content = file.read()
+    try:
+        return build_config(parse_config(path, content))
+    except ValueError as error:
+        raise ValueError(f'{path}: {error}') from None
+
+
+class ConfigWatcher:
+    """
+    Polls a configuration file and applies its changes to a WorkoutSession.
+
+    A poll is one `os.stat`; the file is read and parsed only when its
+    modification time or size changed. A changed configuration is applied
+    right away while the session is stopped, and otherwise at the start of
+    the next stage, at the same stage index.
+
+    Attributes
+    ----------
+    path : str
+        the configuration file
+    interval : float
+        seconds between polls once attached
+    config : Optional[WorkoutConfig]
+        the last valid configuration read
+    pending : Optional[WorkoutConfig]
+        a configuration waiting for the next stage to be applied
+    error : Optional[str]
+        why the last changed file could not be used, if it could not
+    polls : int
+        number of polls so far
+    parses : int
+        number of times the file was read and parsed
+    """
+
+    def __init__(self, path: str, interval: float = 1.0):
+        self.path = path
+        self.interval = interval
+        self.config: Optional[WorkoutConfig] = None
+        self.pending: Optional[WorkoutConfig] = None
+        self.error: Optional[str] = None
+        self.polls = 0
+        self.parses = 0
+        self.session = None
+        self.scheduler = None
+        self._signature: Optional[Tuple[int, int]] = None
+        self._data: Any = None
+        self._handle = None
+
+    def poll(self) -> Optional[WorkoutConfig]:
+        """
+        Checks the file and returns its configuration if it changed since the last poll.
+
+        Raises
+        ------
+        OSError, ValueError
+            On the first poll only, if the file is missing or invalid. Later
+            failures keep the last valid configuration and set `error`.
+        """
+        self.polls += 1
+        try:
+            status = os.stat(self.path)
+            signature = (status.st_mtime_ns, status.st_size)
+            if signature == self._signature:
+                return None
+            self._signature = signature
+            with open(self.path, 'rb') as file:
+                content = file.read()
+            self.parses += 1
+            data = parse_config(self.path, content)
+            if data == self._data:
+                # Saved again without a change that matters
+                return None
+            config = build_config(data)
+        except (OSError, ValueError) as error:
+            if self.config is None:
+                raise
+            self.error = f'{self.path}: {error}'
+            return None
+        self._data = data
+        self.error = None
+        self.config = config
+        return config
+
+    def attach(self, session, scheduler: Any = None) -> None:
+        """
+        Polls every `interval` seconds on `scheduler` (default is the session's)
+        and applies changes to `session`.
+        """
+        self.session = session
+        self.scheduler = scheduler if scheduler is not None else session.scheduler
+        session.add_listener(self._on_event)
+        self._handle = self.scheduler.call_later(self.interval, self._tick)
+
+    def apply(self, session, config: WorkoutConfig) -> None:
+        """
+        Loads a configuration into a session, keeping its position if it is running.
+        """
+        session.work_duration = config.work
+        session.rest_duration = config.rest
+        if session.running or session.elapsed() > 0:
+            session.replace(config.timeline)
+        else:
+            session.load(config.timeline)
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self.scheduler.cancel(self._handle)
+            self._handle = None
+
+    def _tick(self) -> None:
+        self._handle = self.scheduler.call_later(self.interval, self._tick)
+        config = self.poll()
+        if config is None:
+            return
+        if self.session.running or self.session.elapsed() > 0:
+            self.pending = config
+        else:
+            self.apply(self.session, config)
+
+    def _on_event(self, event: Event) -> None:
+        if self.pending is not None and event.kind in ('stage', 'stop'):
+            config, self.pending = self.pending, None
+            session = self.session
+            session.work_duration = config.work
+            session.rest_duration = config.rest
+            session.swap(config.timeline)
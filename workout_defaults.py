@@ -0,0 +1,15 @@
+"""
+Default files and ports of the optional features of the frontends.
+
+They live apart from the features, so a frontend can show them as
+command-line defaults without importing a feature that was not asked for.
+"""
+import os
+
+JOURNAL_PATH = os.path.join(os.path.expanduser('~'), '.workout_timer.journal')
+HISTORY_PATH = os.path.join(os.path.expanduser('~'), '.workout_timer.history')
+LIBRARY_PATH = os.path.join(os.path.expanduser('~'), '.workout_timer.library')
+VOICE_PATH = os.path.join(os.path.expanduser('~'), '.workout_timer.voice')
+
+CLOCK_PORT = 5009
+REMOTE_PORT = 8766
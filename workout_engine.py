@@ -0,0 +1,846 @@
+import heapq
+import math
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+from workout_program import KINDS, REST, WORK, Timeline
+
+WORK_STAGE = 'Work ==>'
+REST_STAGE = 'Rest ==>'
+
+# Interval kind -> stage name shown by the frontends
+STAGE_NAMES = {
+    'warmup': 'Warm-up ==>',
+    'work': WORK_STAGE,
+    'rest': REST_STAGE,
+    'cooldown': 'Cooldown ==>',
+}
+
+# Shortest wake-up delay in seconds, so float rounding never schedules a busy loop
+MIN_DELAY = 1e-6
+
+
+def step_delay(remaining: float, resolution: float) -> float:
+    """
+    Returns the seconds until `remaining`, counted down in steps of
+    `resolution` seconds, reaches its next step.
+
+    Steps are measured from the deadline, so rounding errors of earlier
+    wake-ups do not add up.
+    """
+    step = max(0, math.ceil((remaining - MIN_DELAY) / resolution) - 1)
+    return max(remaining - step * resolution, MIN_DELAY)
+
+
+class WorkoutEngine:
+    """
+    A GUI-agnostic interval engine driven by absolute monotonic deadlines.
+
+    The engine runs a compiled Timeline. Its only moving state is the session
+    origin: the monotonic time at which the session would have started had it
+    never been paused or skipped. The current interval and its deadline are
+    bisect lookups of `now - origin` in the timeline offsets, so late or
+    missed callbacks do not accumulate into the length of the session, and
+    next, back and jumps only move the origin.
+
+    Attributes
+    ----------
+    work_duration : int
+        duration of work in seconds
+    rest_duration : int
+        duration of rest in seconds
+    initial_repetitions : int
+        number of intervals in the session
+    timeline : Timeline
+        the compiled intervals of the session
+    stage_index : int
+        index of the current interval
+    running : bool
+        whether the timer is currently running
+    clock : Callable[[], float]
+        monotonic clock used to compute deadlines
+
+    """
+
+    def __init__(self, work_duration: int, rest_duration: int, repetitions: int,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Constructs all the necessary attributes for the WorkoutEngine object.
+
+        Parameters
+        ----------
+        work_duration : int
+            Duration of work in seconds.
+        rest_duration : int
+            Duration of rest in seconds.
+        repetitions : int
+            Number of stages in the session.
+        clock : Callable[[], float], optional
+            Monotonic clock returning seconds (default is time.monotonic).
+        """
+        self.clock = clock
+        self.configure(work_duration, rest_duration, repetitions)
+
+    def configure(self, work_duration: int, rest_duration: int, repetitions: int) -> None:
+        """
+        Replaces the workout with alternating work and rest stages and resets the session.
+        """
+        self.work_duration = work_duration
+        self.rest_duration = rest_duration
+        self.load(Timeline.alternating(work_duration, rest_duration, repetitions))
+
+    def load(self, timeline: Timeline) -> None:
+        """
+        Replaces the workout with a compiled timeline and resets the session.
+        """
+        self.timeline = timeline
+        self.initial_repetitions = len(timeline)
+        self.stop()
+
+    def replace(self, timeline: Timeline, now: Optional[float] = None) -> None:
+        """
+        Replaces the workout with a compiled timeline and moves to the start of
+        the stage with the current index, keeping the session running if it was.
+        """
+        index = self.stage_index
+        self.timeline = timeline
+        self.initial_repetitions = len(timeline)
+        self.jump(index, now)
+
+    @property
+    def repetitions(self) -> int:
+        """
+        Number of stages left in the session, including the current one.
+        """
+        return self.initial_repetitions - self.stage_index
+
+    @property
+    def finished(self) -> bool:
+        """
+        Whether every stage of the session has elapsed.
+        """
+        return self.stage_index >= self.initial_repetitions
+
+    @property
+    def current_kind(self) -> str:
+        """
+        Kind of the current interval, one of workout_program.KINDS.
+        """
+        if self.finished:
+            return KINDS[REST] if self.stage_index % 2 else KINDS[WORK]
+        return KINDS[self.timeline.kinds[self.stage_index]]
+
+    @property
+    def current_stage(self) -> str:
+        """
+        Name of the current stage.
+        """
+        return STAGE_NAMES[self.current_kind]
+
+    @property
+    def current_duration(self) -> float:
+        """
+        Full duration of the current stage in seconds.
+        """
+        return self.stage_duration(self.stage_index)
+
+    @property
+    def current_time(self) -> int:
+        """
+        Whole seconds left in the current stage, rounded up for display.
+        """
+        return math.ceil(self.remaining_time())
+
+    @property
+    def deadline(self) -> Optional[float]:
+        """
+        Monotonic time at which the current stage ends, or None while stopped or paused.
+        """
+        if not self.running:
+            return None
+        return self._origin + self.timeline.offsets[self.stage_index + 1]
+
+    def stage_duration(self, index: int) -> float:
+        """
+        Returns the duration of the stage with the given index in seconds.
+        """
+        if index >= self.initial_repetitions:
+            return 0
+        return self.timeline.durations[index]
+
+    def elapsed(self, now: Optional[float] = None) -> float:
+        """
+        Returns the position in the session timeline in seconds.
+        """
+        if not self.running:
+            return self._elapsed
+        if now is None:
+            now = self.clock()
+        return now - self._origin
+
+    def remaining_time(self, now: Optional[float] = None) -> float:
+        """
+        Returns the exact time left in the current stage in seconds.
+        """
+        if self.finished:
+            return 0.0
+        return max(0.0, self.timeline.offsets[self.stage_index + 1] - self.elapsed(now))
+
+    def time_until_block_end(self, now: Optional[float] = None) -> float:
+        """
+        Returns the seconds left in the current block of the program.
+        """
+        return self.timeline.time_until_block_end(self.elapsed(now))
+
+    def update(self, now: Optional[float] = None) -> List[str]:
+        """
+        Advances past every stage whose deadline has already passed.
+
+        Returns
+        -------
+        List[str]
+            The stages entered during this call, in order.
+        """
+        if not self.running:
+            return []
+        if now is None:
+            now = self.clock()
+        elapsed = now - self._origin
+        if elapsed < self.timeline.offsets[self.stage_index + 1]:
+            return []
+        previous = self.stage_index
+        self.stage_index = self.timeline.index_at(elapsed)
+        if self.finished:
+            self.running = False
+            self._elapsed = self.timeline.total
+            entered = range(previous + 1, self.stage_index)
+        else:
+            entered = range(previous + 1, self.stage_index + 1)
+        return [STAGE_NAMES[KINDS[self.timeline.kinds[index]]] for index in entered]
+
+    def next_tick_delay(self, now: Optional[float] = None, resolution: float = 1.0) -> float:
+        """
+        Returns the seconds until the time left, counted in steps of
+        `resolution` seconds, next changes.
+        """
+        if now is None:
+            now = self.clock()
+        return step_delay(self.remaining_time(now), resolution)
+
+    def start(self) -> None:
+        """
+        Starts the timer from the current position.
+        """
+        if self.running or self.finished:
+            return
+        self.running = True
+        self._origin = self.clock() - self._elapsed
+
+    def stop(self) -> None:
+        """
+        Stops the timer and resets the current stage, current time, and repetitions.
+        """
+        self.running = False
+        self._elapsed = 0.0
+        self._origin = None
+        self.stage_index = self.timeline.index_at(0.0)
+
+    def pause(self) -> None:
+        """
+        Pauses or resumes the timer.
+        """
+        if self.running:
+            now = self.clock()
+            self.update(now)
+            if self.running:
+                self._elapsed = self.elapsed(now)
+                self.running = False
+        else:
+            self.start()
+
+    def next(self) -> None:
+        """
+        Skips to the next stage or repetition.
+        """
+        if self.running and not self.finished:
+            now = self.clock()
+            self.update(now)
+            if self.running:
+                self.jump(self.stage_index + 1, now)
+
+    def back(self) -> None:
+        """
+        Goes back to the start of the previous stage.
+        """
+        if self.running and self.stage_index > 0:
+            now = self.clock()
+            self.update(now)
+            if self.running:
+                self.jump(self.stage_index - 1, now)
+
+    def restore(self, elapsed: float) -> None:
+        """
+        Places the session `elapsed` seconds into its timeline, paused.
+        """
+        self.running = False
+        self._origin = None
+        self._elapsed = min(max(0.0, elapsed), self.timeline.total)
+        self.stage_index = self.timeline.index_at(self._elapsed)
+
+    def jump(self, index: int, now: Optional[float] = None) -> None:
+        """
+        Moves to the start of the stage with the given index.
+        """
+        if now is None:
+            now = self.clock()
+        index = max(0, min(index, self.initial_repetitions))
+        elapsed = self.timeline.offsets[index]
+        self.stage_index = self.timeline.index_at(elapsed)
+        if self.finished:
+            self.running = False
+        if self.running:
+            self._origin = now - elapsed
+        else:
+            self._elapsed = elapsed
+
+
+class Event(NamedTuple):
+    """
+    An entry of the event stream emitted by a WorkoutSession.
+
+    `kind` is one of 'start', 'pause', 'stop', 'next', 'back' for control
+    actions, 'stage' when a stage begins on schedule, 'cue' for every second
+    of the final countdown and 'complete' when the session ends. A tick that
+    passes several stages emits a 'stage' for each; those before the current
+    one have no time left.
+    """
+    time: float
+    kind: str
+    stage: str
+    repetitions: int
+    remaining: int
+
+
+# Bits of Snapshot.changed, one per group of fields a frontend renders
+TIME = 1
+STAGE = 2
+REPETITIONS = 4
+PROGRESS = 8
+RUNNING = 16
+EVERYTHING = TIME | STAGE | REPETITIONS | PROGRESS | RUNNING
+
+
+class Snapshot(NamedTuple):
+    """
+    What a frontend displays, as of one change of a timer.
+
+    `time` is the whole seconds left in the stage and `tenths` the tenths of
+    a second left during the final countdown, None before it. `progress` is
+    the fraction of the stage left, at the same resolution as the displayed
+    time. `changed` holds the flags of the fields that differ from the
+    previous snapshot, or EVERYTHING for the first one a subscriber gets.
+    """
+    time: int
+    tenths: Optional[int]
+    stage: str
+    kind: str
+    repetitions: int
+    initial_repetitions: int
+    progress: float
+    running: bool
+    changed: int
+
+
+class StateFeed:
+    """
+    Sends one Snapshot of a timer to every subscriber whenever what it displays changes.
+
+    The snapshot and its dirty flags are computed once per change whatever the
+    number of subscribers, and not at all while there are none.
+
+    Attributes
+    ----------
+    timer : object
+        a WorkoutSession or anything with the attributes it displays
+    subscribers : List[Callable[[Snapshot], None]]
+        callbacks receiving every snapshot
+    snapshot : Optional[Snapshot]
+        the last snapshot sent
+    """
+
+    def __init__(self, timer: Any):
+        self.timer = timer
+        self.subscribers: List[Callable[[Snapshot], None]] = []
+        self.snapshot: Optional[Snapshot] = None
+        self._held = 0
+
+    def subscribe(self, callback: Callable[[Snapshot], None]) -> None:
+        """
+        Registers a callback and sends it the current state with every flag set.
+        """
+        self.subscribers.append(callback)
+        snapshot = self.capture()
+        self.snapshot = snapshot
+        callback(snapshot._replace(changed=EVERYTHING))
+
+    def unsubscribe(self, callback: Callable[[Snapshot], None]) -> None:
+        self.subscribers.remove(callback)
+
+    def capture(self, now: Optional[float] = None) -> Snapshot:
+        """
+        Returns the current state with the flags of the fields changed since the last snapshot sent.
+        """
+        timer = self.timer
+        remaining = timer.remaining_time(now)
+        time_left = math.ceil(remaining)
+        tenths = None
+        if timer.fine_seconds and remaining <= timer.fine_seconds:
+            # Rounded so a wake-up a rounding error early still shows the step it was due for
+            tenths = math.ceil(round(remaining * 10, 9))
+        duration = timer.current_duration
+        if not duration:
+            progress = 0.0
+        elif tenths is None:
+            progress = time_left / duration
+        else:
+            progress = tenths / (duration * 10)
+        stage = timer.current_stage
+        kind = timer.current_kind
+        repetitions = timer.repetitions
+        running = timer.running
+        previous = self.snapshot
+        if previous is None:
+            changed = EVERYTHING
+        else:
+            changed = 0
+            if time_left != previous.time or tenths != previous.tenths:
+                changed |= TIME
+            if stage != previous.stage or kind != previous.kind:
+                changed |= STAGE
+            if repetitions != previous.repetitions or timer.initial_repetitions != previous.initial_repetitions:
+                changed |= REPETITIONS
+            if progress != previous.progress:
+                changed |= PROGRESS
+            if running != previous.running:
+                changed |= RUNNING
+        return Snapshot(time_left, tenths, stage, kind, repetitions, timer.initial_repetitions,
+                        progress, running, changed)
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """
+        Holds back the snapshots of the changes made inside the block and
+        sends one for all of them at its end.
+        """
+        self._held += 1
+        try:
+            yield
+        finally:
+            self._held -= 1
+            if not self._held:
+                self.publish()
+
+    def publish(self, now: Optional[float] = None) -> Optional[Snapshot]:
+        """
+        Sends a snapshot to every subscriber if anything they display changed.
+        """
+        if not self.subscribers or self._held:
+            return None
+        snapshot = self.capture(now)
+        if not snapshot.changed:
+            return None
+        self.snapshot = snapshot
+        for callback in self.subscribers:
+            callback(snapshot)
+        return snapshot
+
+
+class WorkoutSession(WorkoutEngine):
+    """
+    A WorkoutEngine that wakes itself up on a scheduler and emits its event stream.
+
+    The scheduler is any object with `call_later(delay, callback) -> handle`
+    and `cancel(handle)` methods, which lets the same session run on the Tk
+    or Qt event loop or on a VirtualScheduler faster than real time.
+
+    Attributes
+    ----------
+    scheduler : object
+        scheduler the session arms its next wake-up on
+    listeners : List[Callable[[Event], None]]
+        callbacks receiving every emitted event
+    cue_seconds : int
+        length of the final countdown that emits a cue every second
+    tick_every_second : bool
+        whether to wake up on every displayed second or only for cues and deadlines
+    fine_seconds : float
+        length of the final countdown that wakes up every `fine_interval` instead
+        of every second, for a smooth display
+    fine_interval : float
+        seconds between wake-ups during the final countdown
+    instruments : Optional[Instruments]
+        records how late every wake-up fires under 'tick_lateness', if set
+    feed : StateFeed
+        sends a Snapshot to its subscribers after every change of the displayed state
+
+    """
+
+    def __init__(self, work_duration: int, rest_duration: int, repetitions: int,
+                 scheduler: Any = None, clock: Callable[[], float] = time.monotonic,
+                 cue_seconds: int = 5, tick_every_second: bool = True,
+                 fine_seconds: float = 0, fine_interval: float = 0.1):
+        """
+        Constructs all the necessary attributes for the WorkoutSession object.
+        """
+        self.scheduler = scheduler
+        self.listeners: List[Callable[[Event], None]] = []
+        self.cue_seconds = cue_seconds
+        self.tick_every_second = tick_every_second
+        self.fine_seconds = fine_seconds
+        self.fine_interval = fine_interval
+        self.instruments = None
+        # Stage and second of the last cue, so fine wake-ups cue once per second
+        self._cued: Optional[Tuple[int, int]] = None
+        self._handle = None
+        self._due = 0.0
+        self.feed = StateFeed(self)
+        super().__init__(work_duration, rest_duration, repetitions, clock)
+
+    def add_listener(self, listener: Callable[[Event], None]) -> None:
+        """
+        Registers a callback for every event of the session.
+        """
+        self.listeners.append(listener)
+
+    def subscribe(self, callback: Callable[[Snapshot], None]) -> None:
+        """
+        Registers a callback for a Snapshot of every change of the displayed state.
+        """
+        self.feed.subscribe(callback)
+
+    def emit(self, kind: str, now: Optional[float] = None, stage: Optional[str] = None,
+             repetitions: Optional[int] = None) -> None:
+        """
+        Sends an event describing the current state to every listener, or a
+        stage the session passed on its way there if `stage` and `repetitions` are given.
+        """
+        if now is None:
+            now = self.clock()
+        if stage is None:
+            event = Event(now, kind, self.current_stage, self.repetitions,
+                          math.ceil(self.remaining_time(now)))
+        else:
+            event = Event(now, kind, stage, repetitions, 0)
+        for listener in self.listeners:
+            listener(event)
+
+    def tick(self) -> None:
+        """
+        Advances the engine to now, emits the resulting events and re-arms the
+        scheduler.
+        """
+        self._handle = None
+        now = self.clock()
+        if self.instruments is not None:
+            self.instruments.record('tick_lateness', max(0.0, now - self._due))
+        previous = self.stage_index
+        for index, stage in enumerate(self.update(now), previous + 1):
+            if index == self.stage_index:
+                self.emit('stage', now)
+            else:
+                self.emit('stage', now, stage, self.initial_repetitions - index)
+        if self.finished:
+            self.emit('complete', now)
+        elif self.running:
+            second = math.ceil(self.remaining_time(now))
+            if second <= self.cue_seconds and (self.stage_index, second) != self._cued:
+                self._cued = (self.stage_index, second)
+                self.emit('cue', now)
+        self.schedule()
+
+    def wakeup_delay(self, now: Optional[float] = None) -> float:
+        """
+        Returns the seconds until the session next has something to do.
+
+        That is the next displayed second, or the next `fine_interval` during
+        the final countdown. Without `tick_every_second` the session sleeps
+        until the final countdown starts.
+        """
+        if now is None:
+            now = self.clock()
+        remaining = self.remaining_time(now)
+        if remaining <= self.fine_seconds:
+            return step_delay(remaining, self.fine_interval)
+        countdown = max(self.cue_seconds, self.fine_seconds)
+        if not self.tick_every_second and remaining > countdown:
+            return remaining - countdown
+        delay = step_delay(remaining, 1.0)
+        if self.fine_seconds:
+            delay = min(delay, remaining - self.fine_seconds)
+        return delay
+
+    def schedule(self) -> None:
+        """
+        Arms the next wake-up while running and cancels it otherwise, then
+        publishes the new state to the subscribers of the feed.
+        """
+        if self._handle is not None:
+            self.scheduler.cancel(self._handle)
+            self._handle = None
+        now = self.clock()
+        if self.running and self.scheduler is not None:
+            delay = self.wakeup_delay(now)
+            self._due = now + delay
+            self._handle = self.scheduler.call_later(delay, self.tick)
+        self.feed.publish(now)
+
+    def start(self) -> None:
+        """
+        Starts the timer from the current position.
+        """
+        if not self.running and not self.finished:
+            super().start()
+            self.emit('start')
+            self.schedule()
+
+    def stop(self) -> None:
+        """
+        Stops the timer and resets the current stage, current time, and repetitions.
+        """
+        super().stop()
+        self._cued = None
+        self.emit('stop')
+        self.schedule()
+
+    def restore(self, elapsed: float) -> None:
+        """
+        Places the session `elapsed` seconds into its timeline, paused.
+        """
+        super().restore(elapsed)
+        # The countdown may be restored to a second already cued
+        self._cued = None
+        self.schedule()
+
+    def reposition(self, timeline: Timeline, elapsed: float, running: bool) -> None:
+        """
+        Places the session `elapsed` seconds into `timeline`, running or paused,
+        and emits the one event that describes the new state: 'start', 'pause',
+        or 'stop' if it is paused at the very start.
+        """
+        now = self.clock()
+        self.timeline = timeline
+        self.initial_repetitions = len(timeline)
+        super().restore(elapsed)
+        self._cued = None
+        if running and not self.finished:
+            self.running = True
+            self._origin = now - self._elapsed
+            self.emit('start', now)
+        else:
+            self.emit('pause' if self._elapsed else 'stop', now)
+        self.schedule()
+
+    def replace(self, timeline: Timeline, now: Optional[float] = None) -> None:
+        """
+        Replaces the workout at the start of the current stage and emits it as
+        a new 'stage'.
+        """
+        super().replace(timeline, now)
+        self.emit('complete' if self.finished else 'stage', now)
+        self.schedule()
+
+    def swap(self, timeline: Timeline) -> None:
+        """
+        Replaces the workout under the current stage without emitting or
+        rescheduling, so a listener can call it while the session sends an event.
+
+        The current stage keeps the moment it started and the time spent in
+        it; the stages after it follow the new timeline. The action that sent
+        the event reschedules and publishes the new state right after.
+        """
+        index = min(self.stage_index, len(timeline))
+        shift = timeline.offsets[index] - self.timeline.offsets[self.stage_index]
+        self.timeline = timeline
+        self.initial_repetitions = len(timeline)
+        self.stage_index = index
+        if self.finished:
+            self.running = False
+            self._origin = None
+            self._elapsed = timeline.total
+        elif self.running:
+            self._origin -= shift
+        else:
+            self._elapsed += shift
+
+    def pause(self) -> None:
+        """
+        Pauses or resumes the timer.
+        """
+        if self.running:
+            super().pause()
+            self.emit('pause')
+            self.schedule()
+        else:
+            self.start()
+
+    def next(self) -> None:
+        """
+        Skips to the next stage or repetition.
+        """
+        if self.running and not self.finished:
+            super().next()
+            self.emit('next' if not self.finished else 'complete')
+            self.schedule()
+
+    def finish_stage(self) -> None:
+        """
+        Ends the current stage now, as if its time had run out, for stages
+        that end on a condition rather than on their duration.
+        """
+        if self.running and not self.finished:
+            now = self.clock()
+            super().next()
+            self.emit('stage', now)
+            if self.finished:
+                self.emit('complete', now)
+            self.schedule()
+
+    def back(self) -> None:
+        """
+        Goes back to the previous stage or repetition.
+        """
+        if self.running and self.stage_index > 0:
+            super().back()
+            self.emit('back')
+            self.schedule()
+
+
+class VirtualClock:
+    """
+    A manually advanced clock for running sessions faster than real time.
+
+    Attributes
+    ----------
+    now : float
+        the current time in seconds
+    """
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class VirtualScheduler:
+    """
+    A heap-based scheduler that jumps a VirtualClock straight to each wake-up.
+
+    Attributes
+    ----------
+    clock : VirtualClock
+        clock moved forward as callbacks fire
+    lateness : Optional[Callable[[], float]]
+        returns extra seconds added to each wake-up, to emulate a loaded event loop
+    """
+
+    def __init__(self, clock: VirtualClock, lateness: Optional[Callable[[], float]] = None):
+        self.clock = clock
+        self.lateness = lateness
+        self._heap: List[list] = []
+        self._sequence = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> list:
+        """
+        Schedules `callback` to run `delay` seconds from now.
+        """
+        if self.lateness is not None:
+            delay += self.lateness()
+        self._sequence += 1
+        entry = [self.clock.now + delay, self._sequence, callback]
+        heapq.heappush(self._heap, entry)
+        return entry
+
+    def cancel(self, handle: list) -> None:
+        """
+        Cancels a scheduled callback.
+        """
+        handle[2] = None
+
+    def run(self, until: Optional[float] = None) -> int:
+        """
+        Runs callbacks in time order until none are left or `until` is reached.
+
+        Returns
+        -------
+        int
+            The number of callbacks run.
+        """
+        count = 0
+        heap = self._heap
+        while heap:
+            when, _, callback = heap[0]
+            if until is not None and when > until:
+                break
+            heapq.heappop(heap)
+            if callback is None:
+                continue
+            if when > self.clock.now:
+                self.clock.now = when
+            callback()
+            count += 1
+        if until is not None and until > self.clock.now:
+            self.clock.now = until
+        return count
+
+
+class SelectScheduler:
+    """
+    Schedules callbacks for a loop that waits on file descriptors, such as
+    the terminal Interface or the engine process of timer_process.
+
+    The loop waits at most `timeout()` seconds and then calls `run_due()`.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._heap: List[list] = []
+        self._sequence = 0
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> list:
+        self._sequence += 1
+        entry = [self.clock() + delay, self._sequence, callback]
+        heapq.heappush(self._heap, entry)
+        return entry
+
+    def cancel(self, handle: list) -> None:
+        handle[2] = None
+
+    def timeout(self) -> Optional[float]:
+        """
+        Returns the seconds until the next callback is due, or None if there is none.
+        """
+        heap = self._heap
+        while heap and heap[0][2] is None:
+            heapq.heappop(heap)
+        if not heap:
+            return None
+        return max(0.0, heap[0][0] - self.clock())
+
+    def run_due(self) -> None:
+        """
+        Runs every callback that is due.
+        """
+        heap = self._heap
+        now = self.clock()
+        while heap and heap[0][0] <= now:
+            _, _, callback = heapq.heappop(heap)
+            if callback is not None:
+                callback()
@@ -0,0 +1,225 @@
+"""
+Training history: one fixed-size record per finished session.
+
+A SessionRecorder listens to a WorkoutSession and keeps a handful of running
+totals as events arrive, so finishing a session appends one summary record
+and nothing ever has to replay the event stream. The record is written by a
+background thread, away from the event that finished the session. workout_analytics reads
+the records as NumPy columns for the weekly and monthly reports.
+"""
+import atexit
+import logging
+import queue
+import struct
+import threading
+import time
+from typing import Callable, List, NamedTuple, Optional, Set
+
+from workout_defaults import HISTORY_PATH as DEFAULT_PATH
+from workout_engine import Event
+from workout_program import WORK
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'WTH1'
+RECORD = struct.Struct('<dIddIII')
+
+
+class SessionSummary(NamedTuple):
+    """
+    One record of the history.
+
+    `planned` is the number of intervals of the program, `achieved` the
+    number that ran to their end or were ended by finish_stage() and
+    `skipped` the number left with next() and never gone back to.
+    Times are in seconds; `start` is a Unix time.
+    """
+    start: float
+    athlete: int
+    work_time: float
+    pause_time: float
+    planned: int
+    achieved: int
+    skipped: int
+
+
+def read_history(path: str) -> List[SessionSummary]:
+    """
+    Returns the complete records of a history file.
+    """
+    try:
+        with open(path, 'rb') as file:
+            data = file.read()
+    except FileNotFoundError:
+        return []
+    if not data.startswith(MAGIC):
+        return []
+    return [SessionSummary(*RECORD.unpack_from(data, offset))
+            for offset in range(len(MAGIC), len(data) - RECORD.size + 1, RECORD.size)]
+
+
+def append_history(path: str, summary: SessionSummary) -> None:
+    """
+    Appends a record to a history file, creating it if needed.
+    """
+    with open(path, 'ab') as file:
+        if file.tell() == 0:
+            file.write(MAGIC)
+        file.write(RECORD.pack(*summary))
+
+
+class SessionRecorder:
+    """
+    Summarizes every session a WorkoutSession runs into the history file.
+
+    A session starts with the first 'start' event and ends with 'stop' or
+    'complete'. Work time is measured on the session timeline, so a late
+    tick or a skipped interval is not counted as work. Going back before a
+    skipped interval, with back() or an undo, no longer counts it as skipped.
+
+    Attributes
+    ----------
+    path : str
+        the history file
+    athlete : int
+        athlete the sessions are recorded for
+    sessions_written : int
+        number of records appended
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, athlete: int = 0,
+                 wall_clock: Callable[[], float] = time.time):
+        self.path = path
+        self.athlete = athlete
+        self.wall_clock = wall_clock
+        self.sessions_written = 0
+        self.session = None
+        self._start: Optional[float] = None
+        self._skipped: Set[int] = set()
+        self._summaries: 'queue.Queue[Optional[SessionSummary]]' = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def attach(self, session) -> None:
+        """
+        Records the sessions of `session` from now on.
+        """
+        self.session = session
+        session.add_listener(self.record)
+        self._thread = threading.Thread(target=self._run, name='SessionRecorder', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, event: Event) -> None:
+        """
+        Updates the running totals with an event of the session.
+        """
+        session = self.session
+        if self._start is None:
+            if event.kind == 'start':
+                self._begin(event)
+            return
+        if self._running:
+            # Where the session got to by running since the last event
+            reached = self._elapsed + (event.time - self._time)
+            self._advance(self._elapsed, min(reached, session.timeline.total))
+        else:
+            reached = self._elapsed
+            if self._paused is not None and event.kind in ('start', 'stop'):
+                self.pause_time += event.time - self._paused
+                self._paused = None
+        elapsed = session.elapsed(event.time)
+        timeline = session.timeline
+        if event.kind in ('next', 'stage', 'complete') and elapsed > reached:
+            jumped = range(timeline.index_at(reached), timeline.index_at(elapsed))
+            # A stage ended early by finish_stage() was achieved, not skipped
+            if event.kind == 'stage':
+                self.achieved += len(jumped)
+            else:
+                self._skipped.update(jumped)
+        elif elapsed < reached:
+            index = timeline.index_at(elapsed)
+            self._skipped = {skipped for skipped in self._skipped if skipped < index}
+        if event.kind == 'pause':
+            self._paused = event.time
+        if event.kind in ('stop', 'complete'):
+            self._finish()
+            return
+        self._running = session.running
+        self._time = event.time
+        self._elapsed = elapsed
+
+    @property
+    def skipped(self) -> int:
+        """
+        Number of intervals of the session in progress skipped so far.
+        """
+        return len(self._skipped)
+
+    def flush(self) -> None:
+        """
+        Waits until every finished session is written.
+        """
+        if self._thread is not None:
+            self._summaries.join()
+
+    def close(self) -> None:
+        """
+        Records the session in progress, if any, as if it was stopped now,
+        and stops the background writer once every record is written.
+        """
+        if self._start is not None:
+            self.record(Event(self.session.clock(), 'stop', self.session.current_stage,
+                              self.session.repetitions, 0))
+        if self._thread is not None:
+            self._summaries.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _begin(self, event: Event) -> None:
+        self._start = self.wall_clock()
+        self._running = True
+        self._time = event.time
+        self._elapsed = self.session.elapsed(event.time)
+        self._paused: Optional[float] = None
+        self.planned = len(self.session.timeline)
+        self.work_time = self.pause_time = 0.0
+        self.achieved = 0
+        self._skipped: Set[int] = set()
+
+    def _advance(self, start: float, end: float) -> None:
+        """
+        Adds the work done and the intervals finished between two points of the timeline.
+        """
+        timeline = self.session.timeline
+        offsets = timeline.offsets
+        index = timeline.index_at(start)
+        while index < len(timeline) and offsets[index] < end:
+            if timeline.kinds[index] == WORK:
+                self.work_time += min(offsets[index + 1], end) - max(offsets[index], start)
+            if start < offsets[index + 1] <= end:
+                self.achieved += 1
+                self._skipped.discard(index)
+            index += 1
+
+    def _finish(self) -> None:
+        summary = SessionSummary(self._start, self.athlete, self.work_time, self.pause_time,
+                                 self.planned, self.achieved, self.skipped)
+        self._start = None
+        if self._thread is not None:
+            self._summaries.put(summary)
+        else:
+            append_history(self.path, summary)
+            self.sessions_written += 1
+
+    def _run(self) -> None:
+        while True:
+            summary = self._summaries.get()
+            try:
+                if summary is None:
+                    return
+                append_history(self.path, summary)
+                self.sessions_written += 1
+            except OSError:
+                logger.exception('could not write a session to %s', self.path)
+            finally:
+                self._summaries.task_done()
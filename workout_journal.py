@@ -0,0 +1,217 @@
+"""
+Crash-safe, append-only journal of a workout session.
+
+Every control action and stage transition is appended as a fixed-size binary
+record holding the wall-clock time, the position in the session timeline and
+whether the timer was running. Records are buffered in memory by the event
+listener and written with a single coalesced write and fsync by a background
+thread, so the tick path never touches the disk. After a crash the last
+complete record is enough to resume the session at its exact position.
+Each record also carries a checksum of the kinds and durations of the
+intervals, so a session is only resumed into the very program it was
+recorded from. Closing the journal after a clean exit records a 'stop', so
+the next run starts afresh.
+"""
+import atexit
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import List, NamedTuple, Optional
+
+from workout_defaults import JOURNAL_PATH as DEFAULT_PATH
+from workout_engine import Event
+
+MAGIC = b'WTJ2'
+RECORD = struct.Struct('<dBIdBIdI')
+
+KINDS = ('attach', 'start', 'pause', 'stop', 'next', 'back', 'stage', 'complete')
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+
+class JournalRecord(NamedTuple):
+    """
+    One entry of the journal.
+    """
+    wall_time: float
+    kind: str
+    stage_index: int
+    elapsed: float
+    running: bool
+    intervals: int
+    total: float
+    fingerprint: int
+
+
+def timeline_fingerprint(timeline) -> int:
+    """
+    Returns a checksum of the kinds and durations of the intervals of a timeline.
+    """
+    return zlib.crc32(timeline.durations, zlib.crc32(timeline.kinds))
+
+
+def read_journal(path: str) -> List[JournalRecord]:
+    """
+    Returns the complete records of a journal file.
+    A record cut short by a crash is ignored.
+    """
+    try:
+        with open(path, 'rb') as file:
+            data = file.read()
+    except FileNotFoundError:
+        return []
+    if not data.startswith(MAGIC):
+        return []
+    records = []
+    for offset in range(len(MAGIC), len(data) - RECORD.size + 1, RECORD.size):
+        wall_time, code, stage_index, elapsed, running, intervals, total, fingerprint = \
+            RECORD.unpack_from(data, offset)
+        if code >= len(KINDS):
+            break
+        records.append(JournalRecord(wall_time, KINDS[code], stage_index, elapsed, bool(running),
+                                     intervals, total, fingerprint))
+    return records
+
+
+class SessionJournal:
+    """
+    Records a WorkoutSession to a journal file and resumes it after a restart.
+
+    Attributes
+    ----------
+    path : str
+        the journal file
+    flush_interval : float
+        seconds between background writes
+    records_written : int
+        number of records flushed to disk
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.5):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.records_written = 0
+        self.session = None
+        self._pending = bytearray()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._file = None
+        self._thread = None
+        # Timelines are never changed once compiled, so the checksum of the last one is kept
+        self._timeline = None
+        self._fingerprint = 0
+
+    def recover(self) -> Optional[JournalRecord]:
+        """
+        Returns the last record of the journal, or None if there is nothing to resume.
+        """
+        records = read_journal(self.path)
+        if not records or records[-1].kind in ('stop', 'complete'):
+            return None
+        return records[-1]
+
+    def attach(self, session) -> Optional[JournalRecord]:
+        """
+        Resumes `session` from the journal if it holds the same program, then
+        starts a fresh journal for it and records every following event.
+
+        Returns
+        -------
+        Optional[JournalRecord]
+            The record the session was resumed from, if any.
+        """
+        last = self.recover()
+        self.session = session
+        if last is not None and last.fingerprint == self.fingerprint():
+            elapsed = last.elapsed
+            if last.running:
+                elapsed += max(0.0, time.time() - last.wall_time)
+            session.restore(elapsed)
+        else:
+            last = None
+        # The journal is compacted to one record describing where the session is now
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(MAGIC + self.encode('attach'))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.path)
+        self._file = open(self.path, 'ab')
+        session.add_listener(self.record)
+        self._thread = threading.Thread(target=self._run, name='SessionJournal', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        return last
+
+    def fingerprint(self) -> int:
+        """
+        Returns the checksum of the intervals of the session timeline.
+        """
+        timeline = self.session.timeline
+        if timeline is not self._timeline:
+            self._timeline = timeline
+            self._fingerprint = timeline_fingerprint(timeline)
+        return self._fingerprint
+
+    def encode(self, kind: str, now: Optional[float] = None) -> bytes:
+        """
+        Encodes the current state of the session as one record.
+        """
+        session = self.session
+        timeline = session.timeline
+        return RECORD.pack(time.time(), KIND_CODES[kind], session.stage_index, session.elapsed(now),
+                           session.running, len(timeline), timeline.total, self.fingerprint())
+
+    def record(self, event: Event) -> None:
+        """
+        Buffers a record for every event that changes the session state.
+        """
+        if event.kind not in KIND_CODES:
+            return
+        data = self.encode(event.kind, event.time)
+        with self._lock:
+            self._pending += data
+        if event.kind in ('stop', 'complete'):
+            self._wake.set()
+
+    def flush(self) -> None:
+        """
+        Writes the buffered records and waits for them to reach the disk.
+        """
+        with self._lock:
+            data, self._pending = bytes(self._pending), bytearray()
+        if data and self._file is not None:
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.records_written += len(data) // RECORD.size
+
+    def close(self, stopped: bool = False) -> None:
+        """
+        Flushes the remaining records and stops the background writer.
+
+        Parameters
+        ----------
+        stopped : bool, optional
+            Record a 'stop' first, so the session is not resumed on the next
+            run, as when the window is closed normally (default is False).
+        """
+        if self._closed or self._file is None:
+            return
+        if stopped:
+            data = self.encode('stop')
+            with self._lock:
+                self._pending += data
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        self._file.close()
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
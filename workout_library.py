@@ -0,0 +1,256 @@
+"""
+A local library of workout programs in SQLite, searchable while typing.
+
+Every program is compiled once when it is stored. Its total duration,
+work/rest ratio, tag and interval count are kept in indexed columns, so a
+search never compiles a program again.
+
+Both indexes are sorted by name and cover every filtered column. A search
+walks one of them in result order, tests the filters on the index entries
+and stops after `limit` matches, so it never sorts and only reads the table
+rows it returns. A range index on, say, the total duration would be faster
+for a rare range but has to sort every match, which is slower for the
+common ones; the name order bounds the worst case at one index scan.
+"""
+import argparse
+import json
+import os
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from workout_config import WorkoutConfig, build_config
+from workout_defaults import LIBRARY_PATH as DEFAULT_PATH
+from workout_program import WORK, REST
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS programs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    total REAL NOT NULL,
+    ratio REAL,
+    intervals INTEGER NOT NULL,
+    program TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS programs_name ON programs (name_key, tag, total, ratio, intervals);
+CREATE INDEX IF NOT EXISTS programs_tag ON programs (tag, name_key, total, ratio, intervals);
+'''
+
+# Sorts after every character, so name_key < prefix + PREFIX_END matches the prefix
+PREFIX_END = '\U0010ffff'
+
+
+class ProgramSummary(NamedTuple):
+    """
+    The precomputed columns of a stored program.
+
+    `ratio` is total work over total rest, or None without rest.
+    """
+    id: int
+    name: str
+    tag: str
+    total: float
+    ratio: Optional[float]
+    intervals: int
+
+
+def name_key(name: str) -> str:
+    """
+    Returns the form of a name that searches compare, ignoring case and surrounding spaces.
+    """
+    return name.strip().casefold()
+
+
+def summarize(config: WorkoutConfig) -> Tuple[float, Optional[float], int]:
+    """
+    Returns the total duration, work/rest ratio and interval count of a configuration.
+    """
+    timeline = config.timeline
+    work = rest = 0.0
+    for kind, duration in zip(timeline.kinds, timeline.durations):
+        if kind == WORK:
+            work += duration
+        elif kind == REST:
+            rest += duration
+    return timeline.total, work / rest if rest else None, len(timeline)
+
+
+class ProgramLibrary:
+    """
+    Workout programs stored in an SQLite database with precomputed, indexed summaries.
+
+    A program is anything workout_config accepts: a workout_program program
+    or the classic work, rest and repetitions.
+
+    Attributes
+    ----------
+    path : str
+        the database file, or ':memory:'
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        # sqlite3 takes about 25 ms to import, so only an opened library pays for it
+        import sqlite3
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(SCHEMA)
+
+    def __len__(self) -> int:
+        return self._connection.execute('SELECT COUNT(*) FROM programs').fetchone()[0]
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def _row(self, name: str, program: Dict[str, Any], tag: str) -> tuple:
+        try:
+            total, ratio, intervals = summarize(build_config(program))
+        except ValueError as error:
+            raise ValueError(f'{name}: {error}') from None
+        return (name, name_key(name), tag.strip(), total, ratio, intervals,
+                json.dumps(program, separators=(',', ':')))
+
+    def add(self, name: str, program: Dict[str, Any], tag: str = '') -> int:
+        """
+        Validates and stores a program, returning its id.
+
+        Raises
+        ------
+        ValueError
+            If the program is not valid.
+        """
+        with self._connection:
+            cursor = self._connection.execute(
+                'INSERT INTO programs (name, name_key, tag, total, ratio, intervals, program) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', self._row(name, program, tag))
+        return cursor.lastrowid
+
+    def add_many(self, programs: Iterable[Tuple[str, Dict[str, Any], str]]) -> int:
+        """
+        Stores (name, program, tag) triples in one transaction, returning how many were stored.
+
+        Raises
+        ------
+        ValueError
+            If a program is not valid; none of them is stored then.
+        """
+        rows = [self._row(name, program, tag) for name, program, tag in programs]
+        with self._connection:
+            self._connection.executemany(
+                'INSERT INTO programs (name, name_key, tag, total, ratio, intervals, program) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        return len(rows)
+
+    def remove(self, program_id: int) -> None:
+        with self._connection:
+            self._connection.execute('DELETE FROM programs WHERE id = ?', (program_id,))
+
+    def program(self, program_id: int) -> Dict[str, Any]:
+        """
+        Returns a stored program as it was added.
+
+        Raises
+        ------
+        KeyError
+            If there is no program with that id.
+        """
+        row = self._connection.execute('SELECT program FROM programs WHERE id = ?',
+                                       (program_id,)).fetchone()
+        if row is None:
+            raise KeyError(program_id)
+        return json.loads(row[0])
+
+    def config(self, program_id: int) -> WorkoutConfig:
+        """
+        Returns the compiled configuration of a stored program.
+        """
+        return build_config(self.program(program_id))
+
+    def tags(self) -> List[str]:
+        """
+        Returns every tag in use, sorted.
+        """
+        return [tag for tag, in self._connection.execute(
+            "SELECT DISTINCT tag FROM programs WHERE tag != '' ORDER BY tag")]
+
+    def search(self, prefix: str = '', tag: Optional[str] = None,
+               min_total: Optional[float] = None, max_total: Optional[float] = None,
+               min_ratio: Optional[float] = None, max_ratio: Optional[float] = None,
+               min_intervals: Optional[int] = None, max_intervals: Optional[int] = None,
+               limit: int = 100) -> List[ProgramSummary]:
+        """
+        Returns up to `limit` programs matching every given filter, sorted by name.
+
+        Parameters
+        ----------
+        prefix : str, optional
+            start of the name, ignoring case (default is every name)
+        tag : Optional[str], optional
+            exact tag
+        min_total, max_total : Optional[float], optional
+            bounds of the total duration in seconds, inclusive
+        min_ratio, max_ratio : Optional[float], optional
+            bounds of the work/rest ratio, inclusive; programs without rest never match
+        min_intervals, max_intervals : Optional[int], optional
+            bounds of the interval count, inclusive
+        limit : int, optional
+            maximum number of results (default is 100)
+        """
+        clauses = []
+        parameters: List[Any] = []
+        key = name_key(prefix)
+        if key:
+            # A range on the index, unlike LIKE, which SQLite would scan
+            clauses.append('name_key >= ? AND name_key < ?')
+            parameters += [key, key + PREFIX_END]
+        if tag is not None:
+            clauses.append('tag = ?')
+            parameters.append(tag)
+        for column, low, high in (('total', min_total, max_total),
+                                  ('ratio', min_ratio, max_ratio),
+                                  ('intervals', min_intervals, max_intervals)):
+            if low is not None:
+                clauses.append(f'{column} >= ?')
+                parameters.append(low)
+            if high is not None:
+                clauses.append(f'{column} <= ?')
+                parameters.append(high)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._connection.execute(
+            f'SELECT id, name, tag, total, ratio, intervals FROM programs {where} '
+            f'ORDER BY name_key LIMIT ?', parameters + [limit])
+        return [ProgramSummary(*row) for row in rows]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Workout program library')
+    parser.add_argument('--library', metavar='PATH', default=DEFAULT_PATH,
+                        help='library database')
+    commands = parser.add_subparsers(dest='command', required=True)
+    add_parser = commands.add_parser('add', help='store JSON or TOML workout files')
+    add_parser.add_argument('paths', nargs='+', metavar='PATH')
+    add_parser.add_argument('--tag', default='', help='tag of the stored programs')
+    search_parser = commands.add_parser('search', help='list programs by name prefix')
+    search_parser.add_argument('prefix', nargs='?', default='')
+    search_parser.add_argument('--tag', help='only programs with this tag')
+    args = parser.parse_args()
+
+    from workout_config import parse_config
+    library = ProgramLibrary(args.library)
+    if args.command == 'add':
+        programs = []
+        for path in args.paths:
+            try:
+                with open(path, 'rb') as file:
+                    programs.append((os.path.splitext(os.path.basename(path))[0],
+                                     parse_config(path, file.read()), args.tag))
+            except (OSError, ValueError) as error:
+                parser.error(str(error))
+        try:
+            print(f'{library.add_many(programs)} programs added')
+        except ValueError as error:
+            parser.error(str(error))
+    else:
+        for program in library.search(args.prefix, args.tag):
+            print(f'{program.id:>6}  {program.name:<32} {program.total / 60:6.1f} min  '
+                  f'{program.intervals:>4} intervals  {program.tag}')
+    library.close()
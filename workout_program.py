@@ -0,0 +1,190 @@
+"""
+Workout programs and the compiled interval timeline they run on.
+
+A program is a plain dict, as loaded from JSON:
+
+    {
+        "warmup": 300,
+        "blocks": [
+            {"name": "Main", "rounds": 8, "work": 480, "rest": 120},
+            {"name": "Pyramid", "work": [30, 45, 60, 45, 30], "rest": 15},
+            {"name": "Ladder", "ladder": {"start": 20, "stop": 60, "step": 10}, "rest": 20}
+        ],
+        "cooldown": 300
+    }
+
+Durations are in seconds. `work` and `rest` are either one duration for every
+round or a list with one duration per round. A `ladder` generates the work
+durations from `start` to `stop` inclusive in steps of `step`.
+"""
+from array import array
+from bisect import bisect_right
+from typing import Any, Dict, List, NamedTuple, Sequence, Union
+
+KINDS = ('warmup', 'work', 'rest', 'cooldown')
+WARMUP, WORK, REST, COOLDOWN = range(len(KINDS))
+
+
+class Interval(NamedTuple):
+    """
+    One interval of a compiled timeline.
+    """
+    index: int
+    kind: str
+    block: str
+    start: float
+    duration: float
+
+
+class Timeline:
+    """
+    A program compiled into flat arrays with cumulative offsets.
+
+    Every lookup is a bisect over `offsets`, so seeking costs O(log n) no
+    matter how many intervals the program has.
+
+    Attributes
+    ----------
+    durations : array
+        duration of each interval in seconds
+    offsets : array
+        start of each interval from the start of the session, followed by the total length
+    kinds : array
+        index into KINDS of each interval
+    blocks : array
+        index into `block_names` of each interval
+    block_names : List[str]
+        name of each block
+    block_ends : array
+        end of each block from the start of the session
+    """
+
+    def __init__(self):
+        self.durations = array('d')
+        self.offsets = array('d', [0.0])
+        self.kinds = array('B')
+        self.blocks = array('H')
+        self.block_names: List[str] = []
+        self.block_ends = array('d')
+
+    def __len__(self) -> int:
+        return len(self.durations)
+
+    @property
+    def total(self) -> float:
+        """
+        Length of the whole session in seconds.
+        """
+        return self.offsets[-1]
+
+    def begin_block(self, name: str) -> None:
+        """
+        Starts a new block; the following intervals belong to it.
+        """
+        self.block_names.append(name)
+        self.block_ends.append(self.offsets[-1])
+
+    def add(self, kind: int, duration: float) -> None:
+        """
+        Appends an interval to the current block.
+        """
+        if duration < 0:
+            raise ValueError(f'interval duration must not be negative, got {duration}')
+        if not self.block_names:
+            self.begin_block('')
+        self.durations.append(duration)
+        self.offsets.append(self.offsets[-1] + duration)
+        self.kinds.append(kind)
+        self.blocks.append(len(self.block_names) - 1)
+        self.block_ends[-1] = self.offsets[-1]
+
+    def index_at(self, elapsed: float) -> int:
+        """
+        Returns the index of the interval running `elapsed` seconds into the
+        session, or len(self) once the session is over.
+        """
+        return min(bisect_right(self.offsets, elapsed) - 1, len(self))
+
+    def interval(self, index: int) -> Interval:
+        """
+        Returns the interval with the given index.
+        """
+        return Interval(index, KINDS[self.kinds[index]], self.block_names[self.blocks[index]],
+                        self.offsets[index], self.durations[index])
+
+    def time_until_block_end(self, elapsed: float) -> float:
+        """
+        Returns the seconds left in the block running `elapsed` seconds into the session.
+        """
+        index = self.index_at(elapsed)
+        if index >= len(self):
+            return 0.0
+        return self.block_ends[self.blocks[index]] - elapsed
+
+    @classmethod
+    def alternating(cls, work_duration: float, rest_duration: float, repetitions: int) -> 'Timeline':
+        """
+        Builds the classic timeline: `repetitions` stages alternating work and rest.
+        """
+        timeline = cls()
+        for index in range(repetitions):
+            if index % 2 == 0:
+                timeline.add(WORK, work_duration)
+            else:
+                timeline.add(REST, rest_duration)
+        return timeline
+
+
+def _per_round(value: Union[float, Sequence[float]], rounds: int, field: str) -> List[float]:
+    """
+    Expands a duration or a list of per-round durations to one entry per round.
+    """
+    if isinstance(value, (int, float)):
+        return [value] * rounds
+    values = list(value)
+    if len(values) != rounds:
+        raise ValueError(f'{field} has {len(values)} durations but the block has {rounds} rounds')
+    return values
+
+
+def compile_program(program: Dict[str, Any]) -> Timeline:
+    """
+    Compiles a program dict into a Timeline.
+
+    Raises
+    ------
+    ValueError
+        If the program is malformed.
+    """
+    timeline = Timeline()
+    if program.get('warmup'):
+        timeline.begin_block('Warm-up')
+        timeline.add(WARMUP, program['warmup'])
+    for number, block in enumerate(program.get('blocks', []), 1):
+        name = block.get('name', f'Block {number}')
+        if 'ladder' in block:
+            ladder = block['ladder']
+            step = ladder.get('step', 1)
+            if not step:
+                raise ValueError(f'{name}: ladder step must not be zero')
+            work = list(range(ladder['start'], ladder['stop'] + (1 if step > 0 else -1), step))
+        else:
+            work = block.get('work')
+            if work is None:
+                raise ValueError(f'{name}: a block needs "work" or "ladder"')
+        rest = block.get('rest', 0)
+        rounds = block.get('rounds')
+        if rounds is None:
+            lists = [value for value in (work, rest) if not isinstance(value, (int, float))]
+            rounds = len(lists[0]) if lists else 1
+        work = _per_round(work, rounds, f'{name}: work')
+        rest = _per_round(rest, rounds, f'{name}: rest')
+        timeline.begin_block(name)
+        for work_duration, rest_duration in zip(work, rest):
+            timeline.add(WORK, work_duration)
+            if rest_duration:
+                timeline.add(REST, rest_duration)
+    if program.get('cooldown'):
+        timeline.begin_block('Cooldown')
+        timeline.add(COOLDOWN, program['cooldown'])
+    return timeline
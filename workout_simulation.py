@@ -0,0 +1,86 @@
+"""
+Runs workout sessions headless on a virtual clock, faster than real time.
+
+    python workout_simulation.py --sessions 1000 --print 5
+"""
+import argparse
+import random
+import time
+from typing import Callable, List, Optional
+
+from workout_engine import Event, VirtualClock, VirtualScheduler, WorkoutSession
+
+
+def simulate(work_duration: int, rest_duration: int, repetitions: int, sessions: int = 1,
+             lateness: Optional[Callable[[], float]] = None,
+             tick_every_second: bool = False) -> List[List[Event]]:
+    """
+    Runs complete sessions side by side on one virtual scheduler.
+
+    Parameters
+    ----------
+    work_duration : int
+        Duration of work in seconds.
+    rest_duration : int
+        Duration of rest in seconds.
+    repetitions : int
+        Number of stages in each session.
+    sessions : int, optional
+        Number of sessions to run (default is 1).
+    lateness : Optional[Callable[[], float]], optional
+        Extra delay in seconds added to every wake-up (default is None).
+    tick_every_second : bool, optional
+        Wake up on every displayed second, like a GUI does (default is False).
+
+    Returns
+    -------
+    List[List[Event]]
+        The event stream of each session.
+    """
+    clock = VirtualClock()
+    scheduler = VirtualScheduler(clock, lateness)
+    streams = []
+    for _ in range(sessions):
+        session = WorkoutSession(work_duration, rest_duration, repetitions, scheduler, clock,
+                                 tick_every_second=tick_every_second)
+        events: List[Event] = []
+        session.add_listener(events.append)
+        session.start()
+        streams.append(events)
+    scheduler.run()
+    return streams
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--work', type=int, default=480, help='work duration in seconds')
+    parser.add_argument('--rest', type=int, default=120, help='rest duration in seconds')
+    parser.add_argument('--repetitions', type=int, default=16, help='number of stages')
+    parser.add_argument('--sessions', type=int, default=1000, help='sessions to simulate')
+    parser.add_argument('--lateness', type=float, default=0.0,
+                        help='maximum random delay in seconds added to every wake-up')
+    parser.add_argument('--every-second', action='store_true',
+                        help='wake up on every displayed second like the GUIs')
+    parser.add_argument('--print', type=int, default=0, metavar='N',
+                        help='print the first N events of the first session')
+    args = parser.parse_args()
+
+    lateness = (lambda: random.uniform(0, args.lateness)) if args.lateness else None
+    started = time.perf_counter()
+    streams = simulate(args.work, args.rest, args.repetitions, args.sessions, lateness,
+                       args.every_second)
+    elapsed = time.perf_counter() - started
+
+    for event in streams[0][:args.print]:
+        print(f'{event.time:10.3f} {event.kind:<8} {event.stage} '
+              f'repetitions={event.repetitions} remaining={event.remaining}')
+    events = sum(len(stream) for stream in streams)
+    end = streams[0][-1].time
+    planned = (args.repetitions + 1) // 2 * args.work + args.repetitions // 2 * args.rest
+    print(f'{args.sessions} sessions, {events} events in {elapsed:.3f} s '
+          f'({events / elapsed:,.0f} events/s)')
+    print(f'first session ended at {end:.3f} s, planned {planned} s, drift {end - planned:+.3f} s')
+
+
+if __name__ == '__main__':
+    main()
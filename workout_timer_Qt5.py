@@ -1,101 +1,271 @@
+import argparse
+import math
 import sys
-from typing import Any
+from typing import TYPE_CHECKING, Any, Callable, List, Optional
 
-import winsound
-from PyQt5.QtCore import QTimer, QTime, Qt
+from PyQt5.QtCore import QRectF, QSize, QSocketNotifier, QTimer, QTime, Qt
+from PyQt5.QtGui import QKeySequence, QPainter, QPaintEvent, QPalette
 from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QHBoxLayout, QProgressBar, \
-    QLineEdit, QTabWidget, QFormLayout
+    QLineEdit, QTabWidget, QFormLayout, QSizePolicy, QShortcut, QComboBox, QListWidget
+
+from audio_cues import CuePlayer
+from instrumentation import Instruments
+from workout_defaults import CLOCK_PORT, HISTORY_PATH, JOURNAL_PATH, LIBRARY_PATH, REMOTE_PORT, VOICE_PATH
+from workout_engine import EVERYTHING, PROGRESS, REPETITIONS, REST_STAGE, STAGE, STAGE_NAMES, TIME, WORK_STAGE, \
+    Event, Snapshot, WorkoutSession
+from workout_undo import UndoHistory
+
+if TYPE_CHECKING:
+    # Optional features are imported where a command-line flag turns them on
+    from remote_control import RemoteControl
+    from voice_cues import VoicePack
+    from workout_config import WorkoutConfig
+
+# Stage -> (label text, value of the `stage` property selected in the stylesheet);
+# stages without an entry are shown like rest
+STAGE_PALETTES = {
+    STAGE_NAMES['warmup']: ('Warm-up', 'warmup'),
+    WORK_STAGE: ('Work', 'work'),
+    REST_STAGE: ('Rest', 'rest'),
+    STAGE_NAMES['cooldown']: ('Cooldown', 'cooldown'),
+}
+
+# Steps of the progress bar, so the final countdown fills it smoothly
+PROGRESS_STEPS = 1000
+
+STYLESHEET = """
+    QWidget {
+        background-color: #2F3136;
+        color: #FFFFFF;
+        font-size: 18px;
+    }
+    QPushButton {
+        background-color: #2F4F4F;
+        border: none;
+        border-radius: 4px;
+        padding: 10px;
+        min-width: 100px;
+        font-size: 20px;
+        font-weight: bold;
+    }
+    QPushButton:hover {
+        background-color: #677BC4;
+    }
+    QPushButton:pressed {
+        background-color: #2F4F4F;
+    }
+    QLineEdit {
+        background-color: #3f3f3f;
+        border: none;
+        border-radius: 4px;
+        padding: 5px;
+        color: #FFFFFF;
+    }
+    QProgressBar {
+        border: 2px solid grey;
+        border-radius: 5px;
+        text-align: center;
+    }
+    QProgressBar::chunk {
+        background-color: #05B8CC;
+        width: 20px;
+        margin: 0.5px;
+    }
+    QLabel {
+        font-size: 22px;
+        font-weight: bold;
+    }
+    QLabel#overlay {
+        font-family: monospace;
+        font-size: 12px;
+        font-weight: normal;
+    }
+    QLabel[stage="warmup"] {
+        color: orange;
+    }
+    QLabel[stage="work"] {
+        color: #00FF00;
+    }
+    QLabel[stage="rest"] {
+        color: yellow;
+    }
+    QLabel[stage="cooldown"] {
+        color: #00BFFF;
+    }
+    QProgressBar[stage="warmup"]::chunk {
+        background-color: orange;
+    }
+    QProgressBar[stage="work"]::chunk {
+        background-color: #00FF00;
+    }
+    QProgressBar[stage="rest"]::chunk {
+        background-color: yellow;
+    }
+    QProgressBar[stage="cooldown"]::chunk {
+        background-color: #00BFFF;
+    }
+    QTabBar::tab:selected {
+        background: #2F4F4F;
+        border: 2px solid #FFFFFF;
+        border-radius: 4px;
+        box-shadow: 0 0 10px #FFFFFF;
+        min-width: 150px;
+    }
+    QTabBar::tab:!selected {
+        background: #696969;
+        border: 2px solid #FFFFFF;
+        border-radius: 4px;
+        box-shadow: 0 0 10px #FFFFFF;
+        min-width: 150px;
+    }
+"""
+
+
+class QtScheduler:
+    """
+    Schedules callbacks on a single-shot QTimer.
+    It holds at most one pending callback, which is all a WorkoutSession needs.
+    """
+
+    def __init__(self) -> None:
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.fire)
+        self.callback = None
 
+    def call_later(self, delay: float, callback: Callable[[], None]) -> QTimer:
+        self.callback = callback
+        self.timer.start(math.ceil(delay * 1000))
+        return self.timer
 
-class WorkoutTimer:
+    def cancel(self, handle: QTimer) -> None:
+        self.timer.stop()
+        self.callback = None
+
+    def fire(self) -> None:
+        callback, self.callback = self.callback, None
+        if callback is not None:
+            callback()
+
+
+class WorkoutTimer(WorkoutSession):
     """
     The WorkoutTimer class is a timer for interval training.
     It allows you to set the duration of work, rest and number of repetitions.
     """
 
     def __init__(self, work_duration: int, rest_duration: int, repetitions: int):
-        self.work_duration = work_duration * 60
-        self.rest_duration = rest_duration * 60
-        self.initial_repetitions = repetitions
-        self.repetitions = repetitions
-        self.current_stage = 'Work ==>'
-        self.current_time = self.work_duration
-        self.running = False
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.countdown)
+        scheduler = QtScheduler()
+        super().__init__(work_duration * 60, rest_duration * 60, repetitions, scheduler, cue_seconds=4,
+                         fine_seconds=5)
 
-    def start(self):
-        """
-        Starts the timer.
-        """
-        if not self.running:
-            self.running = True
-            self.timer.start(1000)
 
-    def countdown(self):
-        """
-        Counts down the current time.
-        """
-        if self.running and self.current_time > 0 and self.repetitions > 0:
-            self.current_time -= 1
-        elif self.running and self.repetitions > 0:
-            self.switch_stage()
-            self.repetitions -= 1
+class Follower:
+    """
+    Wakes the Qt event loop for a timer running outside this process, a
+    RemoteTimer or an IsolatedTimer, like WorkoutTimer does: when the timer
+    signals a change and on every step of the interpolated countdown.
+    """
 
-    def switch_stage(self):
+    def __init__(self, timer: Any) -> None:
+        self.timer = timer
+        self.qtimer = QTimer()
+        self.qtimer.setSingleShot(True)
+        self.qtimer.setTimerType(Qt.PreciseTimer)
+        self.qtimer.timeout.connect(self.schedule)
+        self.notifier = QSocketNotifier(timer.fileno(), QSocketNotifier.Read)
+        self.notifier.activated.connect(self.read_messages)
+
+    def read_messages(self) -> None:
         """
-        Switches between the 'Work ==>' and 'Rest ==>' stages.
+        Applies the received changes and redraws right away.
         """
-        if self.current_stage == 'Work ==>':
-            self.current_stage = 'Rest ==>'
-            self.current_time = self.rest_duration
-        else:
-            self.current_stage = 'Work ==>'
-            self.current_time = self.work_duration
+        if self.timer.receive():
+            self.qtimer.start(0)
 
-    def stop(self):
+    def schedule(self) -> None:
         """
-        Stops the timer and resets the current stage, current time, and repetitions.
+        Publishes the interpolated state and arms the timer for the next step
+        of the countdown.
         """
-        self.running = False
-        self.current_stage = 'Work ==>'
-        self.current_time = self.work_duration
-        self.repetitions = self.initial_repetitions
+        self.timer.feed.publish()
+        if self.timer.running:
+            self.qtimer.start(math.ceil(self.timer.next_tick_delay() * 1000))
 
-    def pause(self):
-        """
-        Pauses or resumes the timer.
-        """
-        if self.running:
-            self.timer.stop()
-        else:
-            self.timer.start(1000)
-        self.running = not self.running
 
-    def next(self):
-        """
-        Skips to the next stage or repetition.
-        """
-        if self.running and self.repetitions > 0:
-            self.switch_stage()
-            self.repetitions -= 1
+class RepetitionIndicator(QWidget):
+    """
+    Draws one dot per remaining repetition in a single paint pass.
+    The widget is only repainted when the count changes and its size hint
+    does not depend on the count, so the layout is never invalidated.
+    """
+
+    DOT_PITCH = 24
+
+    def __init__(self, count: int = 0, parent: QWidget = None) -> None:
+        super().__init__(parent)
+        self._count = count
+        self.setMinimumHeight(self.DOT_PITCH)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+
+    def count(self) -> int:
+        return self._count
 
-    def back(self):
+    def setCount(self, count: int) -> None:
         """
-        Goes back to the previous stage or repetition.
+        Sets the number of dots, repainting only if it changed.
         """
-        if self.running and self.repetitions < self.initial_repetitions:
-            self.repetitions += 1
-            self.switch_stage()
+        if count != self._count:
+            self._count = count
+            self.update()
+
+    def sizeHint(self) -> QSize:
+        return QSize(self.DOT_PITCH * 8, self.DOT_PITCH)
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        if self._count <= 0:
+            return
+        # Dots shrink to fit when there are more than the width can hold
+        pitch = min(float(self.DOT_PITCH), self.width() / self._count)
+        diameter = max(1.0, pitch / 2)
+        top = (self.height() - diameter) / 2
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(self.palette().color(QPalette.WindowText))
+        for i in range(self._count):
+            painter.drawEllipse(QRectF(i * pitch + (pitch - diameter) / 2, top, diameter, diameter))
+
+
+# Rows shown in the library picker; a search never fetches more
+LIBRARY_ROWS = 100
 
 
 class Interface(QWidget):
-    def __init__(self, timer: Any) -> None:
+    def __init__(self, timer: Any, library_path: Optional[str] = None,
+                 voice: Optional['VoicePack'] = None) -> None:
         super().__init__()
 
         # Timer object
         self.timer = timer
 
+        # Latency histograms for ticks, renders and audio cues
+        self.instruments = Instruments()
+        self.timer.instruments = self.instruments
+
+        # Audio cues are played from a background thread, spoken if there is a voice pack
+        self.cues = CuePlayer(store=voice)
+        self.cues.instruments = self.instruments
+        self.voice = None
+        if voice is not None:
+            from voice_cues import VoiceAnnouncer
+            self.voice = VoiceAnnouncer(timer, self.cues)
+        self.timer.add_listener(self.play_cue)
+
+        # Control actions of a local session can be undone and redone
+        self.history = UndoHistory(timer) if isinstance(timer, WorkoutSession) else None
+
         # Create tabs
         self.tab_widget = QTabWidget()
 
@@ -103,9 +273,20 @@ class Interface(QWidget):
         self.tab1 = QWidget()
         self.tab_widget.addTab(self.tab1, "Timer")
 
-        # Create second tab
+        # Create second tab, filled in the first time it is shown
         self.tab2 = QWidget()
         self.tab_widget.addTab(self.tab2, "Settings")
+        self.settings_form = None
+        self.tab_widget.currentChanged.connect(self.build_settings)
+
+        # Create the program library tab, opened the first time it is shown
+        self.library_path = library_path
+        self.library = None
+        self.library_ids: List[int] = []
+        if library_path is not None:
+            self.tab3 = QWidget()
+            self.tab_widget.addTab(self.tab3, "Library")
+            self.tab_widget.currentChanged.connect(self.build_library)
 
         # Create vertical layout for widgets
         layout1 = QVBoxLayout(self.tab1)
@@ -120,17 +301,15 @@ class Interface(QWidget):
 
         # Create progress bar to visualize elapsed time
         self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximum(PROGRESS_STEPS)
         layout1.addWidget(self.progress_bar)
 
         # Create labels to display number of repetitions
         repetitions_label = QLabel('Repetitions:')
-        self.repetitions_layout = QHBoxLayout()
-        for _ in range(self.timer.initial_repetitions):
-            dot_label = QLabel('•')
-            self.repetitions_layout.addWidget(dot_label)
+        self.repetitions_indicator = RepetitionIndicator(self.timer.initial_repetitions)
         repetitions_layout = QHBoxLayout()
         repetitions_layout.addWidget(repetitions_label)
-        repetitions_layout.addLayout(self.repetitions_layout)
+        repetitions_layout.addWidget(self.repetitions_indicator, 1)
         layout1.addLayout(repetitions_layout)
 
         # Create buttons for Start and Pause
@@ -156,184 +335,423 @@ class Interface(QWidget):
         button_layout.addWidget(next_button)
         layout1.addLayout(button_layout)
 
-        # Create form for input values on second tab
-        layout2 = QFormLayout(self.tab2)
-        self.work_duration_input = QLineEdit(str(self.timer.work_duration // 60))
-        self.rest_duration_input = QLineEdit(str(self.timer.rest_duration // 60))
-        self.repetitions_input = QLineEdit(str(self.timer.initial_repetitions))
-        layout2.addRow('Work Duration (minutes):', self.work_duration_input)
-        layout2.addRow('Rest Duration (minutes):', self.rest_duration_input)
-        layout2.addRow('Repetitions:', self.repetitions_input)
-        apply_button = QPushButton('Apply')
-        apply_button.clicked.connect(self.apply_settings)
-        layout2.addRow(apply_button)
+        # Create debug overlay with the latency histograms, toggled with F12
+        self.overlay_label = QLabel()
+        self.overlay_label.setObjectName('overlay')
+        self.overlay_label.hide()
+        layout1.addWidget(self.overlay_label)
+        QShortcut(QKeySequence('F12'), self, self.toggle_overlay)
+        QShortcut(QKeySequence.Undo, self, self.undo)
+        QShortcut(QKeySequence.Redo, self, self.redo)
 
         # Set main layout of the window
         self.setLayout(QVBoxLayout())
         self.layout().addWidget(self.tab_widget)
 
-        # Update label every second
-        self.timer.timer.timeout.connect(self.update_time_label)
-        self.timer.timer.timeout.connect(self.update_state_label)
-        self.timer.timer.timeout.connect(self.update_repetitions_label)
-        self.timer.timer.timeout.connect(self.update_progress_bar)
-
-        # Set styles
-        self.setStyleSheet("""
-                   QWidget {
-                       background-color: #2F3136;
-                       color: #FFFFFF;
-                       font-size: 18px;
-                   }
-                   QPushButton {
-                       background-color: #2F4F4F;
-                       border: none;
-                       border-radius: 4px;
-                       padding: 10px;
-                       min-width: 100px;
-                       font-size: 20px;
-                       font-weight: bold;
-                   }
-                   QPushButton:hover {
-                       background-color: #677BC4;
-                   }
-                   QPushButton:pressed {
-                       background-color: #2F4F4F;
-                   }
-                   QLineEdit {
-                       background-color: #3f3f3f;
-                       border: none;
-                       border-radius: 4px;
-                       padding: 5px;
-                       color: #FFFFFF;
-                   }
-                   QProgressBar {
-                       border: 2px solid grey;
-                       border-radius: 5px;
-                       text-align: center;
-                   }
-                   QProgressBar::chunk {
-                       background-color: #05B8CC;
-                       width: 20px;
-                       margin: 0.5px;
-                   }
-                   QLabel {
-                       font-size: 22px;
-                       font-weight: bold;
-                   }
-                   QTabBar::tab:selected {
-                       background: #2F4F4F;
-                       border: 2px solid #FFFFFF;
-                       border-radius: 4px;
-                       box-shadow: 0 0 10px #FFFFFF;
-                       min-width: 150px;  
-                   }
-                   QTabBar::tab:!selected {
-                       background: #696969;
-                       border: 2px solid #FFFFFF;
-                       border-radius: 4px;
-                       box-shadow: 0 0 10px #FFFFFF;
-                       min-width: 150px;  
-                   }
-               """)
+        # Styles are compiled once per application, not once per widget tree
+        application = QApplication.instance()
+        if application.styleSheet() != STYLESHEET:
+            application.setStyleSheet(STYLESHEET)
+
+        # Redraw only the widgets whose fields changed, once per state change
+        for name in ('update_time_label', 'update_state_label', 'update_repetitions_label',
+                     'update_progress_bar'):
+            setattr(self, name, self.instruments.timed(name, getattr(self, name)))
+        self.search_library = self.instruments.timed('search_library', self.search_library)
+        self.timer.subscribe(self.render)
+
+    def control(self, action: Callable, *args) -> None:
+        """
+        Runs a control action of the timer, recording it for undo if possible.
+        """
+        if self.history is not None:
+            self.history.perform(action, *args)
+        else:
+            action(*args)
 
     def start_timer(self) -> None:
-        self.timer.start()
+        self.control(self.timer.start)
 
     def stop_timer(self) -> None:
-        self.timer.stop()
+        self.control(self.timer.stop)
 
     def pause_timer(self) -> None:
-        self.timer.pause()
+        self.control(self.timer.pause)
 
     def next_stage(self) -> None:
-        self.timer.next()
+        self.control(self.timer.next)
 
     def back_stage(self) -> None:
-        self.timer.back()
+        self.control(self.timer.back)
 
-    def update_time_label(self) -> None:
+    def undo(self) -> None:
+        if self.history is not None:
+            self.history.undo()
+
+    def redo(self) -> None:
+        if self.history is not None:
+            self.history.redo()
+
+    def listen(self, remote: 'RemoteControl') -> None:
         """
-        Updates the time label.
+        Runs the commands of a RemoteControl on the Qt event loop as soon as they arrive.
         """
-        time = QTime(0, 0).addSecs(self.timer.current_time)
-        self.time_label.setText(time.toString())
+        remote.instruments = self.instruments
+        self.remote_notifier = QSocketNotifier(remote.fileno(), QSocketNotifier.Read, self)
+        self.remote_notifier.activated.connect(lambda _: remote.run_pending())
 
-        # If less than 5 seconds are left on the timer, play a sound notification
-        if self.timer.current_time < 5:
-            winsound.Beep(300, 100)
+    def refresh(self) -> None:
+        """
+        Redraws every widget from the current timer state.
+        """
+        self.render(self.timer.feed.capture()._replace(changed=EVERYTHING))
 
-    def update_state_label(self) -> None:
+    def render(self, snapshot: Snapshot) -> None:
         """
-        Updates the state label.
+        Updates the widgets showing the fields that changed in a snapshot.
         """
-        if self.timer.current_stage == 'Work ==>':
-            self.state_label.setText('Work')
-            self.state_label.setStyleSheet("color: #00FF00;")
-            self.progress_bar.setStyleSheet("QProgressBar::chunk { background-color: #00FF00; }")
+        changed = snapshot.changed
+        if changed & TIME:
+            self.update_time_label(snapshot)
+        if changed & STAGE:
+            self.update_state_label(snapshot)
+        if changed & REPETITIONS:
+            self.update_repetitions_label(snapshot)
+        if changed & PROGRESS:
+            self.update_progress_bar(snapshot)
+        self.update_overlay()
+
+    def update_time_label(self, snapshot: Snapshot) -> None:
+        """
+        Updates the time label, with tenths of a second in the final countdown.
+        """
+        if snapshot.tenths is not None:
+            time = QTime(0, 0).addMSecs(snapshot.tenths * 100)
+            self.time_label.setText(f'{time.toString()}.{snapshot.tenths % 10}')
         else:
-            self.state_label.setText('Rest')
-            self.state_label.setStyleSheet("color: yellow;")
-            self.progress_bar.setStyleSheet("QProgressBar::chunk { background-color: yellow; }")
+            self.time_label.setText(QTime(0, 0).addSecs(snapshot.time).toString())
 
-    def update_repetitions_label(self) -> None:
+    def play_cue(self, event: Event) -> None:
         """
-        Updates the repetitions labels.
+        Plays a sound notification on every second of the final countdown,
+        or hands the event to the voice announcer if there is one.
         """
-        # First, delete all current tags
-        while self.repetitions_layout.count():
-            item = self.repetitions_layout.takeAt(0)
-            widget = item.widget()
-            if widget is not None:
-                widget.deleteLater()
+        if self.voice is not None:
+            self.voice.announce(event)
+        elif event.kind == 'cue':
+            self.cues.play('countdown_low')
 
-        # Then we add labels according to the current number of repetitions
-        for _ in range(self.timer.repetitions):
-            dot_label = QLabel('•')
-            self.repetitions_layout.addWidget(dot_label)
+    def update_state_label(self, snapshot: Snapshot) -> None:
+        """
+        Updates the state label and switches both widgets to the stage palette.
+        """
+        text, palette = STAGE_PALETTES.get(snapshot.stage, STAGE_PALETTES[REST_STAGE])
+        self.state_label.setText(text)
+        for widget in (self.state_label, self.progress_bar):
+            widget.setProperty('stage', palette)
+            widget.style().unpolish(widget)
+            widget.style().polish(widget)
+
+    def update_repetitions_label(self, snapshot: Snapshot) -> None:
+        """
+        Updates the repetitions indicator.
+        """
+        self.repetitions_indicator.setCount(snapshot.repetitions)
 
-    def update_progress_bar(self) -> None:
+    def update_progress_bar(self, snapshot: Snapshot) -> None:
         """
         Updates the progress bar.
         """
-        if self.timer.current_stage == 'Work ==>':
-            self.progress_bar.setMaximum(self.timer.work_duration)
-        else:
-            self.progress_bar.setMaximum(self.timer.rest_duration)
-        self.progress_bar.setValue(self.timer.current_time)
+        self.progress_bar.setValue(round(snapshot.progress * PROGRESS_STEPS))
+
+    def toggle_overlay(self) -> None:
+        """
+        Shows or hides the debug overlay.
+        """
+        self.overlay_label.setVisible(not self.overlay_label.isVisible())
+        self.update_overlay()
+
+    def update_overlay(self) -> None:
+        """
+        Updates the debug overlay while it is visible.
+        """
+        if self.overlay_label.isVisible():
+            self.overlay_label.setText(self.instruments.format())
+
+    def build_settings(self, index: int) -> None:
+        """
+        Builds the form for input values on the second tab when it is first shown.
+        """
+        if self.settings_form is not None or self.tab_widget.widget(index) is not self.tab2:
+            return
+        from workout_config import format_duration
+        self.settings_form = QFormLayout(self.tab2)
+        self.work_duration_input = QLineEdit(format_duration(self.timer.work_duration))
+        self.rest_duration_input = QLineEdit(format_duration(self.timer.rest_duration))
+        self.repetitions_input = QLineEdit(str(self.timer.initial_repetitions))
+        self.settings_error_label = QLabel()
+        self.settings_form.addRow('Work Duration (m:ss or seconds):', self.work_duration_input)
+        self.settings_form.addRow('Rest Duration (m:ss or seconds):', self.rest_duration_input)
+        self.settings_form.addRow('Repetitions:', self.repetitions_input)
+        apply_button = QPushButton('Apply')
+        apply_button.clicked.connect(self.apply_settings)
+        self.settings_form.addRow(apply_button)
+        self.settings_form.addRow(self.settings_error_label)
 
     def apply_settings(self) -> None:
         """
-        Applies settings from the second tab.
+        Applies settings from the second tab, or shows why they cannot be applied.
         """
-        self.timer.work_duration = int(self.work_duration_input.text()) * 60
-        self.timer.rest_duration = int(self.rest_duration_input.text()) * 60
-        self.timer.initial_repetitions = int(self.repetitions_input.text())
-        self.timer.repetitions = self.timer.initial_repetitions
-        self.timer.current_time = self.timer.work_duration
-        self.timer.current_stage = 'Work ==>'
-        self.timer.stop()
-        self.update_time_label()
-        self.update_state_label()
-        self.update_repetitions_label()
-        self.update_progress_bar()
+        from workout_config import parse_duration, settings_config
+        try:
+            repetitions = self.repetitions_input.text().strip()
+            if not repetitions.isdigit():
+                raise ValueError(f'repetitions must be a whole number, got {repetitions!r}')
+            config = settings_config(parse_duration(self.work_duration_input.text()),
+                                     parse_duration(self.rest_duration_input.text()),
+                                     int(repetitions))
+        except ValueError as error:
+            self.settings_error_label.setText(str(error))
+            return
+        self.settings_error_label.clear()
+        self.control(self.timer.configure, config.work, config.rest, int(repetitions))
+
+    def build_library(self, index: int) -> None:
+        """
+        Opens the program library and builds its picker on the third tab when it is first shown.
+        """
+        if self.library is not None or self.tab_widget.widget(index) is not self.tab3:
+            return
+        from workout_library import ProgramLibrary
+        self.library = ProgramLibrary(self.library_path)
+        layout = QVBoxLayout(self.tab3)
+        self.library_search_input = QLineEdit()
+        self.library_search_input.setPlaceholderText('Search programs by name')
+        self.library_tag_input = QComboBox()
+        self.library_tag_input.addItem('All tags')
+        self.library_tag_input.addItems(self.library.tags())
+        self.library_results = QListWidget()
+        self.library_results.setUniformItemSizes(True)
+        self.library_status_label = QLabel()
+        load_button = QPushButton('Load')
+        for widget in (self.library_search_input, self.library_tag_input, self.library_results,
+                       self.library_status_label, load_button):
+            layout.addWidget(widget)
+        self.library_search_input.textChanged.connect(lambda text: self.search_library())
+        self.library_tag_input.currentIndexChanged.connect(lambda index: self.search_library())
+        self.library_results.itemActivated.connect(self.load_program)
+        load_button.clicked.connect(self.load_program)
+        self.search_library()
+
+    def search_library(self) -> None:
+        """
+        Lists the programs matching the search field and the selected tag.
+        """
+        from workout_config import format_duration
+        tag = self.library_tag_input.currentText() if self.library_tag_input.currentIndex() > 0 else None
+        results = self.library.search(self.library_search_input.text(), tag, limit=LIBRARY_ROWS + 1)
+        more = len(results) > LIBRARY_ROWS
+        del results[LIBRARY_ROWS:]
+        self.library_ids = [program.id for program in results]
+        self.library_results.setUpdatesEnabled(False)
+        self.library_results.clear()
+        self.library_results.addItems([
+            f"{program.name}  {format_duration(program.total)}  {program.intervals} intervals"
+            + (f"  {program.ratio:.2g}:1" if program.ratio is not None else '')
+            + (f"  [{program.tag}]" if program.tag else '')
+            for program in results])
+        self.library_results.setUpdatesEnabled(True)
+        self.library_status_label.setText(
+            f"First {LIBRARY_ROWS} matches, type more to narrow down" if more
+            else f"{len(results)} matching programs")
+
+    def load_program(self) -> None:
+        """
+        Loads the selected program into the timer and shows the timer.
+        """
+        row = self.library_results.currentRow()
+        if not 0 <= row < len(self.library_ids):
+            return
+        try:
+            config = self.library.config(self.library_ids[row])
+        except (KeyError, ValueError) as error:
+            self.library_status_label.setText(f"Cannot load this program: {error}")
+            return
+        self.control(self.load_workout, config)
+        self.tab_widget.setCurrentWidget(self.tab1)
+
+    def load_workout(self, config: 'WorkoutConfig') -> None:
+        """
+        Replaces the workout of the timer with a program and resets the session.
+        """
+        self.timer.work_duration = config.work
+        self.timer.rest_duration = config.rest
+        self.timer.load(config.timeline)
 
 
 if __name__ == '__main__':
-    # We create an instance of QApplication.
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description='Workout timer')
+    parser.add_argument('--broadcast', action='store_true',
+                        help='publish the timer state to displays on the local network')
+    parser.add_argument('--receive', action='store_true',
+                        help='mirror a timer broadcast on the local network')
+    parser.add_argument('--sync-with', metavar='HOST',
+                        help='with --receive, align the stage changes to the clock of the broadcasting station')
+    parser.add_argument('--stats', action='store_true',
+                        help='print tick, render and audio latency statistics on exit')
+    parser.add_argument('--stats-json', metavar='PATH',
+                        help='write tick, render and audio latency histograms to a JSON file on exit')
+    parser.add_argument('--first-frame', action='store_true',
+                        help='exit as soon as the first frame is drawn (for startup benchmarks)')
+    parser.add_argument('--journal', metavar='PATH', default=JOURNAL_PATH,
+                        help='session journal to resume from and record to (empty to disable)')
+    parser.add_argument('--history', metavar='PATH', default=HISTORY_PATH,
+                        help='file to record a summary of every session to (empty to disable)')
+    parser.add_argument('--athlete', type=int, default=0,
+                        help='athlete the sessions are recorded for in the history')
+    parser.add_argument('--isolated', action='store_true',
+                        help='run the timer in a separate process, so a busy window cannot delay it')
+    parser.add_argument('--config', metavar='PATH',
+                        help='JSON or TOML workout file, reloaded when it changes')
+    parser.add_argument('--voice', action='store_true',
+                        help='speak the stages, rounds and countdown instead of beeping')
+    parser.add_argument('--voice-pack', metavar='PATH', default=VOICE_PATH,
+                        help='file the spoken phrases are rendered into once and played from')
+    parser.add_argument('--voice-clips', metavar='DIR',
+                        help='directory of recorded phrases, such as round_5_of_8.wav, to use instead')
+    parser.add_argument('--heart-rate', metavar='SOURCE',
+                        help='end rests once the heart rate has recovered, read from udp:PORT or replayed from a file')
+    parser.add_argument('--recovery-bpm', type=float, default=110,
+                        help='heart rate a rest ends below, with --heart-rate (default is 110)')
+    parser.add_argument('--min-rest', type=float, default=10,
+                        help='seconds every rest lasts at least, with --heart-rate (default is 10)')
+    parser.add_argument('--remote', metavar='PORT', type=int, nargs='?', const=REMOTE_PORT,
+                        help=f'accept commands over HTTP, from a phone or a foot pedal (default port {REMOTE_PORT})')
+    parser.add_argument('--remote-host', metavar='HOST', default='127.0.0.1',
+                        help='address to accept commands on, 0.0.0.0 for the local network (default is 127.0.0.1)')
+    parser.add_argument('--remote-name', metavar='NAME', action='append', default=[],
+                        help='host name the remote reaches this computer by, besides its IP address; repeatable')
+    parser.add_argument('--library', metavar='PATH', default=LIBRARY_PATH,
+                        help='program library to pick workouts from (empty to disable)')
+    args, qt_args = parser.parse_known_args()
 
-    # We create an instance of WorkoutTimer.
-    timer = WorkoutTimer(8, 2, 8)
+    # We create an instance of QApplication.
+    app = QApplication(sys.argv[:1] + qt_args)
+
+    if args.remote is not None and args.receive:
+        parser.error('--remote needs the timer to be controlled from this station')
+
+    clock_sync = None
+    if args.sync_with:
+        if not args.receive:
+            parser.error('--sync-with needs --receive')
+        from clock_sync import ClockSync
+        try:
+            clock_sync = ClockSync((args.sync_with, CLOCK_PORT))
+        except OSError as error:
+            parser.error(str(error))
+
+    monitor = None
+    if (args.heart_rate or args.voice) and (args.receive or args.isolated):
+        parser.error('--heart-rate and --voice need the timer to run in this process')
+    if args.heart_rate:
+        from heart_rate import AdaptiveRest, HeartRateMonitor, open_source
+        try:
+            monitor = HeartRateMonitor(open_source(args.heart_rate))
+        except (OSError, ValueError) as error:
+            parser.error(str(error))
+
+    # We create an instance of WorkoutTimer, or mirror one running elsewhere.
+    resumed = None
+    journal = None
+    follower = None
+    if args.receive:
+        from timer_broadcast import RemoteTimer
+        timer = RemoteTimer(clock_sync=clock_sync)
+        follower = Follower(timer)
+    elif args.isolated:
+        # multiprocessing is slow to import, so only isolated runs pay for it
+        from timer_process import IsolatedTimer
+        if args.config:
+            from workout_config import load_config
+            try:
+                load_config(args.config)
+            except (OSError, ValueError) as error:
+                parser.error(str(error))
+        timer = IsolatedTimer(8 * 60, 2 * 60, 8, cue='countdown_low', cue_seconds=4, fine_seconds=5,
+                              config=args.config, journal=args.journal, history=args.history,
+                              athlete=args.athlete, broadcast=args.broadcast)
+        follower = Follower(timer)
+    else:
+        timer = WorkoutTimer(8, 2, 8)
+        if args.config:
+            from workout_config import ConfigWatcher
+            watcher = ConfigWatcher(args.config)
+            try:
+                watcher.apply(timer, watcher.poll())
+            except (OSError, ValueError) as error:
+                parser.error(str(error))
+        if args.broadcast:
+            from clock_sync import ClockServer
+            from timer_broadcast import BroadcastPublisher
+            publisher = BroadcastPublisher(timer)
+            clock_server = ClockServer(clock=timer.clock)
+        if args.history:
+            from workout_history import SessionRecorder
+            SessionRecorder(args.history, args.athlete).attach(timer)
+        # Resume the session a crashed run left behind
+        if args.journal:
+            from workout_journal import SessionJournal
+            journal = SessionJournal(args.journal)
+            resumed = journal.attach(timer)
+
+    voice = None
+    if args.voice:
+        from voice_cues import VoicePack
+        voice = VoicePack(args.voice_pack, args.voice_clips)
 
     # We create an instance of the graphical interface of your application.
-    window = Interface(timer)
+    window = Interface(timer, None if args.receive or not args.library else args.library, voice)
+    if resumed is not None and resumed.running:
+        window.start_timer()
+    if args.config and not args.receive and not args.isolated:
+        # QtScheduler holds one callback, so the watcher gets its own
+        watcher.attach(timer, QtScheduler())
+    if monitor is not None:
+        AdaptiveRest(monitor.buffer, args.recovery_bpm, args.min_rest).attach(timer, QtScheduler())
+
+    remote = None
+    if args.remote is not None:
+        from remote_control import RemoteControl, session_commands
+        try:
+            remote = RemoteControl(timer, session_commands(timer, window.control, window.history),
+                                   args.remote, args.remote_host, args.remote_name)
+        except OSError as error:
+            parser.error(f'cannot accept commands on {args.remote_host}:{args.remote}: {error}')
+        window.listen(remote)
 
     # Showing the graphical interface of your application.
     window.show()
+    if args.first_frame:
+        window.repaint()
+        QTimer.singleShot(0, app.quit)
 
     # We start the event loop (or main loop) of your application.
-    sys.exit(app.exec_())
+    status = app.exec_()
+    if remote is not None:
+        remote.close()
+    if journal is not None:
+        # The window was closed, so the next run must not resume this session
+        journal.close(stopped=True)
+    if args.isolated and not args.receive:
+        timer.close()
+    if monitor is not None:
+        monitor.close()
+    if args.stats:
+        print(window.instruments.format())
+    if args.stats_json:
+        window.instruments.export(args.stats_json)
+    sys.exit(status)
 
 '''
 self.setStyleSheet("""
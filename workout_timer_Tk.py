@@ -1,11 +1,38 @@
+import argparse
+import math
 import tkinter as tk
+from tkinter import font as tkfont
 from tkinter import ttk
-from typing import Callable
+from typing import TYPE_CHECKING, Callable, Optional
 
-import winsound
+from audio_cues import CuePlayer
+from instrumentation import Instruments
+from workout_defaults import CLOCK_PORT, HISTORY_PATH, JOURNAL_PATH, REMOTE_PORT, VOICE_PATH
+from workout_engine import EVERYTHING, REPETITIONS, STAGE, TIME, Event, Snapshot, WorkoutSession
+from workout_undo import UndoHistory
 
+if TYPE_CHECKING:
+    # Optional features are imported where a command-line flag turns them on
+    from remote_control import RemoteControl
+    from voice_cues import VoiceAnnouncer
 
-class WorkoutTimer:
+
+class TkScheduler:
+    """
+    Schedules callbacks on the Tk event loop.
+    """
+
+    def __init__(self, root: tk.Tk):
+        self.root = root
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> str:
+        return self.root.after(math.ceil(delay * 1000), callback)
+
+    def cancel(self, handle: str) -> None:
+        self.root.after_cancel(handle)
+
+
+class WorkoutTimer(WorkoutSession):
     """
     A class used to represent a Workout Timer.
 
@@ -27,112 +54,102 @@ class WorkoutTimer:
         current time left in the current stage
     running : bool
         whether the timer is currently running
+    cues : CuePlayer
+        player for the countdown beeps
+    voice : Optional[VoiceAnnouncer]
+        speaks the stages and the countdown instead of beeping, if set
 
     """
 
-    def __init__(self, work_duration: int, rest_duration: int, repetitions: int):
+    def __init__(self, work_duration: int, rest_duration: int, repetitions: int,
+                 cues: Optional[CuePlayer] = None):
         """
         Constructs all the necessary attributes for the WorkoutTimer object.
         """
-        self.work_duration = work_duration * 60
-        self.rest_duration = rest_duration * 60
-        self.initial_repetitions = repetitions
-        self.repetitions = repetitions
-        self.current_stage = 'Work ==>'
-        self.current_time = self.work_duration
-        self.running = False
+        super().__init__(work_duration * 60, rest_duration * 60, repetitions, fine_seconds=5)
+        self.cues = cues if cues is not None else CuePlayer()
+        self.voice: Optional['VoiceAnnouncer'] = None
+        self.add_listener(self.beep_if_needed)
 
-    def start(self, update_stage: Callable[[str], None], update_label: Callable[[str], None],
-              update_repetitions: Callable[[str], None], root: tk.Tk):
+    def beep_if_needed(self, event: Event):
         """
-        Starts the timer.
+        Beeps on every second of the final countdown, or hands the event to
+        the voice announcer if there is one.
         """
-        self.running = True
-        self.countdown(update_stage, update_label, update_repetitions, root)
+        if self.voice is not None:
+            self.voice.announce(event)
+        elif event.kind == 'cue':
+            self.cues.play('countdown')
 
-    def countdown(self, update_stage: Callable[[str], None], update_label: Callable[[str], None],
-                  update_repetitions: Callable[[str], None], root: tk.Tk):
-        """
-        Counts down the current time.
-        """
-        if self.running and self.current_time > 0 and self.repetitions > 0:
-            self.update_labels(update_stage, update_label, update_repetitions)
-            self.beep_if_needed()
-            self.current_time -= 1
-            root.after(1000, self.countdown, update_stage, update_label, update_repetitions, root)
-        elif self.running and self.repetitions > 0:
-            self.switch_stage()
-            self.repetitions -= 1
-            root.after(1000, self.countdown, update_stage, update_label, update_repetitions, root)
 
-    def update_labels(self, update_stage: Callable[[str], None], update_label: Callable[[str], None],
-                      update_repetitions: Callable[[str], None]):
-        """
-        Updates the stage, timer, and repetitions labels.
-        """
-        minutes, seconds = divmod(self.current_time, 60)
-        update_label(f"{minutes} : {seconds} min")
-        update_repetitions(f"{self.repetitions}")
-        update_stage(f"{self.current_stage}")
+class CanvasDisplay:
+    """
+    Draws the stage, the countdown and the repetitions as text items of one
+    Canvas instead of three labels.
 
-    def beep_if_needed(self):
-        """
-        Beeps if the current time is less than or equal to 10 seconds.
-        """
-        if self.current_time <= 5:
-            winsound.Beep(1000, 100)
+    The items are created once and their IDs kept, and an update makes one
+    itemconfigure only if its text changed, which moves no widget. All items
+    share one font, sized from its cached metrics whenever the canvas is
+    resized, so a fullscreen window on a wall-mounted display scales the
+    text without laying out the grid again.
 
-    def switch_stage(self):
-        """
-        Switches between the 'Work ==>' and 'Rest ==>' stages.
-        """
-        if self.current_stage == 'Work ==>':
-            self.current_stage = 'Rest ==>'
-            self.current_time = self.rest_duration
-        else:
-            self.current_stage = 'Work ==>'
-            self.current_time = self.work_duration
+    Attributes
+    ----------
+    canvas : tk.Canvas
+        the canvas the items are drawn on
+    font : tkinter.font.Font
+        the font of every item
+    """
 
-    def stop(self):
-        """
-        Stops the timer and resets the current stage, current time, and repetitions.
-        """
-        self.running = False
-        self.current_stage = 'Work ==>'
-        self.current_time = self.work_duration
-        self.repetitions = self.initial_repetitions
+    SIZE = 28
+    PADDING = 20
+    WIDTH = 770
+
+    def __init__(self, root: tk.Tk, row: int = 0, columns: int = 3):
+        self.font = tkfont.Font(root, family='Helvetica', size=self.SIZE, weight='bold')
+        # The height of a label row at the base size, measured once
+        self.base_height = self.font.metrics('linespace') + 2 * self.PADDING
+        self.canvas = tk.Canvas(root, width=self.WIDTH, height=self.base_height, bg='#2F4F4F',
+                                highlightthickness=0)
+        self.canvas.grid(row=row, column=0, columnspan=columns, sticky='nsew')
+        self.items = [self.canvas.create_text(0, 0, text='', fill='#FFFF00', font=self.font)
+                      for _ in range(columns)]
+        self.texts = [''] * columns
+        self.size = (0, 0)
+        self.font_size = self.SIZE
+        self.canvas.bind('<Configure>', self.resize)
 
-    def pause(self):
-        """
-        Pauses or resumes the timer.
-        """
-        self.running = not self.running
+    def update_stage(self, text: str) -> None:
+        self.set_text(0, text)
 
-    def next(self):
+    def update_label(self, text: str) -> None:
+        self.set_text(1, text)
+
+    def update_repetitions(self, text: str) -> None:
+        self.set_text(2, text)
+
+    def set_text(self, column: int, text: str) -> None:
         """
-        Skips to the next stage or repetition.
+        Shows a text in one column, if it is not already shown.
         """
-        if self.running and self.repetitions > 0:
-            if self.current_stage == 'Work ==>':
-                self.current_stage = 'Rest ==>'
-                self.current_time = self.rest_duration
-            else:
-                self.current_stage = 'Work ==>'
-                self.current_time = self.work_duration
-            self.repetitions -= 1
+        if self.texts[column] != text:
+            self.texts[column] = text
+            self.canvas.itemconfigure(self.items[column], text=text)
 
-    def back(self):
+    def resize(self, event: tk.Event) -> None:
         """
-        Goes back to the previous stage or repetition.
+        Centers the items in their columns and scales the font to the new size of the canvas.
         """
-        if self.running and self.repetitions < self.initial_repetitions:
-            self.repetitions += 1
-            if self.current_stage == 'Work ==>':
-                self.current_stage = 'Rest ==>'
-                self.current_time = self.rest_duration
-            else:
-                self.current_stage = 'Work ==>'
-                self.current_time = self.work_duration
+        width, height = event.width, event.height
+        if (width, height) == self.size:
+            return
+        self.size = (width, height)
+        for column, item in enumerate(self.items):
+            self.canvas.coords(item, (2 * column + 1) * width / (2 * len(self.items)), height / 2)
+        size = max(8, round(self.SIZE * min(width / self.WIDTH, height / self.base_height)))
+        if size != self.font_size:
+            self.font_size = size
+            self.font.configure(size=size)
 
 
 class Interface:
@@ -145,11 +162,13 @@ class Interface:
         The root window for the interface.
     timer : WorkoutTimer
         The workout timer to be controlled by the interface.
+    display : Optional[CanvasDisplay]
+        The canvas the stage, time and repetitions are drawn on, if not on labels.
     run() -> None:
         Starts the main event loop for the interface.
     """
 
-    def __init__(self, timer: 'WorkoutTimer'):
+    def __init__(self, timer: 'WorkoutTimer', canvas: bool = False):
         """
         Constructs all the necessary attributes for the Interface object.
 
@@ -157,12 +176,25 @@ class Interface:
         ----------
         timer : WorkoutTimer
             The workout timer to be controlled by the interface.
+        canvas : bool, optional
+            Whether to draw the stage, time and repetitions on one scalable
+            Canvas instead of three labels (default is False).
         """
         self.root = tk.Tk()
         self.root.geometry("770x195")
         self.root.configure(bg='#2F4F4F')
         self.timer = timer
 
+        # Latency histograms for ticks, renders and audio cues
+        self.instruments = Instruments()
+        self.timer.instruments = self.instruments
+        if hasattr(self.timer, 'cues'):
+            self.timer.cues.instruments = self.instruments
+        if isinstance(self.timer, WorkoutSession) and self.timer.scheduler is None:
+            self.timer.scheduler = TkScheduler(self.root)
+        # Control actions of a local session can be undone and redone
+        self.history = UndoHistory(self.timer) if isinstance(self.timer, WorkoutSession) else None
+
         style = ttk.Style()
         style.configure("TLabel",
                         foreground="#FFFF00",
@@ -177,14 +209,38 @@ class Interface:
         style.configure("TFrame",
                         background="#2F4F4F")
 
-        self.stage_label = self.create_label(0, 0)
-        self.timer_label = self.create_label(0, 1)
-        self.repetitions_label = self.create_label(0, 2)
+        if canvas:
+            self.display = CanvasDisplay(self.root)
+            self.update_stage = self.display.update_stage
+            self.update_label = self.display.update_label
+            self.update_repetitions = self.display.update_repetitions
+            # The canvas takes up the room a larger window gives
+            self.root.rowconfigure(0, weight=1)
+            for column in range(3):
+                self.root.columnconfigure(column, weight=1)
+        else:
+            self.display = None
+            self.stage_label = self.create_label(0, 0)
+            self.timer_label = self.create_label(0, 1)
+            self.repetitions_label = self.create_label(0, 2)
+        for name in ('update_stage', 'update_label', 'update_repetitions'):
+            setattr(self, name, self.instruments.timed(name, getattr(self, name)))
 
         self.start_button = self.create_button("Start/Pause", self.start_timer, 1, 0, 3)
-        self.back_button = self.create_button("Back", self.timer.back, 2, 0)
-        self.stop_button = self.create_button("Stop", self.timer.stop, 2, 1)
-        self.next_button = self.create_button("Next", self.timer.next, 2, 2)
+        self.back_button = self.create_button("Back", self.back_stage, 2, 0)
+        self.stop_button = self.create_button("Stop", self.stop_timer, 2, 1)
+        self.next_button = self.create_button("Next", self.next_stage, 2, 2)
+
+        # Debug overlay with the latency histograms, toggled with F12
+        self.overlay_label = tk.Label(self.root, justify='left', anchor='w', font=("Courier", 10),
+                                      fg="#FFFF00", bg="#2F4F4F")
+        self.overlay_after = None
+        self.root.bind('<F12>', lambda event: self.toggle_overlay())
+        self.root.bind('<Control-z>', lambda event: self.undo())
+        self.root.bind('<Control-y>', lambda event: self.redo())
+
+        # Redraw only the labels whose fields changed, once per state change
+        self.timer.subscribe(self.render)
 
     def create_label(self, row: int, column: int) -> ttk.Label:
         """
@@ -265,14 +321,163 @@ class Interface:
         """
         self.repetitions_label.configure(text=text)
 
+    def control(self, action: Callable[[], None]) -> None:
+        """
+        Runs a control action of the timer, recording it for undo if possible.
+        """
+        if self.history is not None:
+            self.history.perform(action)
+        else:
+            action()
+
     def start_timer(self) -> None:
         """
         Starts or pauses the timer.
         """
         if not self.timer.running:
-            self.timer.start(self.update_stage, self.update_label, self.update_repetitions, self.root)
+            self.control(self.timer.start)
+        else:
+            self.control(self.timer.pause)
+
+    def back_stage(self) -> None:
+        """
+        Goes back to the previous stage.
+        """
+        self.control(self.timer.back)
+
+    def stop_timer(self) -> None:
+        """
+        Stops the timer.
+        """
+        self.control(self.timer.stop)
+
+    def next_stage(self) -> None:
+        """
+        Skips to the next stage.
+        """
+        self.control(self.timer.next)
+
+    def undo(self) -> None:
+        """
+        Restores the timer to where it was before the last control action.
+        """
+        if self.history is not None:
+            self.history.undo()
+
+    def redo(self) -> None:
+        """
+        Repeats the last control action undone.
+        """
+        if self.history is not None:
+            self.history.redo()
+
+    def refresh(self) -> None:
+        """
+        Redraws every label now.
+        """
+        self.render(self.timer.feed.capture()._replace(changed=EVERYTHING))
+
+    def render(self, snapshot: Snapshot) -> None:
+        """
+        Updates the labels showing the fields that changed in a snapshot.
+        The final countdown is shown in tenths of a second.
+
+        Parameters
+        ----------
+        snapshot : Snapshot
+            The state published by the timer.
+        """
+        changed = snapshot.changed
+        if changed & TIME:
+            if snapshot.tenths is not None:
+                minutes, tenths = divmod(snapshot.tenths, 600)
+                self.update_label(f"{minutes} : {tenths // 10}.{tenths % 10} min")
+            else:
+                minutes, seconds = divmod(snapshot.time, 60)
+                self.update_label(f"{minutes} : {seconds} min")
+        if changed & REPETITIONS:
+            self.update_repetitions(f"{snapshot.repetitions}")
+        if changed & STAGE:
+            self.update_stage(snapshot.stage)
+
+    def toggle_overlay(self) -> None:
+        """
+        Shows or hides the debug overlay below the buttons.
+        """
+        if self.overlay_label.winfo_ismapped():
+            self.overlay_label.grid_remove()
+            self.root.after_cancel(self.overlay_after)
+            self.overlay_after = None
+            if self.display is None:
+                self.root.geometry("770x195")
         else:
-            self.timer.pause()
+            self.overlay_label.grid(row=3, column=0, columnspan=3, sticky='nsew')
+            # The canvas gives up the room of the overlay instead of growing the window
+            if self.display is None:
+                self.root.geometry("770x320")
+            self.update_overlay()
+
+    def update_overlay(self) -> None:
+        """
+        Redraws the debug overlay once a second while it is shown.
+        """
+        self.overlay_label.configure(text=self.instruments.format())
+        self.overlay_after = self.root.after(1000, self.update_overlay)
+
+    def mirror(self) -> None:
+        """
+        Displays a RemoteTimer instead of controlling a WorkoutTimer.
+
+        The buttons are disabled and the labels follow the remote timer.
+        """
+        for button in (self.start_button, self.back_button, self.stop_button, self.next_button):
+            button.state(['disabled'])
+        self.follow()
+
+    def follow(self) -> None:
+        """
+        Displays a timer running outside this process, a RemoteTimer or an IsolatedTimer.
+
+        The labels are redrawn whenever the timer signals a change and on
+        every step of the locally interpolated countdown.
+        """
+        self.mirror_after = None
+        self.mirror_poll = None
+        try:
+            self.root.tk.createfilehandler(self.timer, tk.READABLE, lambda *_: self.mirror_tick())
+        except (AttributeError, tk.TclError):
+            # Tk on Windows has no file handlers, so the timer is polled instead
+            self.mirror_poll = 0.05
+        self.mirror_tick()
+
+    def mirror_tick(self) -> None:
+        """
+        Applies pending messages, redraws the labels and schedules the next redraw.
+        """
+        if self.mirror_after is not None:
+            self.root.after_cancel(self.mirror_after)
+            self.mirror_after = None
+        self.timer.receive()
+        self.timer.feed.publish()
+        delays = [self.mirror_poll] if self.mirror_poll else []
+        if self.timer.running:
+            delays.append(self.timer.next_tick_delay())
+        if delays:
+            self.mirror_after = self.root.after(math.ceil(min(delays) * 1000), self.mirror_tick)
+
+    def listen(self, remote: 'RemoteControl') -> None:
+        """
+        Runs the commands of a RemoteControl on the Tk event loop as soon as they arrive.
+        """
+        remote.instruments = self.instruments
+        try:
+            self.root.tk.createfilehandler(remote, tk.READABLE, lambda *_: remote.run_pending())
+        except (AttributeError, tk.TclError):
+            # Tk on Windows has no file handlers, so the queue is polled instead
+            def poll() -> None:
+                remote.run_pending()
+                self.root.after(5, poll)
+            poll()
 
     def run(self) -> None:
         """
@@ -282,10 +487,164 @@ class Interface:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Workout timer")
+    parser.add_argument('--broadcast', action='store_true',
+                        help="publish the timer state to displays on the local network")
+    parser.add_argument('--receive', action='store_true',
+                        help="mirror a timer broadcast on the local network")
+    parser.add_argument('--sync-with', metavar='HOST',
+                        help="with --receive, align the stage changes to the clock of the broadcasting station")
+    parser.add_argument('--canvas', action='store_true',
+                        help="draw the stage, time and repetitions on one canvas that scales with the window")
+    parser.add_argument('--fullscreen', action='store_true',
+                        help="with --canvas, fill the screen, for wall-mounted displays")
+    parser.add_argument('--remote', metavar='PORT', type=int, nargs='?', const=REMOTE_PORT,
+                        help=f"accept commands over HTTP, from a phone or a foot pedal (default port {REMOTE_PORT})")
+    parser.add_argument('--remote-host', metavar='HOST', default='127.0.0.1',
+                        help="address to accept commands on, 0.0.0.0 for the local network (default is 127.0.0.1)")
+    parser.add_argument('--remote-name', metavar='NAME', action='append', default=[],
+                        help="host name the remote reaches this computer by, besides its IP address; repeatable")
+    parser.add_argument('--stats', action='store_true',
+                        help="print tick, render and audio latency statistics on exit")
+    parser.add_argument('--stats-json', metavar='PATH',
+                        help="write tick, render and audio latency histograms to a JSON file on exit")
+    parser.add_argument('--first-frame', action='store_true',
+                        help="exit as soon as the first frame is drawn (for startup benchmarks)")
+    parser.add_argument('--journal', metavar='PATH', default=JOURNAL_PATH,
+                        help="session journal to resume from and record to (empty to disable)")
+    parser.add_argument('--history', metavar='PATH', default=HISTORY_PATH,
+                        help="file to record a summary of every session to (empty to disable)")
+    parser.add_argument('--athlete', type=int, default=0,
+                        help="athlete the sessions are recorded for in the history")
+    parser.add_argument('--isolated', action='store_true',
+                        help="run the timer in a separate process, so a busy window cannot delay it")
+    parser.add_argument('--config', metavar='PATH',
+                        help="JSON or TOML workout file, reloaded when it changes")
+    parser.add_argument('--voice', action='store_true',
+                        help="speak the stages, rounds and countdown instead of beeping")
+    parser.add_argument('--voice-pack', metavar='PATH', default=VOICE_PATH,
+                        help="file the spoken phrases are rendered into once and played from")
+    parser.add_argument('--voice-clips', metavar='DIR',
+                        help="directory of recorded phrases, such as round_5_of_8.wav, to use instead")
+    parser.add_argument('--heart-rate', metavar='SOURCE',
+                        help="end rests once the heart rate has recovered, read from udp:PORT or replayed from a file")
+    parser.add_argument('--recovery-bpm', type=float, default=110,
+                        help="heart rate a rest ends below, with --heart-rate (default is 110)")
+    parser.add_argument('--min-rest', type=float, default=10,
+                        help="seconds every rest lasts at least, with --heart-rate (default is 10)")
+    args = parser.parse_args()
+
+    # Minutes, used without --config
     WORK = 8
     REST = 2
     NUMBER_OF_REPEATS = 8
 
-    timer = WorkoutTimer(WORK, REST, NUMBER_OF_REPEATS)
-    interface = Interface(timer)
+    if args.fullscreen and not args.canvas:
+        parser.error('--fullscreen needs --canvas')
+
+    if args.remote is not None and args.receive:
+        parser.error('--remote needs the timer to be controlled from this station')
+
+    clock_sync = None
+    if args.sync_with:
+        if not args.receive:
+            parser.error('--sync-with needs --receive')
+        from clock_sync import ClockSync
+        try:
+            clock_sync = ClockSync((args.sync_with, CLOCK_PORT))
+        except OSError as error:
+            parser.error(str(error))
+
+    monitor = None
+    if (args.heart_rate or args.voice) and (args.receive or args.isolated):
+        parser.error('--heart-rate and --voice need the timer to run in this process')
+    if args.heart_rate:
+        from heart_rate import AdaptiveRest, HeartRateMonitor, open_source
+        try:
+            monitor = HeartRateMonitor(open_source(args.heart_rate))
+        except (OSError, ValueError) as error:
+            parser.error(str(error))
+
+    journal = None
+    if args.receive:
+        from timer_broadcast import RemoteTimer
+        interface = Interface(RemoteTimer(clock_sync=clock_sync), canvas=args.canvas)
+        interface.mirror()
+    elif args.isolated:
+        # multiprocessing is slow to import, so only isolated runs pay for it
+        from timer_process import IsolatedTimer
+        if args.config:
+            from workout_config import load_config
+            try:
+                load_config(args.config)
+            except (OSError, ValueError) as error:
+                parser.error(str(error))
+        interface = Interface(IsolatedTimer(WORK * 60, REST * 60, NUMBER_OF_REPEATS, cue='countdown',
+                                            fine_seconds=5, config=args.config, journal=args.journal,
+                                            history=args.history, athlete=args.athlete,
+                                            broadcast=args.broadcast), canvas=args.canvas)
+        interface.follow()
+    else:
+        cues = None
+        if args.voice:
+            from voice_cues import VoiceAnnouncer, VoicePack
+            cues = CuePlayer(store=VoicePack(args.voice_pack, args.voice_clips))
+        timer = WorkoutTimer(WORK, REST, NUMBER_OF_REPEATS, cues=cues)
+        if args.voice:
+            timer.voice = VoiceAnnouncer(timer, timer.cues)
+        if args.config:
+            from workout_config import ConfigWatcher
+            watcher = ConfigWatcher(args.config)
+            try:
+                watcher.apply(timer, watcher.poll())
+            except (OSError, ValueError) as error:
+                parser.error(str(error))
+        if args.broadcast:
+            from clock_sync import ClockServer
+            from timer_broadcast import BroadcastPublisher
+            publisher = BroadcastPublisher(timer)
+            clock_server = ClockServer(clock=timer.clock)
+        if args.history:
+            from workout_history import SessionRecorder
+            SessionRecorder(args.history, args.athlete).attach(timer)
+        resumed = None
+        if args.journal:
+            from workout_journal import SessionJournal
+            journal = SessionJournal(args.journal)
+            resumed = journal.attach(timer)
+        interface = Interface(timer, canvas=args.canvas)
+        if args.config:
+            watcher.attach(timer)
+        if monitor is not None:
+            AdaptiveRest(monitor.buffer, args.recovery_bpm, args.min_rest).attach(timer)
+        if resumed is not None and resumed.running:
+            interface.start_timer()
+    remote = None
+    if args.remote is not None:
+        from remote_control import RemoteControl, session_commands
+        try:
+            remote = RemoteControl(interface.timer, session_commands(interface.timer, interface.control,
+                                                                     interface.history),
+                                   args.remote, args.remote_host, args.remote_name)
+        except OSError as error:
+            parser.error(f'cannot accept commands on {args.remote_host}:{args.remote}: {error}')
+        interface.listen(remote)
+    if args.fullscreen:
+        interface.root.attributes('-fullscreen', True)
+    if args.first_frame:
+        interface.root.after_idle(lambda: interface.root.after(1, interface.root.destroy))
     interface.run()
+    if remote is not None:
+        remote.close()
+    if journal is not None:
+        # The window was closed, so the next run must not resume this session
+        journal.close(stopped=True)
+    if args.isolated and not args.receive:
+        interface.timer.close()
+    if monitor is not None:
+        monitor.close()
+
+    if args.stats:
+        print(interface.instruments.format())
+    if args.stats_json:
+        interface.instruments.export(args.stats_json)
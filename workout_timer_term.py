@@ -0,0 +1,500 @@
+"""
+Terminal frontend for the workout timer, for stations without a desktop.
+
+The screen is drawn into an off-screen cell buffer and only the cells that
+changed since the previous frame are written, with one cursor move per run of
+changed cells, so a tick costs a few dozen bytes over SSH or a serial line.
+
+Keys: space starts or pauses, b (or left) goes back, s stops, n (or right)
+skips to the next stage, q quits.
+"""
+import argparse
+import json
+import os
+import selectors
+import shutil
+import sys
+import time
+from typing import TYPE_CHECKING, BinaryIO, Callable, List, Optional, Tuple
+
+from audio_cues import CuePlayer
+from instrumentation import Instruments
+from workout_defaults import CLOCK_PORT, HISTORY_PATH, JOURNAL_PATH, VOICE_PATH
+from workout_engine import EVERYTHING, PROGRESS, REPETITIONS, STAGE, TIME, Event, SelectScheduler, Snapshot, \
+    WorkoutSession
+
+if TYPE_CHECKING:
+    # Optional features are imported where a command-line flag turns them on
+    from voice_cues import VoiceAnnouncer
+
+ESCAPE = '\x1b['
+RESET = ESCAPE + '0m'
+
+# Stage kind -> SGR parameters of the stage line
+STAGE_STYLES = {
+    'warmup': ESCAPE + '1;36m',
+    'work': ESCAPE + '1;32m',
+    'rest': ESCAPE + '1;33m',
+    'cooldown': ESCAPE + '1;36m',
+}
+TIME_STYLE = ESCAPE + '1m'
+HELP_STYLE = ESCAPE + '2m'
+
+# Key sequence -> Interface method
+KEYS = {
+    ' ': 'start_timer',
+    'b': 'back_stage',
+    ESCAPE + 'D': 'back_stage',
+    's': 'stop_timer',
+    'n': 'next_stage',
+    ESCAPE + 'C': 'next_stage',
+    'q': 'quit',
+}
+HELP = '[space] start/pause  [b] back  [s] stop  [n] next  [q] quit'
+
+WIDTH = 64
+HEIGHT = 9
+
+
+class Screen:
+    """
+    An off-screen grid of character cells written to a terminal as differences.
+
+    Attributes
+    ----------
+    width : int
+        number of columns
+    height : int
+        number of rows
+    stream : BinaryIO
+        the terminal the frames are written to
+    bytes_written : int
+        bytes written to the stream so far
+    frames : int
+        number of frames flushed so far
+    """
+
+    def __init__(self, stream: BinaryIO, width: int = WIDTH, height: int = HEIGHT):
+        self.stream = stream
+        self.bytes_written = 0
+        self.frames = 0
+        self.resize(width, height)
+
+    def resize(self, width: int, height: int) -> None:
+        """
+        Changes the size of the grid; the next flush redraws every cell.
+        """
+        self.width = width
+        self.height = height
+        self.chars = [' '] * (width * height)
+        self.styles = [''] * (width * height)
+        self._shown_chars: List[Optional[str]] = [None] * (width * height)
+        self._shown_styles: List[Optional[str]] = [None] * (width * height)
+        self._clear = True
+
+    def put(self, row: int, column: int, text: str, style: str = '') -> None:
+        """
+        Writes text into the off-screen grid, clipped to the row.
+        """
+        if not 0 <= row < self.height:
+            return
+        text = text[:max(0, self.width - column)]
+        start = row * self.width + column
+        self.chars[start:start + len(text)] = text
+        self.styles[start:start + len(text)] = [style] * len(text)
+
+    def center(self, row: int, text: str, style: str = '') -> None:
+        self.put(row, max(0, (self.width - len(text)) // 2), text, style)
+
+    def render(self) -> str:
+        """
+        Returns the escape sequences turning the shown frame into the off-screen one.
+        """
+        chars, styles = self.chars, self.styles
+        shown_chars, shown_styles = self._shown_chars, self._shown_styles
+        width = self.width
+        out = [ESCAPE + '2J'] if self._clear else []
+        self._clear = False
+        cursor = None
+        style = ''
+        for i, char in enumerate(chars):
+            if char == shown_chars[i] and styles[i] == shown_styles[i]:
+                continue
+            if cursor != i:
+                gap = i - cursor if cursor is not None else 0
+                if 0 < gap <= 4 and cursor // width == i // width \
+                        and all(s == style for s in styles[cursor:i]):
+                    # Rewriting a few unchanged cells is shorter than moving the cursor
+                    out.append(''.join(chars[cursor:i]))
+                else:
+                    row, column = divmod(i, width)
+                    out.append(f'{ESCAPE}{row + 1};{column + 1}H')
+            if styles[i] != style:
+                style = styles[i]
+                out.append(RESET + style)
+            out.append(char)
+            shown_chars[i] = char
+            shown_styles[i] = style
+            # The cursor position after the last column depends on the terminal
+            cursor = i + 1 if (i + 1) % width else None
+        if style:
+            out.append(RESET)
+        return ''.join(out)
+
+    def flush(self) -> int:
+        """
+        Writes the changed cells and returns the number of bytes written.
+        """
+        data = self.render().encode()
+        if data:
+            self.stream.write(data)
+            self.stream.flush()
+            self.bytes_written += len(data)
+        self.frames += 1
+        return len(data)
+
+
+class WorkoutTimer(WorkoutSession):
+    """
+    A WorkoutSession driven by the select loop of the terminal Interface.
+
+    Attributes
+    ----------
+    cues : CuePlayer
+        player for the countdown beeps
+    voice : Optional[VoiceAnnouncer]
+        speaks the stages and the countdown instead of beeping, if set
+    """
+
+    def __init__(self, work_duration: int, rest_duration: int, repetitions: int,
+                 cues: Optional[CuePlayer] = None, scheduler: Optional[SelectScheduler] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Constructs all the necessary attributes for the WorkoutTimer object.
+
+        Parameters
+        ----------
+        work_duration : int
+            Duration of work in minutes.
+        rest_duration : int
+            Duration of rest in minutes.
+        repetitions : int
+            Number of stages.
+        """
+        super().__init__(work_duration * 60, rest_duration * 60, repetitions,
+                         scheduler if scheduler is not None else SelectScheduler(clock), clock,
+                         fine_seconds=5)
+        self.cues = cues if cues is not None else CuePlayer()
+        self.voice: Optional['VoiceAnnouncer'] = None
+        self.add_listener(self.beep_if_needed)
+
+    def beep_if_needed(self, event: Event) -> None:
+        """
+        Beeps on every second of the final countdown, or hands the event to
+        the voice announcer if there is one.
+        """
+        if self.voice is not None:
+            self.voice.announce(event)
+        elif event.kind == 'cue':
+            self.cues.play('countdown')
+
+
+class Interface:
+    """
+    A full-screen terminal user interface for a workout timer.
+
+    Attributes
+    ----------
+    timer : WorkoutTimer
+        the timer controlled by the interface, or a RemoteTimer it mirrors
+    screen : Screen
+        the cell buffer the interface draws into
+    instruments : Instruments
+        latency histograms for ticks, frames and audio cues
+    """
+
+    def __init__(self, timer, stream: Optional[BinaryIO] = None, size: Optional[Tuple[int, int]] = None):
+        """
+        Constructs all the necessary attributes for the Interface object.
+
+        Parameters
+        ----------
+        timer : WorkoutTimer
+            The workout timer to be controlled by the interface.
+        stream : BinaryIO, optional
+            Where frames are written (default is standard output).
+        size : Tuple[int, int], optional
+            Columns and rows to draw (default is the terminal size, capped at WIDTH by HEIGHT).
+        """
+        self.timer = timer
+        self.stream = stream if stream is not None else sys.stdout.buffer
+        self.fixed_size = size
+        self.screen = Screen(self.stream, *(size or self.terminal_size()))
+        self.running = True
+        self.started = time.monotonic()
+
+        # Latency histograms for ticks, frames and audio cues
+        self.instruments = Instruments()
+        self.timer.instruments = self.instruments
+        if hasattr(self.timer, 'cues'):
+            self.timer.cues.instruments = self.instruments
+        self.render = self.instruments.timed('render', self.render)
+
+        # Redraw only the rows whose fields changed, once per state change
+        self.timer.subscribe(self.render)
+
+    @staticmethod
+    def terminal_size() -> Tuple[int, int]:
+        columns, rows = shutil.get_terminal_size((WIDTH, HEIGHT))
+        return min(columns, WIDTH), min(rows, HEIGHT)
+
+    def draw(self) -> None:
+        """
+        Redraws every row from the current timer state.
+        """
+        self.render(self.timer.feed.capture()._replace(changed=EVERYTHING))
+
+    def render(self, snapshot: Snapshot) -> None:
+        """
+        Draws the rows of the fields that changed in a snapshot into the cell
+        buffer and writes the changed cells.
+        """
+        screen = self.screen
+        changed = snapshot.changed
+        if self.fixed_size is None:
+            size = self.terminal_size()
+            if size != (screen.width, screen.height):
+                screen.resize(*size)
+                changed = EVERYTHING
+        if changed & STAGE:
+            screen.put(0, 0, ' ' * screen.width)
+            screen.center(0, snapshot.stage, STAGE_STYLES.get(snapshot.kind, ''))
+        if changed & TIME:
+            screen.put(2, 0, ' ' * screen.width)
+            if snapshot.tenths is not None:
+                # The final countdown is shown in tenths of a second
+                minutes, tenths = divmod(snapshot.tenths, 600)
+                screen.center(2, f'{minutes:02d}:{tenths // 10:02d}.{tenths % 10}', TIME_STYLE)
+            else:
+                minutes, seconds = divmod(snapshot.time, 60)
+                screen.center(2, f'{minutes:02d}:{seconds:02d}', TIME_STYLE)
+        if changed & PROGRESS:
+            bar = screen.width - 2
+            filled = round(bar * snapshot.progress)
+            screen.put(4, 0, '[' + '#' * filled + '-' * (bar - filled) + ']')
+        if changed & REPETITIONS:
+            screen.put(6, 0, f'Repetitions: {snapshot.repetitions}'.ljust(screen.width))
+        if changed == EVERYTHING:
+            screen.put(8, 0, HELP, HELP_STYLE)
+        screen.flush()
+
+    def start_timer(self) -> None:
+        """
+        Starts or pauses the timer.
+        """
+        if not self.timer.running:
+            self.timer.start()
+        else:
+            self.timer.pause()
+
+    def back_stage(self) -> None:
+        self.timer.back()
+
+    def stop_timer(self) -> None:
+        self.timer.stop()
+
+    def next_stage(self) -> None:
+        self.timer.next()
+
+    def quit(self) -> None:
+        self.running = False
+
+    def handle_keys(self, data: str) -> None:
+        """
+        Runs the command bound to every key in `data`.
+        """
+        while data:
+            if data.startswith(ESCAPE):
+                key, data = data[:3], data[3:]
+            else:
+                key, data = data[0].lower(), data[1:]
+            command = KEYS.get(key)
+            if command is not None:
+                getattr(self, command)()
+
+    @property
+    def bytes_per_second(self) -> float:
+        """
+        Average bytes written to the terminal per second since the interface started.
+        """
+        elapsed = time.monotonic() - self.started
+        return self.screen.bytes_written / elapsed if elapsed > 0 else 0.0
+
+    def run(self, first_frame: bool = False) -> None:
+        """
+        Runs the select loop until q is pressed, redrawing on ticks and keys.
+        """
+        stdin = sys.stdin.fileno()
+        terminal = None
+        if os.isatty(stdin):
+            import termios
+            import tty
+            terminal = termios.tcgetattr(stdin)
+            tty.setcbreak(stdin)
+        self.stream.write((ESCAPE + '?25l').encode())
+        selector = selectors.DefaultSelector()
+        try:
+            selector.register(stdin, selectors.EVENT_READ, 'keys')
+        except (OSError, ValueError):
+            # Regular files and /dev/null cannot be polled; run without keys
+            pass
+        # Anything but a local session is a RemoteTimer mirroring one
+        mirror = not isinstance(self.timer, WorkoutSession)
+        if mirror:
+            selector.register(self.timer.socket, selectors.EVENT_READ, 'messages')
+        try:
+            self.draw()
+            while self.running and not first_frame:
+                if mirror:
+                    timeout = self.timer.next_tick_delay() if self.timer.running else None
+                else:
+                    timeout = self.timer.scheduler.timeout()
+                for key, _ in selector.select(timeout):
+                    if key.data == 'keys':
+                        data = os.read(stdin, 64)
+                        if not data:
+                            selector.unregister(stdin)
+                            continue
+                        self.handle_keys(data.decode(errors='ignore'))
+                    else:
+                        self.timer.receive()
+                if mirror:
+                    self.timer.feed.publish()
+                else:
+                    self.timer.scheduler.run_due()
+        finally:
+            selector.close()
+            self.stream.write(f'{RESET}{ESCAPE}{self.screen.height};1H\n{ESCAPE}?25h'.encode())
+            self.stream.flush()
+            if terminal is not None:
+                termios.tcsetattr(stdin, termios.TCSADRAIN, terminal)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Workout timer for the terminal')
+    parser.add_argument('--broadcast', action='store_true',
+                        help='publish the timer state to displays on the local network')
+    parser.add_argument('--receive', action='store_true',
+                        help='mirror a timer broadcast on the local network')
+    parser.add_argument('--sync-with', metavar='HOST',
+                        help='with --receive, align the stage changes to the clock of the broadcasting station')
+    parser.add_argument('--stats', action='store_true',
+                        help='print bytes written per second and latency statistics on exit')
+    parser.add_argument('--stats-json', metavar='PATH',
+                        help='write tick, frame and audio latency histograms to a JSON file on exit')
+    parser.add_argument('--first-frame', action='store_true',
+                        help='exit as soon as the first frame is drawn (for startup benchmarks)')
+    parser.add_argument('--journal', metavar='PATH', default=JOURNAL_PATH,
+                        help='session journal to resume from and record to (empty to disable)')
+    parser.add_argument('--history', metavar='PATH', default=HISTORY_PATH,
+                        help='file to record a summary of every session to (empty to disable)')
+    parser.add_argument('--athlete', type=int, default=0,
+                        help='athlete the sessions are recorded for in the history')
+    parser.add_argument('--config', metavar='PATH',
+                        help='JSON or TOML workout file, reloaded when it changes')
+    parser.add_argument('--voice', action='store_true',
+                        help='speak the stages, rounds and countdown instead of beeping')
+    parser.add_argument('--voice-pack', metavar='PATH', default=VOICE_PATH,
+                        help='file the spoken phrases are rendered into once and played from')
+    parser.add_argument('--voice-clips', metavar='DIR',
+                        help='directory of recorded phrases, such as round_5_of_8.wav, to use instead')
+    parser.add_argument('--heart-rate', metavar='SOURCE',
+                        help='end rests once the heart rate has recovered, read from udp:PORT or replayed from a file')
+    parser.add_argument('--recovery-bpm', type=float, default=110,
+                        help='heart rate a rest ends below, with --heart-rate (default is 110)')
+    parser.add_argument('--min-rest', type=float, default=10,
+                        help='seconds every rest lasts at least, with --heart-rate (default is 10)')
+    args = parser.parse_args()
+
+    # Minutes, used without --config
+    WORK = 8
+    REST = 2
+    NUMBER_OF_REPEATS = 8
+
+    clock_sync = None
+    if args.sync_with:
+        if not args.receive:
+            parser.error('--sync-with needs --receive')
+        from clock_sync import ClockSync
+        try:
+            clock_sync = ClockSync((args.sync_with, CLOCK_PORT))
+        except OSError as error:
+            parser.error(str(error))
+
+    monitor = None
+    if (args.heart_rate or args.voice) and args.receive:
+        parser.error('--heart-rate and --voice need the timer to run in this process')
+    if args.heart_rate:
+        from heart_rate import AdaptiveRest, HeartRateMonitor, open_source
+        try:
+            monitor = HeartRateMonitor(open_source(args.heart_rate))
+        except (OSError, ValueError) as error:
+            parser.error(str(error))
+
+    resumed = None
+    journal = None
+    if args.receive:
+        from timer_broadcast import RemoteTimer
+        interface = Interface(RemoteTimer(clock_sync=clock_sync))
+    else:
+        cues = None
+        if args.voice:
+            from voice_cues import VoiceAnnouncer, VoicePack
+            cues = CuePlayer(store=VoicePack(args.voice_pack, args.voice_clips))
+        timer = WorkoutTimer(WORK, REST, NUMBER_OF_REPEATS, cues=cues)
+        if args.voice:
+            timer.voice = VoiceAnnouncer(timer, timer.cues)
+        if args.config:
+            from workout_config import ConfigWatcher
+            watcher = ConfigWatcher(args.config)
+            try:
+                watcher.apply(timer, watcher.poll())
+            except (OSError, ValueError) as error:
+                parser.error(str(error))
+        if args.broadcast:
+            from clock_sync import ClockServer
+            from timer_broadcast import BroadcastPublisher
+            publisher = BroadcastPublisher(timer)
+            clock_server = ClockServer(clock=timer.clock)
+        if args.history:
+            from workout_history import SessionRecorder
+            SessionRecorder(args.history, args.athlete).attach(timer)
+        if args.journal:
+            from workout_journal import SessionJournal
+            journal = SessionJournal(args.journal)
+            resumed = journal.attach(timer)
+        interface = Interface(timer)
+        if args.config:
+            watcher.attach(timer)
+        if monitor is not None:
+            AdaptiveRest(monitor.buffer, args.recovery_bpm, args.min_rest).attach(timer)
+        if resumed is not None and resumed.running:
+            timer.start()
+    interface.run(args.first_frame)
+    if journal is not None:
+        # The timer was quit, so the next run must not resume this session
+        journal.close(stopped=True)
+    if monitor is not None:
+        monitor.close()
+
+    if args.stats:
+        screen = interface.screen
+        print(f'{screen.bytes_written} bytes in {screen.frames} frames, '
+              f'{interface.bytes_per_second:.1f} bytes/s')
+        print(interface.instruments.format())
+    if args.stats_json:
+        data = interface.instruments.export()
+        data['bytes_written'] = interface.screen.bytes_written
+        data['bytes_per_second'] = interface.bytes_per_second
+        with open(args.stats_json, 'w') as file:
+            json.dump(data, file, indent=2)
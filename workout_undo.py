@@ -0,0 +1,130 @@
+"""
+Undo and redo of the control actions of a workout session.
+
+Before every action the position of the session is captured in a small
+SessionState: the timeline, the settings it was compiled from, the time
+elapsed on it and whether it was running. Timelines are never changed once
+compiled, so a state holds its timeline by reference and capturing one is
+O(1) whatever the length of the program. Undoing places the session back
+at the captured position to the millisecond, so going back after a
+mistaken Next returns to the time that was left in the interval, not to its
+start.
+"""
+from collections import deque
+from typing import Callable, Deque, Optional
+
+from workout_program import Timeline
+
+
+class SessionState:
+    """
+    The position of a session at the moment of a control action.
+    """
+    __slots__ = ('timeline', 'work_duration', 'rest_duration', 'elapsed', 'running')
+
+    def __init__(self, timeline: Timeline, work_duration: int, rest_duration: int,
+                 elapsed: float, running: bool):
+        self.timeline = timeline
+        self.work_duration = work_duration
+        self.rest_duration = rest_duration
+        self.elapsed = elapsed
+        self.running = running
+
+    def __repr__(self) -> str:
+        state = 'running' if self.running else 'paused'
+        return f'SessionState({self.elapsed:.3f}s of {len(self.timeline)} intervals, {state})'
+
+
+class UndoHistory:
+    """
+    Bounded undo and redo stacks of SessionStates for one WorkoutSession.
+
+    Every action run through `perform` pushes the state before it, unless it
+    changed nothing; the oldest state is dropped once `limit` are kept.
+    Undo and redo emit the event that describes the restored state, 'start',
+    'pause' or 'stop', so the journal, the history and the displays follow.
+
+    Attributes
+    ----------
+    session : WorkoutSession
+        the session whose actions are recorded
+    limit : int
+        most states kept on each stack
+    """
+
+    def __init__(self, session, limit: int = 100):
+        self.session = session
+        self.limit = limit
+        self._undo: Deque[SessionState] = deque(maxlen=limit)
+        self._redo: Deque[SessionState] = deque(maxlen=limit)
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def capture(self, now: Optional[float] = None) -> SessionState:
+        """
+        Returns the current position of the session.
+        """
+        session = self.session
+        return SessionState(session.timeline, session.work_duration, session.rest_duration,
+                            session.elapsed(now), session.running)
+
+    def perform(self, action: Callable, *args) -> None:
+        """
+        Runs a control action of the session, recording the state before it.
+        """
+        session = self.session
+        state = self.capture()
+        index = session.stage_index
+        action(*args)
+        if session.timeline is state.timeline and session.running == state.running \
+                and session.stage_index == index and (session.running or session.elapsed() == state.elapsed):
+            # Pressing Back on the first stage or Stop while stopped changes nothing
+            return
+        self._undo.append(state)
+        self._redo.clear()
+
+    def undo(self) -> bool:
+        """
+        Restores the state before the last action.
+
+        Returns
+        -------
+        bool
+            False if there was nothing to undo.
+        """
+        if not self._undo:
+            return False
+        self._redo.append(self.capture())
+        self._restore(self._undo.pop())
+        return True
+
+    def redo(self) -> bool:
+        """
+        Restores the state an undo went back from.
+
+        Returns
+        -------
+        bool
+            False if there was nothing to redo.
+        """
+        if not self._redo:
+            return False
+        self._undo.append(self.capture())
+        self._restore(self._redo.pop())
+        return True
+
+    def clear(self) -> None:
+        self._undo.clear()
+        self._redo.clear()
+
+    def _restore(self, state: SessionState) -> None:
+        session = self.session
+        session.work_duration = state.work_duration
+        session.rest_duration = state.rest_duration
+        session.reposition(state.timeline, state.elapsed, state.running)